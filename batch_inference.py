@@ -0,0 +1,326 @@
+"""
+Batch inference for bulk Bedrock workloads.
+
+Instead of one invoke_model call per prompt at on-demand prices, prompts are
+written as JSONL shards in the Bedrock batch-inference record format
+
+    {"recordId": "...", "modelInput": {...native request body...}}
+
+uploaded to S3 and run as a model invocation job. The job writes one
+``<shard>.jsonl.out`` file per input shard, with ``modelOutput`` (or
+``error``) next to each record, in no particular order.
+
+- ``ShardWriter`` writes size- and count-capped shards. Record IDs are
+  derived from a caller key (or the prompt itself), so the same row always
+  gets the same ID and duplicates are written once.
+- ``join_results`` matches output records to the input shards through a
+  temporary SQLite index, so memory use does not grow with the job size.
+- ``LocalBatchRunner`` produces the same output files locally (through
+  invoke_model or any function), so the whole flow can be tested offline.
+"""
+
+import glob
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from bedrock_clients import get_client
+from model_codecs import dumps, get_codec, loads
+
+# Bedrock batch-inference limits per input file
+MAX_RECORDS_PER_SHARD = 50000
+MAX_SHARD_BYTES = 1024 ** 3
+
+_ALPHABET = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'
+
+
+def record_id(key: str) -> str:
+    """Stable 11-character alphanumeric record ID for a key"""
+    value = int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'big')
+    chars = []
+    for _ in range(11):
+        value, index = divmod(value, 62)
+        chars.append(_ALPHABET[index])
+    return ''.join(chars)
+
+
+class ShardWriter:
+    """
+    Write prompts as batch-inference JSONL shards
+
+    A new shard is started when the current one would exceed
+    ``max_shard_bytes`` or ``max_records`` records. Bodies come from the
+    model's codec and are spliced into each line as bytes, without being
+    parsed again.
+    """
+
+    def __init__(self, output_dir: str, model_id: str, prefix: str = 'shard',
+                 max_shard_bytes: int = MAX_SHARD_BYTES, max_records: int = MAX_RECORDS_PER_SHARD,
+                 **params):
+        """
+        Args:
+            output_dir: Directory for the shard files
+            model_id: Model the job will run (selects the request codec)
+            prefix: Shard file name prefix (<prefix>-00000.jsonl)
+            max_shard_bytes, max_records: Per-shard caps
+            **params: Generation parameters for every record, e.g. max_tokens=500
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        self.output_dir = output_dir
+        self.model_id = model_id
+        self.codec = get_codec(model_id)
+        self.prefix = prefix
+        self.max_shard_bytes = max_shard_bytes
+        self.max_records = max_records
+        self.params = params
+
+        self.paths: List[str] = []
+        self.records = 0
+        self.duplicates = 0
+        self._seen = set()
+        self._file = None
+        self._shard_bytes = 0
+        self._shard_records = 0
+
+    def _open_shard(self):
+        self._close_shard()
+        path = os.path.join(self.output_dir, f"{self.prefix}-{len(self.paths):05d}.jsonl")
+        self._file = open(path, 'wb')
+        self.paths.append(path)
+        self._shard_bytes = 0
+        self._shard_records = 0
+
+    def _close_shard(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def add(self, prompt: Union[str, List[Dict]], key: Optional[str] = None) -> str:
+        """
+        Queue one prompt (a prompt string or a message list); returns its record ID
+
+        ``key`` identifies the input row (e.g. a primary key); by default the
+        prompt text is used, so identical prompts share one record.
+        """
+        if isinstance(prompt, str):
+            body = self.codec.encode_prompt(prompt, **self.params)
+            rid = record_id(key if key is not None else prompt)
+        else:
+            body = self.codec.encode_messages(prompt, **self.params)
+            rid = record_id(key if key is not None else dumps(prompt).decode())
+
+        if rid in self._seen:
+            self.duplicates += 1
+            return rid
+        self._seen.add(rid)
+
+        line = b'{"recordId":"' + rid.encode() + b'","modelInput":' + body + b'}\n'
+        if (self._file is None or self._shard_records >= self.max_records
+                or self._shard_bytes + len(line) > self.max_shard_bytes):
+            self._open_shard()
+        self._file.write(line)
+        self._shard_bytes += len(line)
+        self._shard_records += 1
+        self.records += 1
+        return rid
+
+    def close(self) -> List[str]:
+        """Finish the last shard and return all shard paths"""
+        self._close_shard()
+        return self.paths
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def write_shards(prompts: Iterable[Union[str, Tuple[str, str]]], output_dir: str, model_id: str,
+                 **options) -> List[str]:
+    """Write prompts (strings or (key, prompt) pairs) as shards; returns the shard paths"""
+    with ShardWriter(output_dir, model_id, **options) as writer:
+        for item in prompts:
+            if isinstance(item, tuple):
+                key, prompt = item
+                writer.add(prompt, key=key)
+            else:
+                writer.add(item)
+    return writer.paths
+
+
+def _read_jsonl(path: str) -> Iterator[Dict]:
+    with open(path, 'rb') as f:
+        for line in f:
+            if line.strip():
+                yield loads(line)
+
+
+def join_results(input_paths: Iterable[str], output_paths: Iterable[str], model_id: str,
+                 lookup_batch: int = 500) -> Iterator[Dict]:
+    """
+    Match job outputs to input records
+
+    Output records are loaded into a temporary on-disk SQLite index, then
+    the input shards are streamed and looked up in batches. Yields one dict
+    per input record: recordId, modelInput, text (decoded with the model's
+    codec), modelOutput and error (None, or the error when the record
+    failed or has no output).
+    """
+    codec = get_codec(model_id)
+    with tempfile.TemporaryDirectory() as tmp:
+        db = sqlite3.connect(os.path.join(tmp, 'outputs.db'))
+        db.execute("CREATE TABLE outputs (record_id TEXT PRIMARY KEY, output BLOB, error TEXT)")
+
+        def rows():
+            for path in output_paths:
+                for record in _read_jsonl(path):
+                    error = record.get('error')
+                    yield (
+                        record['recordId'],
+                        dumps(record['modelOutput']) if 'modelOutput' in record else None,
+                        json.dumps(error) if error is not None else None,
+                    )
+
+        db.executemany("INSERT OR REPLACE INTO outputs VALUES (?, ?, ?)", rows())
+        db.commit()
+
+        def resolve(batch):
+            ids = [record['recordId'] for record in batch]
+            found = {
+                rid: (output, error)
+                for rid, output, error in db.execute(
+                    f"SELECT record_id, output, error FROM outputs WHERE record_id IN ({','.join('?' * len(ids))})",
+                    ids,
+                )
+            }
+            for record in batch:
+                output, error = found.get(record['recordId'], (None, None))
+                model_output = loads(output) if output is not None else None
+                if error is not None:
+                    error = json.loads(error)
+                elif model_output is None:
+                    error = {'errorMessage': 'No output record'}
+                yield {
+                    'recordId': record['recordId'],
+                    'modelInput': record['modelInput'],
+                    'modelOutput': model_output,
+                    'text': codec.decode(model_output) if model_output is not None else None,
+                    'error': error,
+                }
+
+        try:
+            batch = []
+            for path in input_paths:
+                for record in _read_jsonl(path):
+                    batch.append(record)
+                    if len(batch) >= lookup_batch:
+                        yield from resolve(batch)
+                        batch = []
+            if batch:
+                yield from resolve(batch)
+        finally:
+            db.close()
+
+
+class LocalBatchRunner:
+    """
+    Stand-in for a model invocation job
+
+    Reads input shards and writes ``<shard>.out`` files in the job's output
+    format. ``invoke`` maps a modelInput dict to a modelOutput dict; by
+    default it calls invoke_model on a Bedrock runtime client, but any
+    function works (e.g. a canned response for offline tests).
+    """
+
+    def __init__(self, model_id: str, invoke: Optional[Callable[[Dict], Dict]] = None,
+                 bedrock=None, max_workers: int = 4):
+        self.model_id = model_id
+        self.max_workers = max_workers
+        if invoke is None:
+            bedrock = bedrock or get_client('bedrock-runtime')
+
+            def invoke(model_input):
+                response = bedrock.invoke_model(modelId=model_id, body=dumps(model_input))
+                return loads(response['body'].read())
+        self.invoke = invoke
+
+    def _run_record(self, record: Dict) -> bytes:
+        result = {'recordId': record['recordId'], 'modelInput': record['modelInput']}
+        try:
+            result['modelOutput'] = self.invoke(record['modelInput'])
+        except Exception as e:
+            result['error'] = {'errorCode': 400, 'errorMessage': str(e)}
+        return dumps(result) + b'\n'
+
+    def run(self, input_paths: Iterable[str], output_dir: Optional[str] = None) -> List[str]:
+        """Process every shard; returns the output file paths"""
+        output_paths = []
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            for path in input_paths:
+                directory = output_dir or os.path.dirname(path)
+                os.makedirs(directory, exist_ok=True)
+                out_path = os.path.join(directory, os.path.basename(path) + '.out')
+                with open(out_path, 'wb') as out:
+                    # map() keeps at most one shard's results in flight
+                    for line in pool.map(self._run_record, _read_jsonl(path)):
+                        out.write(line)
+                output_paths.append(out_path)
+        return output_paths
+
+
+def upload_shards(paths: Iterable[str], bucket: str, prefix: str, s3=None) -> str:
+    """Upload shards under s3://bucket/prefix/ and return that input URI"""
+    s3 = s3 or get_client('s3')
+    prefix = prefix.strip('/')
+    for path in paths:
+        s3.upload_file(path, bucket, f"{prefix}/{os.path.basename(path)}")
+    return f"s3://{bucket}/{prefix}/"
+
+
+def create_batch_job(job_name: str, model_id: str, role_arn: str, input_s3_uri: str,
+                     output_s3_uri: str, bedrock=None) -> str:
+    """Start a model invocation job over an S3 prefix of shards; returns the job ARN"""
+    bedrock = bedrock or get_client('bedrock')
+    response = bedrock.create_model_invocation_job(
+        jobName=job_name,
+        modelId=model_id,
+        roleArn=role_arn,
+        inputDataConfig={'s3InputDataConfig': {'s3Uri': input_s3_uri, 's3InputFormat': 'JSONL'}},
+        outputDataConfig={'s3OutputDataConfig': {'s3Uri': output_s3_uri}},
+    )
+    return response['jobArn']
+
+
+def wait_for_job(job_arn: str, poll_seconds: float = 60.0, bedrock=None) -> Dict:
+    """Poll a model invocation job until it stops running"""
+    bedrock = bedrock or get_client('bedrock')
+    while True:
+        job = bedrock.get_model_invocation_job(jobIdentifier=job_arn)
+        if job['status'] not in ('Submitted', 'Validating', 'Scheduled', 'InProgress', 'Stopping'):
+            return job
+        time.sleep(poll_seconds)
+
+
+if __name__ == "__main__":
+    # Offline run of the whole flow with a canned model
+    model_id = "mistral.mistral-7b-instruct-v0:2"
+    with tempfile.TemporaryDirectory() as work_dir:
+        prompts = [(f"row-{i}", f"<s>[INST] Summarize ticket {i} [/INST]") for i in range(1200)]
+        shards = write_shards(prompts, work_dir, model_id, max_records=500, max_tokens=200)
+
+        runner = LocalBatchRunner(
+            model_id, invoke=lambda model_input: {"outputs": [{"text": model_input["prompt"][-20:]}]}
+        )
+        outputs = runner.run(shards)
+
+        results = list(join_results(shards, outputs, model_id))
+        print(f"{len(shards)} shards, {len(results)} records, "
+              f"{sum(r['error'] is not None for r in results)} errors")
+        print(record_id("row-7"), results[7]['text'])
+        print(sorted(glob.glob(os.path.join(work_dir, '*'))))
@@ -0,0 +1,420 @@
+"""
+Record / replay of Bedrock runtime and OpenSearch calls.
+
+A cassette is a gzip-compressed JSONL file with one entry per call:
+
+    {"key": <request hash>, "service": "bedrock-runtime", "operation": "invoke_model",
+     "latency": 0.84, "response": {...}, "chunks": [[0.31, {...}], ...]}
+
+``response`` is the call's return value (the StreamingBody of invoke_model
+stored as bytes), ``latency`` the seconds until the call returned, and for
+streaming operations ``chunks`` holds every stream event with its offset
+from the start of the call. Errors are stored too and raised again on
+replay.
+
+Wrapped clients look like the real ones:
+
+    cassette = Cassette("cassettes/rag_run.jsonl.gz", mode="auto")
+    bedrock = cassette.wrap(get_client("bedrock-runtime"), "bedrock-runtime")
+    op_client = cassette.wrap(op_client, "opensearch")
+
+Modes: 'record' calls the service and writes a fresh cassette; 'replay'
+never calls it and raises CassetteMiss for unknown requests; 'auto'
+replays what it has and records the rest. Replayed AWS errors are raised as
+the client's modeled exception classes (``bedrock.exceptions.ThrottlingException``
+...), as they were live. Any other error, such as opensearch-py's
+``NotFoundError``, is replayed as ``ReplayedError`` with the original class
+name in its message, so ``except NotFoundError`` does not catch it on
+replay. With ``timing=True`` replay
+sleeps for the recorded latency and chunk offsets (scaled by ``speed``), so
+performance runs see realistic waits without AWS. ``install(cassette)``
+wraps every client created afterwards by bedrock_clients.get_client.
+"""
+
+import base64
+import gzip
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import botocore.session
+from botocore.errorfactory import ClientExceptionsFactory
+from botocore.exceptions import ClientError
+from botocore.response import StreamingBody
+
+import bedrock_clients
+
+MODES = ('record', 'replay', 'auto')
+
+# Operations recorded per service ('indices.exists' is client.indices.exists)
+OPERATIONS = {
+    'bedrock-runtime': ('invoke_model', 'invoke_model_with_response_stream', 'converse', 'converse_stream'),
+    'opensearch': ('search', 'index', 'bulk', 'get', 'delete', 'info',
+                   'indices.exists', 'indices.create', 'indices.delete', 'indices.get_alias'),
+}
+
+# Response key holding the event stream of each streaming operation
+STREAM_KEYS = {'invoke_model_with_response_stream': 'body', 'converse_stream': 'stream'}
+
+# Wrapped services whose clients are not botocore clients ('opensearch' is opensearch-py)
+NON_AWS_SERVICES = ('opensearch',)
+
+
+class CassetteMiss(KeyError):
+    """A replay-only cassette has no entry for the request"""
+
+
+class ReplayedError(Exception):
+    """
+    A recorded non-ClientError exception, raised again on replay
+
+    The original class is not restored; the message is "<ClassName>: <message>".
+    """
+
+
+def _encode(value):
+    """JSON-safe copy of a response (bytes, bodies and datetimes tagged)"""
+    if isinstance(value, dict):
+        return {key: _encode(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_encode(item) for item in value]
+    if isinstance(value, (bytes, bytearray)):
+        try:
+            return {'__text__': value.decode('utf-8')}
+        except UnicodeDecodeError:
+            return {'__bytes__': base64.b64encode(value).decode()}
+    if isinstance(value, datetime):
+        return {'__datetime__': value.isoformat()}
+    if isinstance(value, StreamingBody):
+        return {'__body__': _encode(value.read())}
+    return value
+
+
+def _decode(value):
+    if isinstance(value, list):
+        return [_decode(item) for item in value]
+    if not isinstance(value, dict):
+        return value
+    if len(value) == 1:
+        (tag, item), = value.items()
+        if tag == '__text__':
+            return item.encode('utf-8')
+        if tag == '__bytes__':
+            return base64.b64decode(item)
+        if tag == '__datetime__':
+            return datetime.fromisoformat(item)
+        if tag == '__body__':
+            data = _decode(item)
+            return StreamingBody(io.BytesIO(data), len(data))
+    return {key: _decode(item) for key, item in value.items()}
+
+
+def _canonical(value):
+    """
+    Request arguments in a stable form
+
+    Dicts and lists are walked, and every bytes / str value holding a JSON
+    object or array (e.g. an invoke_model ``body``) is parsed, so the key
+    order of a JSON body does not change the request hash.
+    """
+    if isinstance(value, dict):
+        return {key: _canonical(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(item) for item in value]
+    if isinstance(value, (bytes, bytearray, str)) and len(value) > 1 and value[:1] in (b'{', '{', b'[', '['):
+        try:
+            return {'__json__': json.loads(value)}
+        except ValueError:
+            pass
+    return _encode(value)
+
+
+@lru_cache(maxsize=None)
+def service_exceptions(service: str):
+    """
+    Modeled exception classes of an AWS service, for replay without a client
+
+    None for services that are not botocore clients (NON_AWS_SERVICES) or
+    that botocore does not know.
+    """
+    if service in NON_AWS_SERVICES:
+        return None
+    try:
+        model = botocore.session.get_session().get_service_model(service)
+    except Exception:
+        return None
+    return ClientExceptionsFactory().create_client_exceptions(model)
+
+
+def request_key(service: str, operation: str, args: Sequence, kwargs: Dict) -> str:
+    payload = json.dumps([service, operation, _canonical(list(args)), _canonical(kwargs)],
+                         sort_keys=True, separators=(',', ':'), default=repr)
+    return hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+
+
+class Cassette:
+    """Recorded calls of one run, keyed by request hash"""
+
+    def __init__(self, path: str, mode: str = 'auto', timing: bool = False, speed: float = 1.0,
+                 ignore: Iterable[str] = ()):
+        """
+        Args:
+            path: Cassette file (.jsonl.gz)
+            mode: 'record', 'replay' or 'auto'
+            timing: On replay, wait for the recorded latency and chunk offsets
+            speed: Timing scale (2.0 replays twice as fast)
+            ignore: Keyword arguments left out of the request hash
+        """
+        if mode not in MODES:
+            raise ValueError(f"Unknown cassette mode '{mode}', expected one of {MODES}")
+        self.path = path
+        self.mode = mode
+        self.timing = timing
+        self.speed = speed
+        self.ignore = set(ignore)
+        self._entries: Dict[str, List[Dict]] = {}
+        self._played: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.stats = {'replayed': 0, 'recorded': 0, 'misses': 0}
+
+        if mode == 'record':
+            if os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            open(path, 'wb').close()
+        elif os.path.exists(path):
+            with gzip.open(path, 'rt') as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self._entries.setdefault(entry['key'], []).append(entry)
+
+    def __len__(self) -> int:
+        return sum(len(entries) for entries in self._entries.values())
+
+    def _save(self, entry: Dict):
+        line = json.dumps(entry, separators=(',', ':')) + '\n'
+        with self._lock:
+            self._entries.setdefault(entry['key'], []).append(entry)
+            # Every write is its own gzip member; gzip.open reads them back as one stream
+            with gzip.open(self.path, 'at') as f:
+                f.write(line)
+            self.stats['recorded'] += 1
+
+    def _next(self, key: str) -> Optional[Dict]:
+        """Recorded entries of a request are played in order; the last one repeats"""
+        with self._lock:
+            entries = self._entries.get(key)
+            if not entries:
+                return None
+            position = self._played.get(key, 0)
+            self._played[key] = position + 1
+            self.stats['replayed'] += 1
+            return entries[min(position, len(entries) - 1)]
+
+    def _sleep_until(self, started: float, offset: float):
+        if self.timing:
+            delay = started + offset / self.speed - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+    def _replay(self, entry: Dict, exceptions=None):
+        started = time.perf_counter()
+        error = entry.get('error')
+        stream_key = STREAM_KEYS.get(entry['operation'])
+        if stream_key is None or error is not None:
+            self._sleep_until(started, entry['latency'])
+            if error is not None:
+                if error['type'] == 'ClientError':
+                    response = _decode(error['response'])
+                    # The modeled class (ThrottlingException, ...) so except clauses match as live
+                    error_class = ClientError
+                    if exceptions is not None:
+                        error_class = exceptions.from_code(response.get('Error', {}).get('Code', ''))
+                    raise error_class(response, error['operation'])
+                raise ReplayedError(f"{error['type']}: {error['message']}")
+            return _decode(entry['response'])
+
+        # Headers arrive after the recorded latency, chunks at their recorded offsets
+        self._sleep_until(started, entry['latency'])
+        response = _decode(entry['response'])
+
+        def events():
+            for offset, event in entry.get('chunks', []):
+                self._sleep_until(started, offset)
+                yield _decode(event)
+
+        response[stream_key] = events()
+        return response
+
+    def _record(self, key: str, service: str, operation: str, call):
+        entry = {'key': key, 'service': service, 'operation': operation}
+        started = time.perf_counter()
+        try:
+            response = call()
+        except ClientError as e:
+            entry['latency'] = round(time.perf_counter() - started, 6)
+            entry['error'] = {'type': 'ClientError', 'response': _encode(e.response),
+                              'operation': e.operation_name}
+            self._save(entry)
+            raise
+        except Exception as e:
+            entry['latency'] = round(time.perf_counter() - started, 6)
+            entry['error'] = {'type': type(e).__name__, 'message': str(e)}
+            self._save(entry)
+            raise
+        entry['latency'] = round(time.perf_counter() - started, 6)
+
+        stream_key = STREAM_KEYS.get(operation)
+        if stream_key is None:
+            entry['response'] = _encode(response)
+            self._save(entry)
+            # The body was read for the cassette, so the caller gets a fresh one
+            return _decode(entry['response'])
+
+        stream = response[stream_key]
+        entry['response'] = _encode({k: v for k, v in response.items() if k != stream_key})
+
+        def events():
+            chunks = []
+            try:
+                for event in stream:
+                    chunks.append([round(time.perf_counter() - started, 6), _encode(event)])
+                    yield event
+            finally:
+                # Saved when the stream ends (or the caller stops reading)
+                entry['chunks'] = chunks
+                self._save(entry)
+                # A caller stopping early closes this generator; release the connection too
+                close = getattr(stream, 'close', None)
+                if close is not None:
+                    close()
+
+        response = dict(response)
+        response[stream_key] = events()
+        return response
+
+    def call(self, service: str, operation: str, function, args: Sequence, kwargs: Dict,
+             exceptions=None):
+        """
+        Replay or record one call; ``exceptions`` is the client's modeled
+        exception namespace (``client.exceptions``) used for replayed errors
+        """
+        key = request_key(service, operation, args,
+                          {k: v for k, v in kwargs.items() if k not in self.ignore})
+        if self.mode != 'record':
+            entry = self._next(key)
+            if entry is not None:
+                return self._replay(entry, exceptions)
+            if self.mode == 'replay':
+                with self._lock:
+                    self.stats['misses'] += 1
+                raise CassetteMiss(f"No recorded {service}.{operation} call for this request ({key})")
+        return self._record(key, service, operation, lambda: function(*args, **kwargs))
+
+    def wrap(self, client, service: str, operations: Optional[Sequence[str]] = None):
+        """
+        Client proxy that records or replays ``operations`` (default: OPERATIONS[service])
+
+        In replay mode ``client`` may be None; other attributes are taken from it.
+        """
+        return CassetteClient(self, client, service, tuple(operations or OPERATIONS.get(service, ())))
+
+
+class CassetteClient:
+    """Proxy around a client (or one of its namespaces, e.g. ``indices``)"""
+
+    def __init__(self, cassette: Cassette, client, service: str, operations: Sequence[str], prefix: str = ''):
+        self._cassette = cassette
+        self._client = client
+        self._service = service
+        self._operations = operations
+        self._prefix = prefix
+
+    @property
+    def exceptions(self):
+        """The client's modeled exceptions, or ones built from the service model without a client"""
+        if self._client is not None:
+            return self._client.exceptions
+        exceptions = service_exceptions(self._service)
+        if exceptions is None:
+            raise AttributeError(f"'exceptions' is not available on a replay-only {self._service} client")
+        return exceptions
+
+    def __getattr__(self, name):
+        operation = self._prefix + name
+        target = getattr(self._client, name) if self._client is not None else None
+        if operation in self._operations:
+            def call(*args, **kwargs):
+                try:
+                    exceptions = self.exceptions
+                except AttributeError:
+                    exceptions = None
+                return self._cassette.call(self._service, operation, target, args, kwargs, exceptions)
+            call.__name__ = name
+            return call
+        if any(op.startswith(operation + '.') for op in self._operations):
+            return CassetteClient(self._cassette, target, self._service, self._operations, operation + '.')
+        if self._client is None:
+            raise AttributeError(f"'{name}' is not available on a replay-only {self._service} client")
+        return target
+
+
+def install(cassette: Cassette, factory: Optional[bedrock_clients.ClientFactory] = None):
+    """
+    Wrap every client created afterwards by the (process-wide) client factory
+
+    Call this before importing modules that create clients at import time
+    (embeddings_helper_func, the lambdas).
+    """
+    factory = factory or bedrock_clients.get_factory()
+    factory.wrapper = lambda client, service: (
+        cassette.wrap(client, service) if service in OPERATIONS else client
+    )
+
+
+if __name__ == "__main__":
+    import tempfile
+
+    class FakeBedrock:
+        """Slow stand-in for bedrock-runtime"""
+
+        def invoke_model(self, modelId, body):
+            time.sleep(0.2)
+            data = json.dumps({"outputs": [{"text": f"echo {len(body)}"}]}).encode()
+            return {"body": StreamingBody(io.BytesIO(data), len(data)),
+                    "ResponseMetadata": {"HTTPHeaders": {"x-amzn-bedrock-input-token-count": "12"}}}
+
+        def invoke_model_with_response_stream(self, modelId, body):
+            time.sleep(0.1)
+
+            def events():
+                for i in range(5):
+                    time.sleep(0.05)
+                    yield {"chunk": {"bytes": json.dumps({"outputs": [{"text": f"t{i} "}]}).encode()}}
+            return {"body": events()}
+
+    body = json.dumps({"prompt": "<s>[INST] Hi [/INST]", "max_tokens": 50})
+    with tempfile.TemporaryDirectory() as work_dir:
+        path = os.path.join(work_dir, "run.jsonl.gz")
+
+        for label, options, client in [
+            ("record", {"mode": "record"}, FakeBedrock()),
+            ("replay", {"mode": "replay"}, None),
+            ("replay+timing", {"mode": "replay", "timing": True}, None),
+        ]:
+            cassette = Cassette(path, **options)
+            bedrock = cassette.wrap(client, "bedrock-runtime")
+            start = time.perf_counter()
+            text = json.loads(bedrock.invoke_model(modelId="m", body=body)["body"].read())["outputs"][0]["text"]
+            streamed = "".join(
+                json.loads(event["chunk"]["bytes"])["outputs"][0]["text"]
+                for event in bedrock.invoke_model_with_response_stream(modelId="m", body=body)["body"]
+            )
+            print(f"{label:14s} {time.perf_counter() - start:.3f}s {text!r} {streamed!r} {cassette.stats}")
+        print(f"cassette: {os.path.getsize(path)} bytes")
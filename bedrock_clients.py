@@ -0,0 +1,233 @@
+"""
+Shared, tuned boto3 clients.
+
+``boto3.client('bedrock-runtime', region_name='us-east-1')`` with default
+settings gives a pool of 10 HTTP connections, 60 s timeouts and standard
+retries. Under concurrency (FastAPI workers, embedding thread pools) the pool
+runs out, urllib3 logs "Connection pool is full, discarding connection", and
+requests pay for new TLS connections. Every module gets its clients from
+here instead:
+
+- one ``botocore.config.Config`` with a larger pool, TCP keep-alive,
+  connect/read timeouts and adaptive retries (client-side rate limiting on
+  throttling)
+- ``policy='shared'``: one client per service/region/config for the whole
+  process (boto3 clients are thread-safe); ``policy='thread'``: one per
+  thread, for code that mutates client state or wants isolated pools
+- pool statistics from botocore event hooks: calls in flight, peak
+  concurrency against the pool size, retries and pool-full warnings
+
+    bedrock = get_client('bedrock-runtime')
+    ...
+    print(pool_stats())
+
+Defaults can be changed per call (``get_client('bedrock-runtime',
+max_pool_connections=100)``) or through the BEDROCK_MAX_POOL_CONNECTIONS,
+BEDROCK_CONNECT_TIMEOUT, BEDROCK_READ_TIMEOUT, BEDROCK_MAX_ATTEMPTS and
+BEDROCK_CLIENT_POLICY environment variables.
+"""
+
+import logging
+import os
+import threading
+from typing import Dict, Optional
+
+import boto3
+from botocore.config import Config
+
+DEFAULT_REGION = 'us-east-1'
+POLICIES = ('shared', 'thread')
+
+DEFAULT_CONFIG = {
+    'max_pool_connections': int(os.environ.get('BEDROCK_MAX_POOL_CONNECTIONS', 50)),
+    'tcp_keepalive': True,
+    'connect_timeout': float(os.environ.get('BEDROCK_CONNECT_TIMEOUT', 5)),
+    # Long generations can take a while before the first byte
+    'read_timeout': float(os.environ.get('BEDROCK_READ_TIMEOUT', 120)),
+    'retries': {'mode': 'adaptive', 'max_attempts': int(os.environ.get('BEDROCK_MAX_ATTEMPTS', 5))},
+}
+
+
+def make_config(**overrides) -> Config:
+    """botocore Config from DEFAULT_CONFIG with the given keys replaced"""
+    return Config(**{**DEFAULT_CONFIG, **overrides})
+
+
+class PoolStats:
+    """Per-client counters fed by botocore events"""
+
+    def __init__(self, service: str, region_name: str, max_pool_connections: int):
+        self.service = service
+        self.region_name = region_name
+        self.max_pool_connections = max_pool_connections
+        self.calls = 0
+        self.attempts = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self._lock = threading.Lock()
+
+    def call_started(self, **kwargs):
+        with self._lock:
+            self.calls += 1
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    def attempt(self, **kwargs):
+        with self._lock:
+            self.attempts += 1
+
+    def call_finished(self, http_response=None, **kwargs):
+        with self._lock:
+            self.in_flight -= 1
+            if http_response is not None and http_response.status_code >= 400:
+                self.errors += 1
+
+    def call_failed(self, **kwargs):
+        with self._lock:
+            self.in_flight -= 1
+            self.errors += 1
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                'service': self.service,
+                'region': self.region_name,
+                'max_pool_connections': self.max_pool_connections,
+                'calls': self.calls,
+                'retries': max(self.attempts - self.calls, 0),
+                'errors': self.errors,
+                'in_flight': self.in_flight,
+                'peak_in_flight': self.peak_in_flight,
+                # Above 1.0 callers had to wait for (or open extra) connections
+                'peak_utilization': round(self.peak_in_flight / self.max_pool_connections, 3),
+            }
+
+
+class _PoolFullCounter(logging.Handler):
+    """Counts urllib3's "Connection pool is full" warnings"""
+
+    def __init__(self):
+        super().__init__(logging.WARNING)
+        self.count = 0
+
+    def emit(self, record):
+        if 'Connection pool is full' in record.getMessage():
+            self.count += 1
+
+
+_pool_full = _PoolFullCounter()
+logging.getLogger('urllib3.connectionpool').addHandler(_pool_full)
+
+
+class ClientFactory:
+    """Creates and caches configured clients; see the module docstring"""
+
+    def __init__(self, region_name: str = DEFAULT_REGION, policy: Optional[str] = None, **config):
+        """
+        Args:
+            region_name: Default region
+            policy: 'shared' (default) or 'thread'
+            **config: Overrides of DEFAULT_CONFIG for every client
+        """
+        policy = policy or os.environ.get('BEDROCK_CLIENT_POLICY', 'shared')
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown client policy '{policy}', expected one of {POLICIES}")
+        self.region_name = region_name
+        self.policy = policy
+        self.config = config
+        # Session creation of clients is not thread-safe, so it is serialized
+        self._session = boto3.session.Session()
+        self._lock = threading.Lock()
+        self._shared_lock = threading.Lock()
+        self._shared: Dict[tuple, object] = {}
+        self._local = threading.local()
+        self._stats = []
+        # Optional (client, service) -> client hook, e.g. bedrock_cassette.install
+        self.wrapper = None
+
+    def _create(self, service: str, region_name: str, config: Dict):
+        settings = {**DEFAULT_CONFIG, **config}
+        with self._lock:
+            client = self._session.client(service, region_name=region_name, config=Config(**settings))
+            stats = PoolStats(service, region_name, settings['max_pool_connections'])
+            self._stats.append(stats)
+        events = client.meta.events
+        events.register('before-call.*', stats.call_started)
+        events.register('before-send.*', stats.attempt)
+        events.register('after-call.*', stats.call_finished)
+        events.register('after-call-error.*', stats.call_failed)
+        if self.wrapper is not None:
+            client = self.wrapper(client, service)
+        return client
+
+    def client(self, service: str = 'bedrock-runtime', region_name: Optional[str] = None,
+               policy: Optional[str] = None, **config):
+        """Configured client for a service (created on first use, then reused)"""
+        region_name = region_name or self.region_name
+        config = {**self.config, **config}
+        key = (service, region_name, tuple(sorted((k, repr(v)) for k, v in config.items())))
+
+        if (policy or self.policy) == 'thread':
+            clients = getattr(self._local, 'clients', None)
+            if clients is None:
+                clients = self._local.clients = {}
+            if key not in clients:
+                clients[key] = self._create(service, region_name, config)
+            return clients[key]
+
+        client = self._shared.get(key)
+        if client is None:
+            with self._shared_lock:
+                # Checked again so concurrent first calls create a single client
+                client = self._shared.get(key)
+                if client is None:
+                    client = self._shared[key] = self._create(service, region_name, config)
+        return client
+
+    def stats(self):
+        """Pool statistics of every client created, plus the pool-full warning count"""
+        with self._lock:
+            clients = [stats.snapshot() for stats in self._stats]
+        return {'clients': clients, 'pool_full_warnings': _pool_full.count}
+
+
+_default_factory = None
+_default_lock = threading.Lock()
+
+
+def get_factory() -> ClientFactory:
+    """Process-wide factory"""
+    global _default_factory
+    if _default_factory is None:
+        with _default_lock:
+            if _default_factory is None:
+                _default_factory = ClientFactory()
+    return _default_factory
+
+
+def get_client(service: str = 'bedrock-runtime', region_name: Optional[str] = None, **options):
+    """Configured client from the process-wide factory (options: policy and Config keys)"""
+    return get_factory().client(service, region_name, **options)
+
+
+def pool_stats() -> Dict:
+    return get_factory().stats()
+
+
+if __name__ == "__main__":
+    from concurrent.futures import ThreadPoolExecutor
+
+    bedrock = get_client('bedrock-runtime')
+    assert get_client('bedrock-runtime') is bedrock
+    print(bedrock.meta.config.max_pool_connections, bedrock.meta.config.retries)
+
+    def list_models(_):
+        try:
+            get_client('bedrock').list_foundation_models()
+        except Exception as e:
+            return type(e).__name__
+
+    with ThreadPoolExecutor(32) as pool:
+        print(set(pool.map(list_models, range(64))))
+    print(pool_stats())
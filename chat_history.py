@@ -0,0 +1,103 @@
+"""
+Windowed chat history for the Streamlit chat apps.
+
+The conversation lives in ``st.session_state.messages``. Only the last full
+page plus the current one are drawn as chat bubbles; older pages sit
+behind a "Load earlier messages" button and their markdown is built once
+and cached in session state. Character (and, with a model id, token)
+totals are kept up to date as messages are added, so the apps never
+rescan the whole history on a rerun.
+
+    if "messages" not in st.session_state:
+        reset_history()
+    display_history()
+    add_message("user", prompt)
+"""
+
+import json
+
+import streamlit as st
+
+from token_counter import count_tokens
+
+PAGE_SIZE = 10  # messages per history page
+ROLE_LABELS = {"user": "You", "assistant": "Assistant"}
+
+
+def reset_history():
+    """Start an empty conversation along with its render cache and totals"""
+    st.session_state.messages = []
+    st.session_state.rendered_pages = {}
+    st.session_state.earlier_pages_shown = 0
+    st.session_state.total_chars = 0
+    st.session_state.total_tokens = 0
+    st.session_state.export_cache = (0, "[]")
+
+
+def add_message(role, content, model_id=None):
+    """
+    Append a message to the history and keep the running totals up to date
+
+    Tokens are only counted when ``model_id`` is given.
+    """
+    st.session_state.messages.append({"role": role, "content": content})
+    st.session_state.total_chars += len(content)
+    if model_id is not None:
+        st.session_state.total_tokens += count_tokens(content, model_id)
+
+
+def load_earlier_page():
+    """Reveal one more page of older messages"""
+    st.session_state.earlier_pages_shown += 1
+
+
+def render_page(index):
+    """
+    Markdown for one older page of the history
+
+    Pages before the live window never change, so each one is built once
+    and reused on every later rerun.
+    """
+    rendered = st.session_state.rendered_pages.get(index)
+    if rendered is None:
+        page = st.session_state.messages[index * PAGE_SIZE:(index + 1) * PAGE_SIZE]
+        rendered = "\n\n---\n\n".join(
+            f"**{ROLE_LABELS.get(msg['role'], msg['role'])}:** {msg['content']}"
+            for msg in page
+        )
+        st.session_state.rendered_pages[index] = rendered
+    return rendered
+
+
+def display_history():
+    """
+    Show the latest messages as chat bubbles and older pages on request
+
+    A rerun costs the same however long the conversation gets.
+    """
+    messages = st.session_state.messages
+    live_start = max(0, len(messages) // PAGE_SIZE - 1) * PAGE_SIZE
+    earlier_pages = live_start // PAGE_SIZE
+    shown = min(st.session_state.earlier_pages_shown, earlier_pages)
+
+    if shown < earlier_pages:
+        st.button(
+            f"⬆️ Load earlier messages ({earlier_pages - shown} more pages)",
+            on_click=load_earlier_page
+        )
+    for index in range(earlier_pages - shown, earlier_pages):
+        with st.expander(f"Messages {index * PAGE_SIZE + 1}–{(index + 1) * PAGE_SIZE}", expanded=True):
+            st.markdown(render_page(index))
+
+    for message in messages[live_start:]:
+        with st.chat_message(message["role"]):
+            st.markdown(message["content"])
+
+
+def export_history():
+    """JSON export of the chat, rebuilt only when a message has been added"""
+    count, exported = st.session_state.export_cache
+    if count != len(st.session_state.messages):
+        exported = json.dumps(st.session_state.messages, indent=2)
+        st.session_state.export_cache = (len(st.session_state.messages), exported)
+    return exported
@@ -0,0 +1,286 @@
+"""
+Memory-mapped chunk text store.
+
+Keeping chunk text in the OpenSearch / DynamoDB documents means every query
+ships the full text back, and a local index would have to hold all of it in
+RAM. ``ChunkStore`` keeps the text on local disk instead:
+
+- ``data-<generation>.bin``: UTF-8 chunk text, append-only
+- ``index-<generation>.jsonl``: append-only log of ``[chunk_id, offset, length]``
+  entries (length -1 marks a deletion), replayed into a dict on open
+- ``manifest.json``: the current generation
+
+Reads slice a memory map of the data file, so only the pages of the chunks
+actually fetched are loaded, and ``view`` returns them without copying. The
+vector index then only needs to return chunk IDs. Deleted and overwritten
+chunks leave dead bytes behind until ``compact`` rewrites the live chunks
+into a new generation and switches the manifest over atomically.
+
+    store = ChunkStore("chunk_store")
+    store.put("doc-1", "AWS Bedrock provides foundation models for GenAI")
+    hits = [hit["_source"]["document_id"] for hit in response["hits"]["hits"]]
+    texts = store.get_many(hits)
+"""
+
+import json
+import mmap
+import os
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+_DELETED = -1
+
+
+class ChunkStore:
+    """Append-only chunk text file with an in-memory offset index keyed by chunk ID"""
+
+    def __init__(self, directory: str, sync: bool = False):
+        """
+        Args:
+            directory: Store directory (created if missing)
+            sync: fsync data and index after every write batch
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.sync = sync
+        self._lock = threading.RLock()
+        self._index: Dict[str, Tuple[int, int]] = {}
+        self._map: Optional[mmap.mmap] = None
+        self._mapped_size = 0
+        self.dead_bytes = 0
+
+        manifest = os.path.join(directory, 'manifest.json')
+        self.generation = 0
+        if os.path.exists(manifest):
+            with open(manifest) as f:
+                self.generation = json.load(f)['generation']
+        self._open_generation()
+
+    def _data_path(self, generation: int) -> str:
+        return os.path.join(self.directory, f"data-{generation:06d}.bin")
+
+    def _index_path(self, generation: int) -> str:
+        return os.path.join(self.directory, f"index-{generation:06d}.jsonl")
+
+    def _open_generation(self):
+        self._index = {}
+        self.dead_bytes = 0
+        index_path = self._index_path(self.generation)
+        if os.path.exists(index_path):
+            complete = 0
+            with open(index_path, 'rb') as f:
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        # Torn last line from an interrupted write
+                        break
+                    complete += len(line)
+                    if not line.strip():
+                        continue
+                    try:
+                        chunk_id, offset, length = json.loads(line)
+                    except ValueError:
+                        continue
+                    previous = self._index.pop(chunk_id, None)
+                    if previous is not None:
+                        self.dead_bytes += previous[1]
+                    if length != _DELETED:
+                        self._index[chunk_id] = (offset, length)
+            if complete < os.path.getsize(index_path):
+                # Cut the fragment off so the next entry starts on a line of its own
+                with open(index_path, 'r+b') as f:
+                    f.truncate(complete)
+        self._data = open(self._data_path(self.generation), 'ab')
+        self._log = open(index_path, 'a')
+        self._remap()
+
+    def _remap(self):
+        """Map the whole data file (again, after it grew)"""
+        size = os.path.getsize(self._data_path(self.generation))
+        if size == self._mapped_size:
+            return
+        old = self._map
+        if size:
+            with open(self._data_path(self.generation), 'rb') as f:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self._map = None
+        self._mapped_size = size
+        self._release(old)
+
+    @staticmethod
+    def _release(mapped: Optional[mmap.mmap]):
+        if mapped is None:
+            return
+        try:
+            mapped.close()
+        except BufferError:
+            # A caller still holds a view into it; it is freed with the last view
+            pass
+
+    def _flush(self):
+        self._data.flush()
+        self._log.flush()
+        if self.sync:
+            os.fsync(self._data.fileno())
+            os.fsync(self._log.fileno())
+
+    def put_many(self, chunks: Iterable[Tuple[str, str]]):
+        """Append (chunk_id, text) pairs; an existing ID is overwritten"""
+        with self._lock:
+            offset = self._data.tell()
+            entries = []
+            for chunk_id, text in chunks:
+                encoded = text.encode('utf-8')
+                self._data.write(encoded)
+                previous = self._index.get(chunk_id)
+                if previous is not None:
+                    self.dead_bytes += previous[1]
+                self._index[chunk_id] = (offset, len(encoded))
+                entries.append(json.dumps([chunk_id, offset, len(encoded)]) + '\n')
+                offset += len(encoded)
+            # Data first, so an index entry never points past the end of the file
+            self._data.flush()
+            self._log.write(''.join(entries))
+            self._flush()
+
+    def put(self, chunk_id: str, text: str):
+        self.put_many([(chunk_id, text)])
+
+    def delete(self, chunk_id: str) -> bool:
+        """Drop a chunk (its bytes are reclaimed by compact); False if it did not exist"""
+        with self._lock:
+            entry = self._index.pop(chunk_id, None)
+            if entry is None:
+                return False
+            self.dead_bytes += entry[1]
+            self._log.write(json.dumps([chunk_id, 0, _DELETED]) + '\n')
+            self._flush()
+            return True
+
+    def view(self, chunk_id: str) -> memoryview:
+        """UTF-8 bytes of a chunk as a zero-copy view of the mapped file"""
+        with self._lock:
+            offset, length = self._index[chunk_id]
+            if offset + length > self._mapped_size:
+                self._remap()
+            return memoryview(self._map)[offset:offset + length] if length else memoryview(b'')
+
+    def get(self, chunk_id: str, default: Optional[str] = None) -> Optional[str]:
+        """Chunk text, or ``default`` if the ID is unknown"""
+        try:
+            with self.view(chunk_id) as data:
+                return str(data, 'utf-8')
+        except KeyError:
+            return default
+
+    def get_many(self, chunk_ids: Iterable[str]) -> List[Optional[str]]:
+        """Texts for retrieved IDs, in the same order (None for unknown IDs)"""
+        return [self.get(chunk_id) for chunk_id in chunk_ids]
+
+    def __contains__(self, chunk_id: str) -> bool:
+        return chunk_id in self._index
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def ids(self) -> List[str]:
+        return list(self._index)
+
+    def stats(self) -> Dict:
+        live = sum(length for _, length in self._index.values())
+        return {
+            'chunks': len(self._index),
+            'live_bytes': live,
+            'dead_bytes': self.dead_bytes,
+            'file_bytes': self._data.tell(),
+            'generation': self.generation,
+        }
+
+    def compact(self, min_dead_ratio: float = 0.0) -> bool:
+        """
+        Rewrite the live chunks into a new generation, dropping dead bytes
+
+        Skipped (returns False) when dead bytes are below ``min_dead_ratio``
+        of the data file. Views taken before compaction stay valid.
+        """
+        with self._lock:
+            total = self._data.tell()
+            if not self.dead_bytes or (total and self.dead_bytes / total < min_dead_ratio):
+                return False
+            self._remap()
+            generation = self.generation + 1
+            new_index = {}
+            with open(self._data_path(generation), 'wb') as data, \
+                    open(self._index_path(generation), 'w') as log:
+                offset = 0
+                # File order keeps the copy sequential
+                for chunk_id, (old_offset, length) in sorted(self._index.items(), key=lambda item: item[1][0]):
+                    data.write(self._map[old_offset:old_offset + length])
+                    new_index[chunk_id] = (offset, length)
+                    log.write(json.dumps([chunk_id, offset, length]) + '\n')
+                    offset += length
+                data.flush()
+                log.flush()
+                os.fsync(data.fileno())
+                os.fsync(log.fileno())
+
+            manifest = os.path.join(self.directory, 'manifest.json')
+            with open(manifest + '.tmp', 'w') as f:
+                json.dump({'generation': generation}, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(manifest + '.tmp', manifest)
+
+            old_generation = self.generation
+            self._close_files()
+            self.generation = generation
+            self._open_generation()
+            for path in (self._data_path(old_generation), self._index_path(old_generation)):
+                os.remove(path)
+            return True
+
+    def _close_files(self):
+        self._data.close()
+        self._log.close()
+        self._release(self._map)
+        self._map = None
+        self._mapped_size = 0
+
+    def close(self):
+        with self._lock:
+            self._close_files()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+if __name__ == "__main__":
+    import random
+    import tempfile
+    import time
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        store = ChunkStore(work_dir)
+        words = ["bedrock", "vector", "retrieval", "chunk", "model", "index", "café"]
+        start = time.perf_counter()
+        store.put_many(
+            (f"chunk-{i}", " ".join(random.choice(words) for _ in range(150))) for i in range(50000)
+        )
+        print(f"wrote 50k chunks in {time.perf_counter() - start:.2f}s: {store.stats()}")
+
+        ids = [f"chunk-{random.randrange(50000)}" for _ in range(10000)]
+        start = time.perf_counter()
+        store.get_many(ids)
+        print(f"10k random reads in {time.perf_counter() - start:.3f}s")
+
+        for i in range(0, 50000, 2):
+            store.delete(f"chunk-{i}")
+        store.compact()
+        print(f"after deleting half and compacting: {store.stats()}")
+        store.close()
+
+        with ChunkStore(work_dir) as reopened:
+            print(len(reopened), reopened.get("chunk-1")[:40])
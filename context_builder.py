@@ -0,0 +1,158 @@
+"""
+Token-budgeted prompt assembly for Mistral chat conversations.
+
+Mistral's native (non-Converse) API takes a single prompt string:
+
+    <s>[INST] user 1 [/INST] assistant 1</s>[INST] user 2 [/INST]
+
+Instead of sending the whole history every turn, the builder keeps the newest
+turns that fit the model's context window and can fold the turns it drops
+into a rolling summary that is computed once and reused on later turns.
+"""
+
+import hashlib
+from typing import Callable, Dict, List, Optional
+
+from token_counter import count_tokens
+
+
+class MistralContextBuilder:
+    """Build Mistral prompts from chat history within a token budget"""
+
+    # [INST] / [/INST] / </s> markers added around every message
+    TURN_OVERHEAD_TOKENS = 6
+
+    def __init__(
+        self,
+        max_context_tokens: int = 32000,
+        max_output_tokens: int = 1000,
+        count_tokens: Callable[[str], int] = count_tokens,
+        summarize: Optional[Callable[[str, List[Dict]], str]] = None,
+        max_summary_tokens: int = 400,
+    ):
+        """
+        Args:
+            max_context_tokens: Context window of the model
+            max_output_tokens: Tokens reserved for the generated answer
+            count_tokens: Function returning the token count of a text
+            summarize: Optional function ``(previous_summary, dropped_messages) -> summary``
+                used to replace turns that no longer fit with a short summary
+            max_summary_tokens: Budget reserved for the summary when enabled
+        """
+        self.max_context_tokens = max_context_tokens
+        self.max_output_tokens = max_output_tokens
+        self.count_tokens = count_tokens
+        self.summarize = summarize
+        self.max_summary_tokens = max_summary_tokens
+
+        # Rolling summary of messages[:_summary_upto]
+        self._summary = ""
+        self._summary_upto = 0
+        self._summary_anchor = None
+
+        self.last_stats = {}
+
+    @property
+    def input_budget(self) -> int:
+        """Tokens available for the prompt itself"""
+        return self.max_context_tokens - self.max_output_tokens
+
+    def _message_tokens(self, message: Dict) -> int:
+        return self.count_tokens(message["content"]) + self.TURN_OVERHEAD_TOKENS
+
+    @staticmethod
+    def _anchor(messages: List[Dict], upto: int) -> Optional[str]:
+        """Fingerprint of the last summarized message, to spot a new conversation"""
+        if upto == 0 or upto > len(messages):
+            return None
+        return hashlib.md5(messages[upto - 1]["content"].encode()).hexdigest()
+
+    def reset(self):
+        """Forget the cached summary (e.g. when the chat is cleared)"""
+        self._summary = ""
+        self._summary_upto = 0
+        self._summary_anchor = None
+
+    def _select_window(self, messages: List[Dict], budget: int) -> int:
+        """
+        Index of the first message to send verbatim
+
+        Walks back from the newest message and stops as soon as the budget is
+        spent, so the cost depends on the window size, not the history length.
+        The window always starts on a user turn and always keeps the last message.
+        """
+        used = 0
+        start = len(messages)
+        for index in range(len(messages) - 1, -1, -1):
+            used += self._message_tokens(messages[index])
+            if used > budget and start < len(messages):
+                break
+            start = index
+
+        # Mistral's template has to open with a user turn
+        while start < len(messages) - 1 and messages[start]["role"] != "user":
+            start += 1
+        return start
+
+    def _rolling_summary(self, messages: List[Dict], start: int) -> str:
+        """Summary of messages[:start], extended only with newly dropped turns"""
+        if start > self._summary_upto:
+            dropped = messages[self._summary_upto:start]
+            self._summary = self.summarize(self._summary, dropped)
+            self._summary_upto = start
+            self._summary_anchor = self._anchor(messages, start)
+
+        return self._summary
+
+    def build(self, messages: List[Dict], system_prompt: Optional[str] = None) -> str:
+        """
+        Format the conversation for Mistral's prompt template
+
+        Args:
+            messages: Chat history as ``{"role": ..., "content": ...}`` dicts
+            system_prompt: Optional instructions placed in the first [INST] block
+
+        Returns:
+            Prompt string ending with the open [/INST] for the next answer
+        """
+        if not messages:
+            return ""
+
+        budget = self.input_budget
+        if system_prompt:
+            budget -= self.count_tokens(system_prompt)
+        if self.summarize is not None:
+            budget -= self.max_summary_tokens
+
+        start = self._select_window(messages, budget)
+        summary = ""
+        if self.summarize is not None:
+            if self._summary_anchor != self._anchor(messages, self._summary_upto):
+                self.reset()
+            # Turns already folded into the summary are not sent verbatim again
+            start = max(start, self._summary_upto)
+            summary = self._rolling_summary(messages, start)
+
+        preamble = []
+        if system_prompt:
+            preamble.append(system_prompt)
+        if summary:
+            preamble.append(f"Summary of the earlier conversation:\n{summary}")
+
+        parts = ["<s>"]
+        for index in range(start, len(messages)):
+            message = messages[index]
+            if message["role"] == "user":
+                content = message["content"]
+                if preamble and index == start:
+                    content = "\n\n".join(preamble + [content])
+                parts.append(f"[INST] {content} [/INST]")
+            else:
+                parts.append(f" {message['content']}</s>")
+
+        self.last_stats = {
+            "messages_sent": len(messages) - start,
+            "messages_dropped": start,
+            "summarized": bool(summary),
+        }
+        return "".join(parts)
@@ -0,0 +1,236 @@
+"""
+Query-side compression of retrieved context before generation.
+
+Retrieved chunks usually hold only a few sentences that matter for the
+question, but the whole chunk goes into the prompt. This stage:
+
+1. splits the retrieved chunks into sentences
+2. embeds the sentences, reusing cached embeddings (the same chunks come
+   back for many queries), and scores all of them against the query
+   embedding with one matrix product
+3. keeps the best-scoring sentences that fit a token budget and puts them
+   back in source order, each chunk's sentences under its citation
+
+    cache = SentenceEmbeddingCache(generate_embedding)
+    context = compress_context(query_embedding, retrieved, max_tokens=600, cache=cache)
+    prompt = f"Context:\n{context.text}\n\nQuestion: {query}"
+"""
+
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from token_counter import count_tokens_batch
+
+# A sentence ends at . ! ? (optionally followed by quotes or brackets) before
+# whitespace, or at a line break
+_SENTENCE_END = re.compile(r'(?<=[.!?])["\')\]]*\s+|\n+')
+
+
+def split_sentences(text: str) -> List[Tuple[int, int]]:
+    """(start, end) character spans of the sentences in a text"""
+    spans = []
+    start = 0
+    for match in _SENTENCE_END.finditer(text):
+        end = match.start()
+        # Keep closing quotes / brackets with their sentence
+        end += len(match.group()) - len(match.group().lstrip('"\')]'))
+        if text[start:end].strip():
+            spans.append((start, end))
+        start = match.end()
+    if text[start:].strip():
+        spans.append((start, len(text.rstrip())))
+    return spans
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+class SentenceEmbeddingCache:
+    """
+    LRU cache of normalized sentence embeddings keyed by a hash of the text
+
+    Misses are embedded together: with ``embed_batch`` in one call,
+    otherwise with ``embed`` on up to ``max_workers`` threads (Titan embeds
+    one text per request).
+    """
+
+    def __init__(self, embed: Callable[[str], Sequence[float]], max_entries: int = 50000,
+                 embed_batch: Optional[Callable[[List[str]], Sequence[Sequence[float]]]] = None,
+                 max_workers: int = 8):
+        """
+        Args:
+            embed: Function text -> embedding (e.g. generate_embedding)
+            max_entries: Sentences kept in the cache
+            embed_batch: Optional function list of texts -> list of embeddings
+            max_workers: Concurrent ``embed`` calls for cache misses
+        """
+        self.embed = embed
+        self.embed_batch = embed_batch
+        self.max_entries = max_entries
+        self.max_workers = max_workers
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(sentence: str) -> bytes:
+        return hashlib.blake2b(sentence.encode(), digest_size=16).digest()
+
+    def _embed_missing(self, sentences: List[str]) -> List[Sequence[float]]:
+        if self.embed_batch is not None:
+            return self.embed_batch(sentences)
+        if len(sentences) == 1 or self.max_workers <= 1:
+            return [self.embed(s) for s in sentences]
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(sentences))) as pool:
+            return list(pool.map(self.embed, sentences))
+
+    def embed_many(self, sentences: Sequence[str]) -> np.ndarray:
+        """Normalized float32 embeddings, one row per sentence"""
+        keys = [self._key(s) for s in sentences]
+        rows: List[Optional[np.ndarray]] = [None] * len(sentences)
+        missing: Dict[bytes, List[int]] = {}
+        with self._lock:
+            for position, key in enumerate(keys):
+                vector = self._cache.get(key)
+                if vector is None:
+                    missing.setdefault(key, []).append(position)
+                else:
+                    self._cache.move_to_end(key)
+                    rows[position] = vector
+            self.hits += len(sentences) - sum(len(p) for p in missing.values())
+            self.misses += len(missing)
+
+        if missing:
+            texts = [sentences[positions[0]] for positions in missing.values()]
+            fresh = _normalize(np.asarray(self._embed_missing(texts), dtype=np.float32))
+            with self._lock:
+                for (key, positions), vector in zip(missing.items(), fresh):
+                    for position in positions:
+                        rows[position] = vector
+                    self._cache[key] = vector
+                    self._cache.move_to_end(key)
+                while len(self._cache) > self.max_entries:
+                    self._cache.popitem(last=False)
+        return np.vstack(rows) if rows else np.empty((0, 0), dtype=np.float32)
+
+    def cache_info(self) -> Dict[str, int]:
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._cache), 'max_size': self.max_entries}
+
+
+class CompressedContext:
+    """
+    Selected sentences of the retrieved chunks
+
+    Attributes:
+        text: Prompt-ready context, one "[source] sentences" block per chunk
+        sentences: (source id, start, end, score) of every kept sentence, in source order
+        tokens: Estimated tokens of the kept sentences
+        original_tokens: Estimated tokens of all retrieved sentences
+    """
+
+    def __init__(self, text: str, sentences: List[Tuple[str, int, int, float]],
+                 tokens: int, original_tokens: int):
+        self.text = text
+        self.sentences = sentences
+        self.tokens = tokens
+        self.original_tokens = original_tokens
+
+    @property
+    def ratio(self) -> float:
+        """Fraction of the retrieved tokens that was kept"""
+        return round(self.tokens / self.original_tokens, 3) if self.original_tokens else 1.0
+
+    def __str__(self) -> str:
+        return self.text
+
+
+def compress_context(query_embedding: Sequence[float], chunks: Sequence[Union[str, Dict]],
+                     max_tokens: int, cache: SentenceEmbeddingCache, min_score: Optional[float] = None,
+                     model_id: Optional[str] = None, text_key: str = 'text', id_key: str = 'id') -> CompressedContext:
+    """
+    Keep the sentences most similar to the query within a token budget
+
+    Args:
+        query_embedding: Embedding of the question (same model as the cache)
+        chunks: Retrieved chunks, best first: strings, or dicts with the text
+            under ``text_key`` and the citation under ``id_key``
+        max_tokens: Token budget for the kept sentences
+        cache: Sentence embedding cache
+        min_score: Drop sentences with a lower cosine similarity
+        model_id: Model whose tokenizer is used for the budget
+    """
+    sources, texts, spans = [], [], []
+    for position, chunk in enumerate(chunks):
+        if isinstance(chunk, str):
+            source, text = str(position + 1), chunk
+        else:
+            source, text = str(chunk.get(id_key, position + 1)), chunk[text_key]
+        for start, end in split_sentences(text):
+            sources.append(source)
+            texts.append(text[start:end])
+            spans.append((position, start, end))
+    if not texts:
+        return CompressedContext('', [], 0, 0)
+
+    query = _normalize(np.asarray(query_embedding, dtype=np.float32))
+    scores = cache.embed_many(texts) @ query
+    tokens = np.asarray(count_tokens_batch(texts, model_id))
+
+    # Greedy by score: take every sentence that still fits the budget
+    keep = np.zeros(len(texts), dtype=bool)
+    used = 0
+    for index in np.argsort(-scores, kind='stable'):
+        if min_score is not None and scores[index] < min_score:
+            break
+        if used + tokens[index] <= max_tokens:
+            keep[index] = True
+            used += int(tokens[index])
+
+    blocks, current_source, current = [], None, []
+    sentences = []
+    # Sentences are already in chunk / position order
+    for index in np.flatnonzero(keep):
+        if sources[index] != current_source and current:
+            blocks.append(f"[{current_source}] " + " ".join(current))
+            current = []
+        current_source = sources[index]
+        current.append(texts[index])
+        sentences.append((sources[index], spans[index][1], spans[index][2], float(scores[index])))
+    if current:
+        blocks.append(f"[{current_source}] " + " ".join(current))
+
+    return CompressedContext("\n\n".join(blocks), sentences, used, int(tokens.sum()))
+
+
+if __name__ == "__main__":
+    # Offline demo with a bag-of-words embedding standing in for Titan
+    vocabulary = {}
+
+    def embed(text):
+        vector = np.zeros(256, dtype=np.float32)
+        for word in re.findall(r'\w+', text.lower()):
+            vector[vocabulary.setdefault(word, len(vocabulary) % 256)] += 1.0
+        return vector
+
+    chunks = [
+        {"id": "doc-1", "text": "AWS Bedrock provides foundation models for GenAI. It was launched in 2023. "
+                                "Pricing is per token. Models include Claude, Mistral and Titan."},
+        {"id": "doc-2", "text": "S3 is an object storage service. Bedrock batch jobs read prompts from S3 "
+                                "and write results back. Buckets are regional."},
+    ]
+    cache = SentenceEmbeddingCache(embed)
+    question = "Which foundation models does Bedrock provide?"
+    for budget in (15, 40):
+        context = compress_context(embed(question), chunks, max_tokens=budget, cache=cache)
+        print(f"budget {budget}: kept {context.tokens}/{context.original_tokens} tokens ({context.ratio})")
+        print(context.text, "\n")
+    print(cache.cache_info())
@@ -0,0 +1,120 @@
+"""
+Token-bounded conversation history.
+
+Replaces the ``truncate_context`` pattern of re-summing every message after
+each ``pop(0)``: each message's token count is computed once when it is
+added, a running total is kept, and the oldest turns are evicted from the
+left of a deque in constant time. System messages can be pinned so they are
+never evicted, and the retained window can be exported straight into the
+Converse API or the native chat-messages format.
+"""
+
+from collections import deque
+from typing import Dict, Iterable, List, Optional
+
+from token_counter import count_tokens
+
+
+class ConversationBuffer:
+    """Chat history that keeps itself under a token limit"""
+
+    def __init__(self, max_tokens: int = 4000, model_id: Optional[str] = None,
+                 count=count_tokens):
+        """
+        Args:
+            max_tokens: Token limit for pinned plus retained messages
+            model_id: Bedrock model id used to pick the tokenizer
+            count: Function ``(text, model_id) -> tokens``
+        """
+        self.max_tokens = max_tokens
+        self.model_id = model_id
+        self._count = count
+
+        self._pinned: List[Dict] = []
+        self._pinned_tokens = 0
+        # (message, token_count) pairs, oldest on the left
+        self._window = deque()
+        self._window_tokens = 0
+        self.evicted = 0
+
+    @property
+    def total_tokens(self) -> int:
+        return self._pinned_tokens + self._window_tokens
+
+    def __len__(self) -> int:
+        return len(self._pinned) + len(self._window)
+
+    def pin(self, content: str, role: str = 'system'):
+        """Add a message that is always kept (e.g. the system prompt)"""
+        self._pinned.append({'role': role, 'content': content})
+        self._pinned_tokens += self._count(content, self.model_id)
+        self._evict()
+
+    def append(self, role: str, content: str):
+        """Add a message; system messages are pinned, others may be evicted later"""
+        if role == 'system':
+            self.pin(content)
+            return
+        tokens = self._count(content, self.model_id)
+        self._window.append(({'role': role, 'content': content}, tokens))
+        self._window_tokens += tokens
+        self._evict()
+
+    def extend(self, messages: Iterable[Dict]):
+        for message in messages:
+            self.append(message['role'], message['content'])
+
+    def clear(self):
+        """Drop the conversation but keep pinned messages"""
+        self._window.clear()
+        self._window_tokens = 0
+
+    def _evict(self):
+        """Drop the oldest turns until the total fits, always keeping the newest message"""
+        window = self._window
+        while self.total_tokens > self.max_tokens and len(window) > 1:
+            _, tokens = window.popleft()
+            self._window_tokens -= tokens
+            self.evicted += 1
+
+        # Chat APIs expect the history to open with a user turn
+        while len(window) > 1 and window[0][0]['role'] != 'user':
+            _, tokens = window.popleft()
+            self._window_tokens -= tokens
+            self.evicted += 1
+
+    def messages(self) -> List[Dict]:
+        """Pinned messages followed by the retained window, as role/content dicts"""
+        return self._pinned + [message for message, _ in self._window]
+
+    def to_converse(self) -> Dict:
+        """
+        Keyword arguments for ``bedrock.converse(...)``
+
+        Returns:
+            Dict with ``messages`` and, when something is pinned, ``system``
+        """
+        request = {
+            'messages': [
+                {'role': message['role'], 'content': [{'text': message['content']}]}
+                for message, _ in self._window
+            ]
+        }
+        if self._pinned:
+            request['system'] = [{'text': message['content']} for message in self._pinned]
+        return request
+
+    def to_native(self) -> List[Dict]:
+        """Messages list for native chat bodies (Mistral Large 3, Llama chat, ...)"""
+        return self.messages()
+
+
+if __name__ == "__main__":
+    buffer = ConversationBuffer(max_tokens=60, model_id="mistral.mistral-large-2402-v1:0")
+    buffer.pin("You are a concise customer support agent.")
+    for turn in range(20):
+        buffer.append('user', f"Question number {turn} about my order status?")
+        buffer.append('assistant', f"Answer number {turn}: it ships tomorrow.")
+
+    print(f"Kept {len(buffer)} messages, {buffer.total_tokens} tokens, evicted {buffer.evicted}")
+    print(buffer.to_converse())
@@ -0,0 +1,336 @@
+"""
+Token and cost accounting for Bedrock calls.
+
+Every call path reports usage differently:
+
+- Converse: ``response['usage']`` (inputTokens / outputTokens, plus
+  cacheReadInputTokens / cacheWriteInputTokens with prompt caching)
+- InvokeModel: ``x-amzn-bedrock-input-token-count`` / ``-output-token-count``
+  (and ``-cache-read-input-token-count`` / ``-cache-write-input-token-count``)
+  response headers
+- InvokeModelWithResponseStream: ``amazon-bedrock-invocationMetrics`` in the
+  last chunk
+
+Prompt-cache reads and writes are billed apart from regular input tokens,
+so they are counted separately and priced with ``CACHE_PRICES``.
+
+``CostLedger`` turns any of these into tokens and USD using ``PRICES`` and
+adds them to counters keyed by (tenant, route, model). Recording a call
+holds a lock only for the counter update; ``totals()`` groups a copy of
+the counters for a real-time view, and a background thread flushes
+the change since the last flush to a store (JSONL by default, or anything
+with a ``write_batch(records)`` method) every ``flush_interval`` seconds.
+
+    ledger = get_ledger()
+    response = bedrock.converse(...)
+    ledger.record_response(model_id, response, tenant="acme", route="/chat")
+    ledger.totals(by=("tenant",))
+"""
+
+import atexit
+import json
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+# USD per 1M tokens (input, output), by model ID prefix; the longest prefix wins
+PRICES: Dict[str, Tuple[float, float]] = {
+    "mistral.mistral-7b-instruct": (0.15, 0.20),
+    "mistral.mixtral-8x7b-instruct": (0.45, 0.70),
+    "mistral.mistral-large-2402": (4.0, 12.0),
+    "mistral.mistral-large-2407": (2.0, 6.0),
+    "mistral.mistral-large-3-675b-instruct": (0.50, 1.50),
+    "anthropic.claude-3-haiku": (0.25, 1.25),
+    "anthropic.claude-3-sonnet": (3.0, 15.0),
+    "anthropic.claude-3-5-sonnet": (3.0, 15.0),
+    "anthropic.claude-3-7-sonnet": (3.0, 15.0),
+    "anthropic.claude-sonnet-4": (3.0, 15.0),
+    "anthropic.claude-sonnet-4-5": (3.0, 15.0),
+    "anthropic.claude-3-opus": (15.0, 75.0),
+    "meta.llama3-8b-instruct": (0.30, 0.60),
+    "meta.llama3-70b-instruct": (2.65, 3.50),
+    "amazon.titan-text-premier": (0.50, 1.50),
+    "amazon.titan-embed-text-v2": (0.02, 0.0),
+}
+
+# Prompt-cache (read, write) price as a multiple of the input price, by model ID prefix
+CACHE_PRICES: Dict[str, Tuple[float, float]] = {
+    "anthropic.": (0.10, 1.25),
+    "amazon.nova": (0.25, 0.0),
+}
+
+_PROFILE_PREFIXES = ("us.", "eu.", "apac.", "global.")
+_price_cache: Dict[str, Optional[Tuple[float, float]]] = {}
+
+
+def set_price(model_prefix: str, input_price: float, output_price: float):
+    """Add or change a price (USD per 1M input / output tokens)"""
+    PRICES[model_prefix] = (input_price, output_price)
+    _price_cache.clear()
+
+
+def _base_model_id(model_id: str) -> str:
+    """Model ID without a cross-region inference profile prefix"""
+    for profile in _PROFILE_PREFIXES:
+        if model_id.startswith(profile):
+            return model_id[len(profile):]
+    return model_id
+
+
+def price_for(model_id: str) -> Optional[Tuple[float, float]]:
+    """(input, output) USD per 1M tokens for a model ID, or None if unknown"""
+    if model_id in _price_cache:
+        return _price_cache[model_id]
+    base_id = _base_model_id(model_id)
+    matches = [prefix for prefix in PRICES if base_id.startswith(prefix)]
+    price = PRICES[max(matches, key=len)] if matches else None
+    _price_cache[model_id] = price
+    return price
+
+
+def cache_price_for(model_id: str) -> Tuple[float, float]:
+    """(cache read, cache write) USD per 1M tokens; input price when not listed"""
+    price = price_for(model_id)
+    if price is None:
+        return 0.0, 0.0
+    base_id = _base_model_id(model_id)
+    matches = [prefix for prefix in CACHE_PRICES if base_id.startswith(prefix)]
+    read, write = CACHE_PRICES[max(matches, key=len)] if matches else (1.0, 1.0)
+    return price[0] * read, price[0] * write
+
+
+def model_cost(model_id: str, input_tokens: int, output_tokens: int,
+               cache_read_tokens: int = 0, cache_write_tokens: int = 0) -> float:
+    """USD cost of one call (0.0 for models without a price)"""
+    price = price_for(model_id)
+    if price is None:
+        return 0.0
+    cost = input_tokens * price[0] + output_tokens * price[1]
+    if cache_read_tokens or cache_write_tokens:
+        read_price, write_price = cache_price_for(model_id)
+        cost += cache_read_tokens * read_price + cache_write_tokens * write_price
+    return cost / 1_000_000
+
+
+def usage_from_response(response: Dict) -> Optional[Tuple[int, int, int, int]]:
+    """
+    (input_tokens, output_tokens, cache_read_tokens, cache_write_tokens)
+    from a converse or invoke_model response
+    """
+    usage = response.get('usage')
+    if usage is not None:
+        return (usage.get('inputTokens', 0), usage.get('outputTokens', 0),
+                usage.get('cacheReadInputTokens', 0), usage.get('cacheWriteInputTokens', 0))
+    headers = response.get('ResponseMetadata', {}).get('HTTPHeaders', {})
+    if 'x-amzn-bedrock-input-token-count' in headers:
+        return (
+            int(headers['x-amzn-bedrock-input-token-count']),
+            int(headers.get('x-amzn-bedrock-output-token-count', 0)),
+            int(headers.get('x-amzn-bedrock-cache-read-input-token-count', 0)),
+            int(headers.get('x-amzn-bedrock-cache-write-input-token-count', 0)),
+        )
+    return None
+
+
+def usage_from_chunk(chunk_bytes: bytes) -> Optional[Tuple[int, int, int, int]]:
+    """Usage as in usage_from_response if this stream chunk carries the invocation metrics"""
+    # Only the last chunk has them, so skip parsing every other chunk
+    if b'invocationMetrics' not in chunk_bytes:
+        return None
+    metrics = json.loads(chunk_bytes).get('amazon-bedrock-invocationMetrics')
+    if not metrics:
+        return None
+    return (metrics.get('inputTokenCount', 0), metrics.get('outputTokenCount', 0),
+            metrics.get('cacheReadInputTokenCount', 0), metrics.get('cacheWriteInputTokenCount', 0))
+
+
+class JsonlStore:
+    """Append flushed counter rows as JSON lines to a local file"""
+
+    def __init__(self, path='cost_ledger.jsonl'):
+        self.path = path
+
+    def write_batch(self, records: List[Dict]):
+        with open(self.path, 'a') as f:
+            f.write(''.join(json.dumps(record, separators=(',', ':')) + '\n' for record in records))
+
+
+# Counter slots: calls, input tokens, output tokens, cost (USD), cache read / write tokens
+_CALLS, _INPUT, _OUTPUT, _COST, _CACHE_READ, _CACHE_WRITE = range(6)
+_EMPTY = (0, 0, 0, 0.0, 0, 0)
+
+
+class CostLedger:
+    """
+    In-process cost counters per (tenant, route, model)
+
+    Counters are cumulative; flushes compare a snapshot against the totals
+    already written, so no update is lost between flushes.
+    """
+
+    KEY_FIELDS = ('tenant', 'route', 'model_id')
+
+    def __init__(self, store=None, flush_interval: float = 10.0):
+        self.store = store if store is not None else JsonlStore()
+        self.flush_interval = flush_interval
+        self.unpriced_models = set()
+
+        self._counters: Dict[tuple, list] = {}
+        self._counters_lock = threading.Lock()
+        self._flushed: Dict[tuple, list] = {}
+        self._flush_lock = threading.Lock()
+
+        self._stop = threading.Event()
+        self._thread = None
+        if flush_interval:
+            self._thread = threading.Thread(target=self._run, name='cost-ledger-flush', daemon=True)
+            self._thread.start()
+        atexit.register(self.close)
+
+    def record(self, model_id: str, input_tokens: int, output_tokens: int,
+               tenant: str = 'default', route: str = 'default',
+               cache_read_tokens: int = 0, cache_write_tokens: int = 0) -> float:
+        """Count one call; returns its cost in USD"""
+        if price_for(model_id) is None and model_id not in self.unpriced_models:
+            self.unpriced_models.add(model_id)
+            logger.warning(f"No price for model '{model_id}', its calls are recorded at $0; "
+                           "add one with cost_ledger.set_price")
+        cost = model_cost(model_id, input_tokens, output_tokens, cache_read_tokens, cache_write_tokens)
+        key = (tenant, route, model_id)
+        with self._counters_lock:
+            counters = self._counters.get(key)
+            if counters is None:
+                counters = self._counters[key] = list(_EMPTY)
+            counters[_CALLS] += 1
+            counters[_INPUT] += input_tokens
+            counters[_OUTPUT] += output_tokens
+            counters[_COST] += cost
+            counters[_CACHE_READ] += cache_read_tokens
+            counters[_CACHE_WRITE] += cache_write_tokens
+        return cost
+
+    def record_response(self, model_id: str, response: Dict, tenant: str = 'default',
+                        route: str = 'default') -> Optional[float]:
+        """Count a converse / invoke_model call from its usage; None if it reports none"""
+        usage = usage_from_response(response)
+        if usage is None:
+            return None
+        return self.record(model_id, usage[0], usage[1], tenant, route, usage[2], usage[3])
+
+    def record_chunk(self, model_id: str, chunk_bytes: bytes, tenant: str = 'default',
+                     route: str = 'default') -> Optional[float]:
+        """Count a streamed call when its last chunk (with invocation metrics) arrives"""
+        usage = usage_from_chunk(chunk_bytes)
+        if usage is None:
+            return None
+        return self.record(model_id, usage[0], usage[1], tenant, route, usage[2], usage[3])
+
+    def _snapshot(self) -> Dict[tuple, list]:
+        with self._counters_lock:
+            return {key: list(counters) for key, counters in self._counters.items()}
+
+    def totals(self, by: Sequence[str] = ('tenant', 'route', 'model_id')) -> Dict[tuple, Dict]:
+        """
+        Cumulative usage grouped by any of 'tenant', 'route', 'model_id'
+
+        e.g. totals(by=('tenant',)) -> {('acme',): {'calls': 12, 'input_tokens': ..., 'cost_usd': ...}}
+        """
+        positions = [self.KEY_FIELDS.index(field) for field in by]
+        grouped: Dict[tuple, list] = {}
+        for key, counters in self._snapshot().items():
+            group = grouped.setdefault(tuple(key[p] for p in positions), list(_EMPTY))
+            for i, value in enumerate(counters):
+                group[i] += value
+        return {
+            group: {'calls': c[_CALLS], 'input_tokens': c[_INPUT], 'output_tokens': c[_OUTPUT],
+                    'cache_read_tokens': c[_CACHE_READ], 'cache_write_tokens': c[_CACHE_WRITE],
+                    'cost_usd': round(c[_COST], 6)}
+            for group, c in grouped.items()
+        }
+
+    def flush(self):
+        """Write the usage recorded since the last flush to the store"""
+        with self._flush_lock:
+            now = datetime.utcnow().isoformat()
+            records, flushed = [], {}
+            for key, counters in self._snapshot().items():
+                previous = self._flushed.get(key, _EMPTY)
+                delta = [current - before for current, before in zip(counters, previous)]
+                if delta[_CALLS]:
+                    records.append(dict(
+                        zip(self.KEY_FIELDS, key),
+                        timestamp=now,
+                        calls=delta[_CALLS],
+                        input_tokens=delta[_INPUT],
+                        output_tokens=delta[_OUTPUT],
+                        cache_read_tokens=delta[_CACHE_READ],
+                        cache_write_tokens=delta[_CACHE_WRITE],
+                        cost_usd=round(delta[_COST], 8),
+                    ))
+                    flushed[key] = counters
+            if not records:
+                return
+            try:
+                self.store.write_batch(records)
+            except Exception as e:
+                # Keep the delta so the next flush retries it
+                logger.error(f"Failed to write {len(records)} cost ledger records: {e}")
+                return
+            self._flushed.update(flushed)
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def close(self):
+        """Stop the flush thread and write what is left"""
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        self.flush()
+
+
+_default_ledger = None
+_default_lock = threading.Lock()
+
+
+def get_ledger() -> CostLedger:
+    """Process-wide ledger writing to cost_ledger.jsonl"""
+    global _default_ledger
+    if _default_ledger is None:
+        with _default_lock:
+            if _default_ledger is None:
+                _default_ledger = CostLedger()
+    return _default_ledger
+
+
+if __name__ == "__main__":
+    import random
+    from concurrent.futures import ThreadPoolExecutor
+
+    class MemoryStore:
+        def __init__(self):
+            self.records = []
+
+        def write_batch(self, records):
+            self.records.extend(records)
+
+    ledger = CostLedger(store=MemoryStore(), flush_interval=0)
+
+    def simulate(i):
+        model_id = random.choice(["mistral.mistral-7b-instruct-v0:2", "mistral.mistral-large-2402-v1:0"])
+        ledger.record(model_id, random.randint(100, 800), random.randint(50, 400),
+                      tenant=f"tenant-{i % 3}", route=random.choice(["/chat", "ab_test"]))
+
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(simulate, range(10000)))
+
+    for group, row in sorted(ledger.totals(by=('tenant',)).items()):
+        print(group, row)
+    ledger.flush()
+    print(f"{len(ledger.store.records)} rows flushed, "
+          f"{sum(r['calls'] for r in ledger.store.records)} calls")
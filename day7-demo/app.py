@@ -1,6 +1,17 @@
+import os
+import sys
 import streamlit as st
-import boto3
-import json
+
+# Shared helper modules live at the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bedrock_clients import get_client
+from chat_history import add_message, display_history, reset_history
+from cost_ledger import get_ledger
+from model_codecs import get_codec
+
+MODEL_ID = "mistral.mistral-large-3-675b-instruct"
+CODEC = get_codec(MODEL_ID)
 
 # Configure page
 st.set_page_config(page_title="GenAI Chatbot", page_icon="🤖")
@@ -9,27 +20,25 @@ st.set_page_config(page_title="GenAI Chatbot", page_icon="🤖")
 @st.cache_resource
 def get_bedrock_client():
     """Cache the Bedrock client to avoid recreating on every rerun"""
-    return boto3.client('bedrock-runtime', region_name='us-east-1')
+    return get_client('bedrock-runtime')
 
 bedrock = get_bedrock_client()
 
 # Initialize chat history in session state
 if "messages" not in st.session_state:
-    st.session_state.messages = []
+    reset_history()
 
 # App title
 st.title("🤖 GenAI Chatbot with Bedrock")
 st.caption("Powered by Mistral Large")
 
 # Display chat history
-for message in st.session_state.messages:
-    with st.chat_message(message["role"]):
-        st.markdown(message["content"])
+display_history()
 
 # Chat input
 if prompt := st.chat_input("Ask me anything..."):
     # Add user message to history
-    st.session_state.messages.append({"role": "user", "content": prompt})
+    add_message("user", prompt)
     with st.chat_message("user"):
         st.markdown(prompt)
     
@@ -37,30 +46,21 @@ if prompt := st.chat_input("Ask me anything..."):
     with st.chat_message("assistant"):
         with st.spinner("Thinking..."):
             # Prepare request for Bedrock
-            body = json.dumps({
-                "max_tokens": 1000,
-                "messages": [
-                    {"role": msg["role"], "content": msg["content"]}
-                    for msg in st.session_state.messages
-                ]
-            })
+            body = CODEC.encode_messages(st.session_state.messages, max_tokens=1000)
 
             # Invoke Bedrock
             response = bedrock.invoke_model(
-                modelId="mistral.mistral-large-3-675b-instruct",
+                modelId=MODEL_ID,
                 body=body
             )
 
             # Parse response
-            response_body = json.loads(response['body'].read())
-            assistant_message = response_body['choices'][0]['message']['content']
+            get_ledger().record_response(MODEL_ID, response, route="day7_app")
+            assistant_message = CODEC.decode_response(response)
             
             # Display and save response
             st.markdown(assistant_message)
-            st.session_state.messages.append({
-                "role": "assistant",
-                "content": assistant_message
-            })
+            add_message("assistant", assistant_message)
 
 # Sidebar with info
 with st.sidebar:
@@ -73,5 +73,5 @@ with st.sidebar:
     """)
     
     if st.button("Clear Chat History"):
-        st.session_state.messages = []
+        reset_history()
         st.rerun()
\ No newline at end of file
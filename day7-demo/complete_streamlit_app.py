@@ -3,9 +3,24 @@ Streamlit GenAI Chatbot - Complete Solution (Mistral Version)
 Lab 1 for Day 7: GenAI Application Development
 """
 
+import os
+import sys
+from functools import partial
 import streamlit as st
-import boto3
-import json
+
+# Shared helper modules live at the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bedrock_clients import get_client
+from chat_history import ROLE_LABELS, add_message, display_history, export_history, reset_history
+from context_builder import MistralContextBuilder
+from cost_ledger import get_ledger
+from model_codecs import get_codec
+from token_counter import count_tokens
+
+MODEL_ID = "mistral.mistral-large-2402-v1:0"
+SUMMARY_MODEL_ID = "mistral.mistral-7b-instruct-v0:2"
+CODEC = get_codec(MODEL_ID)
 
 # Configure page
 st.set_page_config(
@@ -18,32 +33,95 @@ st.set_page_config(
 @st.cache_resource
 def get_bedrock_client():
     """Create and cache Bedrock runtime client"""
-    return boto3.client('bedrock-runtime', region_name='us-east-1')
+    return get_client('bedrock-runtime')
 
 bedrock = get_bedrock_client()
 
 # Initialize session state for conversation history
 if "messages" not in st.session_state:
-    st.session_state.messages = []
+    reset_history()
+
+# Keep whatever was streamed before a reply was interrupted by a new message
+if pending := st.session_state.pop("pending_reply", None):
+    if pending["parts"]:
+        add_message("assistant", "".join(pending["parts"]).strip() + " …", MODEL_ID)
+
+def summarize_turns(previous_summary, dropped_messages):
+    """Fold turns that no longer fit the context into a short running summary"""
+    transcript = "\n".join(
+        f"{ROLE_LABELS.get(msg['role'], msg['role'])}: {msg['content']}"
+        for msg in dropped_messages
+    )
+    prompt = (
+        "Update the summary of this conversation in at most 150 words. "
+        "Keep names, facts and open questions.\n\n"
+        f"Current summary:\n{previous_summary or '(none)'}\n\n"
+        f"New messages:\n{transcript}"
+    )
+    codec = get_codec(SUMMARY_MODEL_ID)
+    response = bedrock.invoke_model(
+        modelId=SUMMARY_MODEL_ID,
+        body=codec.encode_prompt(f"<s>[INST] {prompt} [/INST]", max_tokens=300, temperature=0.2)
+    )
+    get_ledger().record_response(SUMMARY_MODEL_ID, response, route="history_summary")
+    return codec.decode_response(response)
+
+# One context builder per session so its rolling summary is reused across turns
+if "context_builder" not in st.session_state:
+    st.session_state.context_builder = MistralContextBuilder(
+        max_context_tokens=32000,  # Mistral Large 2 context window
+        max_output_tokens=1000,
+        count_tokens=partial(count_tokens, model_id=MODEL_ID)
+    )
 
 # Helper function to format conversation for Mistral
 def format_conversation_for_mistral(messages):
     """
     Format conversation history for Mistral's prompt template
-    Mistral uses: <s>[INST] user message [/INST] assistant response </s>
-    """
-    if not messages:
-        return ""
+    Mistral uses: <s>[INST] user message [/INST] assistant response</s>
     
-    formatted = "<s>"
-    for msg in messages:
-        if msg["role"] == "user":
-            formatted += f"[INST] {msg['content']} [/INST]"
-        else:
-            formatted += f" {msg['content']} </s><s>"
+    Only the newest turns that fit the context budget are sent; older turns
+    are dropped or, when enabled, replaced by a rolling summary.
+    """
+    builder = st.session_state.context_builder
+    builder.summarize = summarize_turns if st.session_state.get("summarize_history") else None
+    return builder.build(messages)
+
+def build_request_body():
+    """Prepare the Mistral request for the current conversation"""
+    formatted_prompt = format_conversation_for_mistral(st.session_state.messages)
+    return CODEC.encode_prompt(
+        formatted_prompt,
+        max_tokens=1000,
+        temperature=st.session_state.get("temperature", 0.7),
+        top_p=0.9,
+        top_k=50
+    )
+
+def stream_reply(response):
+    """
+    Yield text deltas from a Bedrock response stream
     
-    # Remove trailing <s> if present
-    return formatted.rstrip("<s>")
+    When a new message arrives mid-reply, Streamlit stops this run and
+    abandons the generator; the HTTP stream is then closed in ``finally``
+    so the interrupted generation does not keep running.
+    """
+    event_stream = response["body"]
+    parts = []
+    st.session_state.pending_reply = {"parts": parts}
+    try:
+        for event in event_stream:
+            chunk = event.get("chunk")
+            if not chunk:
+                continue
+            # The last chunk carries the token counts for the whole call
+            get_ledger().record_chunk(MODEL_ID, chunk["bytes"], route="chat")
+            delta = CODEC.decode_chunk(chunk["bytes"])
+            if delta:
+                parts.append(delta)
+                yield delta
+    finally:
+        event_stream.close()
 
 # App header
 st.title("🤖 GenAI Chatbot with Amazon Bedrock")
@@ -54,14 +132,12 @@ col1, col2 = st.columns([3, 1])
 
 with col1:
     # Display existing chat messages
-    for message in st.session_state.messages:
-        with st.chat_message(message["role"]):
-            st.markdown(message["content"])
+    display_history()
     
     # Chat input
     if prompt := st.chat_input("Ask me anything..."):
         # Add user message to history
-        st.session_state.messages.append({"role": "user", "content": prompt})
+        add_message("user", prompt, MODEL_ID)
         
         # Display user message
         with st.chat_message("user"):
@@ -69,47 +145,41 @@ with col1:
         
         # Generate and display AI response
         with st.chat_message("assistant"):
-            with st.spinner("Thinking..."):
-                try:
-                    # Format the entire conversation for Mistral
-                    formatted_prompt = format_conversation_for_mistral(st.session_state.messages)
-                    
-                    # Prepare request for Bedrock (Mistral format)
-                    body = json.dumps({
-                        "prompt": formatted_prompt,
-                        "max_tokens": 1000,
-                        "temperature": st.session_state.get("temperature", 0.7),
-                        "top_p": 0.9,
-                        "top_k": 50
-                    })
-                    
-                    # Invoke Bedrock with Mistral model
-                    response = bedrock.invoke_model(
-                        modelId="mistral.mistral-large-2402-v1:0",
-                        body=body
+            try:
+                if st.session_state.get("stream_responses", True):
+                    # Render tokens as they arrive instead of waiting for the full body
+                    response = bedrock.invoke_model_with_response_stream(
+                        modelId=MODEL_ID,
+                        body=build_request_body()
                     )
-                    
-                    # Parse Mistral response
-                    response_body = json.loads(response['body'].read())
-                    assistant_message = response_body['outputs'][0]['text'].strip()
-                    
-                    # Display response
-                    st.markdown(assistant_message)
-                    
-                    # Add to history
-                    st.session_state.messages.append({
-                        "role": "assistant",
-                        "content": assistant_message
-                    })
-                    
-                except Exception as e:
-                    st.error(f"Error: {str(e)}")
-                    st.info("""
-                    Make sure you have:
-                    - AWS credentials configured
-                    - Mistral model access enabled in Bedrock console
-                    - Correct region (us-east-1)
-                    """)
+                    assistant_message = st.write_stream(stream_reply(response)).strip()
+                    st.session_state.pop("pending_reply", None)
+                else:
+                    with st.spinner("Thinking..."):
+                        # Invoke Bedrock with Mistral model
+                        response = bedrock.invoke_model(
+                            modelId=MODEL_ID,
+                            body=build_request_body()
+                        )
+                        
+                        # Parse Mistral response
+                        get_ledger().record_response(MODEL_ID, response, route="chat")
+                        assistant_message = CODEC.decode_response(response)
+                        
+                        # Display response
+                        st.markdown(assistant_message)
+                
+                # Add to history
+                add_message("assistant", assistant_message, MODEL_ID)
+                
+            except Exception as e:
+                st.error(f"Error: {str(e)}")
+                st.info("""
+                Make sure you have:
+                - AWS credentials configured
+                - Mistral model access enabled in Bedrock console
+                - Correct region (us-east-1)
+                """)
 
 # Sidebar controls
 with col2:
@@ -126,6 +196,20 @@ with col2:
     )
     st.session_state.temperature = temperature
     
+    # Streaming toggle
+    st.toggle(
+        "Stream responses",
+        value=True,
+        key="stream_responses",
+        help="Show the answer token by token as it is generated"
+    )
+    st.toggle(
+        "Summarize older turns",
+        value=False,
+        key="summarize_history",
+        help="Replace turns that no longer fit the context with a short summary"
+    )
+    
     # Model info
     with st.expander("Model Info"):
         st.info("""
@@ -143,15 +227,15 @@ with col2:
     
     with col_clear:
         if st.button("🗑️ Clear Chat", use_container_width=True):
-            st.session_state.messages = []
+            reset_history()
+            st.session_state.context_builder.reset()
             st.rerun()
     
     with col_export:
         if st.session_state.messages:
-            chat_export = json.dumps(st.session_state.messages, indent=2)
             st.download_button(
                 "💾 Export",
-                chat_export,
+                export_history(),
                 "chat_history.json",
                 "application/json",
                 use_container_width=True
@@ -163,12 +247,15 @@ with col2:
     st.metric("Messages", len(st.session_state.messages))
     
     if st.session_state.messages:
-        total_chars = sum(len(msg["content"]) for msg in st.session_state.messages)
+        total_chars = st.session_state.total_chars
         st.metric("Total Characters", f"{total_chars:,}")
         
-        # Estimate tokens (rough: ~4 chars per token)
-        estimated_tokens = total_chars // 4
-        st.metric("Est. Tokens", f"{estimated_tokens:,}")
+        # Counted with the Mistral tokenizer when available, else estimated
+        st.metric("Est. Tokens", f"{st.session_state.total_tokens:,}")
+    
+    # Billed usage of every session served by this process
+    spend = sum(row["cost_usd"] for row in get_ledger().totals(by=()).values())
+    st.metric("App Spend (USD)", f"${spend:.4f}")
     
     # Information
     st.divider()
@@ -182,6 +269,7 @@ with col2:
     **Features:**
     - Multi-turn conversations
     - Adjustable temperature
+    - Streaming responses
     - Export chat logs
     """)
 
@@ -1,22 +1,40 @@
-import boto3
 import json
 import numpy as np
 from numpy.linalg import norm
 
+from bedrock_clients import get_client
 
-client = boto3.client(
-    service_name="bedrock-runtime",
-    region_name="us-east-1"
-)
 
+client = get_client("bedrock-runtime")
 
-def generate_embedding(input_text):
+
+# Output sizes supported by Titan Text Embeddings V2
+TITAN_V2_DIMENSIONS = (256, 512, 1024)
+
+
+def generate_embedding(input_text, dimensions=1024, normalize=True):
+    """
+    Titan Text Embeddings V2 vector for a text, as a float32 array
+
+    Args:
+        input_text: Text to embed
+        dimensions: 256, 512 or 1024; smaller vectors mean smaller indexes
+            and faster scoring at a small cost in accuracy
+        normalize: Return a unit-length vector, so cosine similarity is a
+            plain dot product (Titan's default; vectors already stored
+            were embedded this way)
+
+    Returns a numpy float32 array rather than a list; call ``.tolist()``
+    before passing it to ``json.dumps``.
+    """
+    if dimensions not in TITAN_V2_DIMENSIONS:
+        raise ValueError(f"dimensions must be one of {TITAN_V2_DIMENSIONS}, got {dimensions}")
     
     # Set the model ID, e.g., Titan Text Embeddings V2.
     model_id = "amazon.titan-embed-text-v2:0"
 
     # Create the request for the model.
-    native_request = {"inputText": input_text}
+    native_request = {"inputText": input_text, "dimensions": dimensions, "normalize": normalize}
 
     # Convert the native request to JSON.
     request = json.dumps(native_request)
@@ -28,8 +46,7 @@ def generate_embedding(input_text):
     model_response = json.loads(response["body"].read())
 
     # Extract and print the generated embedding and the input text token count.
-    # embedding = np.array(model_response["embedding"])
-    embedding = model_response["embedding"]
+    embedding = np.asarray(model_response["embedding"], dtype=np.float32)
 
     input_token_count = model_response["inputTextTokenCount"]
 
@@ -1,54 +1,217 @@
-import boto3
-from typing import Dict, List
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional
+
+from bedrock_clients import get_client
+
+# Model family prefixes to search for, in matching order
+MODEL_FAMILIES = ('titan', 'claude', 'llama', 'mistral')
+
+DEFAULT_CACHE_DIR = os.environ.get(
+    'BEDROCK_CATALOG_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'bedrock')
+)
+
+
+def model_family(model_id: str) -> Optional[str]:
+    """Family of a model ID ('titan', 'claude', 'llama', 'mistral') or None"""
+    model_id_lower = model_id.lower()
+    for family in MODEL_FAMILIES:
+        if family in model_id_lower:
+            return family
+    return None
+
+
+def _selection_key(model: Dict):
+    # Deterministic preference: on-demand before provisioned-only, then by model ID
+    on_demand = 'ON_DEMAND' in model.get('inferenceTypesSupported', [])
+    return (not on_demand, model['modelId'])
+
+
+class ModelCatalog:
+    """
+    Cached catalog of active Bedrock foundation models
+
+    The model list is kept in a JSON snapshot on disk, so a service starts
+    without calling the Bedrock control plane when a snapshot exists. Once
+    the snapshot is older than ``ttl_seconds`` the next lookup still answers
+    from memory and a background thread refreshes it. Only models whose
+    lifecycle status is ACTIVE are kept, indexed by family, input/output
+    modality and streaming support.
+    """
+
+    def __init__(self, region_name: str = 'us-east-1', cache_path: Optional[str] = None,
+                 ttl_seconds: float = 24 * 3600, client=None):
+        self.region_name = region_name
+        self.cache_path = cache_path or os.path.join(DEFAULT_CACHE_DIR, f'model_catalog_{region_name}.json')
+        self.ttl_seconds = ttl_seconds
+        self._client = client
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self.fetched_at = 0.0
+        self._index([])
+        self._load_snapshot()
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = get_client('bedrock', region_name=self.region_name)
+        return self._client
+
+    def _index(self, models: List[Dict]):
+        """Rebuild the lookup tables; swapped in as a whole so readers never see a partial index"""
+        models = sorted(models, key=_selection_key)
+        by_id = {model['modelId']: model for model in models}
+        by_family: Dict[str, List[Dict]] = {}
+        by_input: Dict[str, List[Dict]] = {}
+        by_output: Dict[str, List[Dict]] = {}
+        streaming = set()
+        for model in models:
+            family = model_family(model['modelId'])
+            if family:
+                by_family.setdefault(family, []).append(model)
+            for modality in model.get('inputModalities', []):
+                by_input.setdefault(modality, []).append(model)
+            for modality in model.get('outputModalities', []):
+                by_output.setdefault(modality, []).append(model)
+            if model.get('responseStreamingSupported'):
+                streaming.add(model['modelId'])
+        self._tables = (by_id, by_family, by_input, by_output, streaming)
+
+    def _load_snapshot(self):
+        try:
+            with open(self.cache_path, 'r') as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            return
+        self._index(snapshot.get('models', []))
+        self.fetched_at = snapshot.get('fetched_at', 0.0)
+
+    def _save_snapshot(self, models: List[Dict]):
+        directory = os.path.dirname(os.path.abspath(self.cache_path))
+        os.makedirs(directory, exist_ok=True)
+        with tempfile.NamedTemporaryFile('w', dir=directory, suffix='.tmp', delete=False) as f:
+            json.dump({'fetched_at': self.fetched_at, 'region': self.region_name, 'models': models}, f)
+            temp_path = f.name
+        os.replace(temp_path, self.cache_path)
+
+    def _fetch(self) -> List[Dict]:
+        """All ACTIVE model summaries, following nextToken if the API pages"""
+        models, kwargs, seen_tokens = [], {}, set()
+        while True:
+            response = self.client.list_foundation_models(**kwargs)
+            models.extend(
+                model for model in response.get('modelSummaries', [])
+                if model.get('modelLifecycle', {}).get('status', 'ACTIVE') == 'ACTIVE'
+            )
+            token = response.get('nextToken')
+            if not token or token in seen_tokens:
+                return models
+            seen_tokens.add(token)
+            kwargs['nextToken'] = token
+
+    def refresh(self):
+        """Fetch the model list now and replace the snapshot"""
+        models = self._fetch()
+        self.fetched_at = time.time()
+        self._index(models)
+        try:
+            self._save_snapshot(models)
+        except OSError as e:
+            print(f"Could not write model catalog snapshot: {str(e)}")
+
+    def _background_refresh(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            print(f"Error refreshing Bedrock model catalog: {str(e)}")
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    @property
+    def is_stale(self) -> bool:
+        return time.time() - self.fetched_at > self.ttl_seconds
+
+    def _ensure_fresh(self):
+        if not self.fetched_at:
+            # No snapshot at all: the first lookup has to wait for the list
+            with self._lock:
+                if not self.fetched_at:
+                    self.refresh()
+            return
+        if self.is_stale:
+            with self._lock:
+                if self._refreshing:
+                    return
+                self._refreshing = True
+            threading.Thread(target=self._background_refresh, name='model-catalog-refresh', daemon=True).start()
+
+    def models(self, family: Optional[str] = None, input_modality: Optional[str] = None,
+               output_modality: Optional[str] = None, streaming: Optional[bool] = None) -> List[Dict]:
+        """Active model summaries matching every given filter, in selection order"""
+        self._ensure_fresh()
+        by_id, by_family, by_input, by_output, streaming_ids = self._tables
+        if family is not None:
+            candidates = by_family.get(family, [])
+        elif input_modality is not None:
+            candidates = by_input.get(input_modality, [])
+        elif output_modality is not None:
+            candidates = by_output.get(output_modality, [])
+        else:
+            candidates = list(by_id.values())
+        return [
+            model for model in candidates
+            if (input_modality is None or input_modality in model.get('inputModalities', []))
+            and (output_modality is None or output_modality in model.get('outputModalities', []))
+            and (streaming is None or (model['modelId'] in streaming_ids) == streaming)
+        ]
+
+    def select(self, family: str, **filters) -> Optional[str]:
+        """Preferred active model ID for a family (same answer for the same catalog)"""
+        matches = self.models(family=family, **filters)
+        return matches[0]['modelId'] if matches else None
+
+    def get(self, model_id: str) -> Optional[Dict]:
+        self._ensure_fresh()
+        return self._tables[0].get(model_id)
+
+
+_catalogs: Dict[str, ModelCatalog] = {}
+
+
+def get_catalog(region_name: str = 'us-east-1') -> ModelCatalog:
+    """Shared catalog per region"""
+    catalog = _catalogs.get(region_name)
+    if catalog is None:
+        catalog = _catalogs.setdefault(region_name, ModelCatalog(region_name))
+    return catalog
+
 
 def list_and_select_bedrock_models() -> Dict[str, str]:
     """
-    List active Bedrock models and select one active model each for 
+    List active Bedrock models and select one active model each for
     Titan, Claude, Llama, and Mistral.
-    
+
     Returns:
         Dict[str, str]: Dictionary with model families as keys and selected model IDs as values
     """
-    bedrock = boto3.client('bedrock', region_name='us-east-1')
-    
-    # Model family prefixes to search for
-    model_families = {
-        'titan': [],
-        'claude': [],
-        'llama': [],
-        'mistral': []
-    }
-    
     try:
-        # List all available models
-        response = bedrock.list_foundation_models()
-        models = response.get('modelSummaries', [])
-        
-        # Categorize models by family
-        for model in models:
-            model_id = model['modelId']
-            model_id_lower = model_id.lower()
-            
-            if 'titan' in model_id_lower:
-                model_families['titan'].append(model_id)
-            elif 'claude' in model_id_lower:
-                model_families['claude'].append(model_id)
-            elif 'llama' in model_id_lower:
-                model_families['llama'].append(model_id)
-            elif 'mistral' in model_id_lower:
-                model_families['mistral'].append(model_id)
-        
-        # Select the first active model from each family
+        catalog = get_catalog('us-east-1')
+
         selected_models = {}
-        for family, models_list in model_families.items():
-            if models_list:
-                selected_models[family] = models_list[0]
-                print(f"{family.capitalize()}: {models_list[0]}")
+        for family in MODEL_FAMILIES:
+            model_id = catalog.select(family)
+            if model_id:
+                selected_models[family] = model_id
+                print(f"{family.capitalize()}: {model_id}")
             else:
                 print(f"{family.capitalize()}: No models found")
-        
+
         return selected_models
-    
+
     except Exception as e:
         print(f"Error listing Bedrock models: {str(e)}")
         return {}
@@ -57,4 +220,4 @@ def list_and_select_bedrock_models() -> Dict[str, str]:
 if __name__ == "__main__":
     selected = list_and_select_bedrock_models()
     print("\nSelected Models:")
-    print(selected)
\ No newline at end of file
+    print(selected)
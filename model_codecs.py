@@ -0,0 +1,294 @@
+"""
+Request/response codecs for Bedrock's native InvokeModel API.
+
+Every model family has its own JSON body and its own response path
+(``outputs[0].text``, ``choices[0].message.content``, ``content[0].text``,
+``generation``, ...). A codec knows one family's format, and ``get_codec``
+finds the codec for a model ID by its longest registered prefix:
+
+    codec = get_codec("mistral.mistral-large-2402-v1:0")
+    response = bedrock.invoke_model(modelId=model_id, body=codec.encode_prompt(prompt, max_tokens=500))
+    text = codec.decode_response(response)
+
+Generic parameters (``max_tokens``, ``temperature``, ``top_p``, ``top_k``) are
+mapped to each family's native names. For every distinct parameter set the
+body is serialized once into a template with a slot for the prompt or
+messages, so encoding a request only serializes the part that changes.
+orjson is used for (de)serialization when it is installed.
+
+Adding a model is one line, e.g. ``register_codec("mistral.pixtral", MISTRAL_CHAT)``.
+"""
+
+import json
+import threading
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Union
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+
+if orjson is not None:
+    def dumps(obj) -> bytes:
+        return orjson.dumps(obj)
+
+    loads = orjson.loads
+else:
+    def dumps(obj) -> bytes:
+        return json.dumps(obj, separators=(',', ':')).encode()
+
+    loads = json.loads
+
+
+Messages = List[Dict[str, str]]
+
+_SLOT = '__codec_slot__'
+_SLOT_JSON = dumps(_SLOT)
+
+
+def format_mistral_prompt(messages: Messages, system: Optional[str] = None) -> str:
+    """<s>[INST] user [/INST] assistant</s>[INST] user [/INST]"""
+    parts = ["<s>"]
+    pending_system = system
+    for message in messages:
+        if message["role"] == "user":
+            content = message["content"]
+            if pending_system:
+                content = f"{pending_system}\n\n{content}"
+                pending_system = None
+            parts.append(f"[INST] {content} [/INST]")
+        elif message["role"] == "assistant":
+            parts.append(f" {message['content']}</s>")
+    return "".join(parts)
+
+
+def format_llama3_prompt(messages: Messages, system: Optional[str] = None) -> str:
+    """Llama 3 chat template, ending with an open assistant header"""
+    parts = ["<|begin_of_text|>"]
+    turns = ([{"role": "system", "content": system}] if system else []) + list(messages)
+    for message in turns:
+        parts.append(
+            f"<|start_header_id|>{message['role']}<|end_header_id|>\n\n{message['content']}<|eot_id|>"
+        )
+    parts.append("<|start_header_id|>assistant<|end_header_id|>\n\n")
+    return "".join(parts)
+
+
+def _compile_path(path: Sequence[Union[str, int]]) -> Callable[[Dict], Optional[str]]:
+    """Getter for a nested key/index path that returns None when any step is missing"""
+    def get(payload):
+        value = payload
+        for step in path:
+            try:
+                value = value[step]
+            except (KeyError, IndexError, TypeError):
+                return None
+        return value
+    return get
+
+
+class ModelCodec:
+    """
+    Encoder/decoder for one family's native request and response format
+
+    Args:
+        name: Label for logs and debugging
+        build: Function (slot, params) -> request dict, where ``slot`` stands
+            in for the prompt or message list and ``params`` holds native
+            parameter names
+        param_names: Generic -> native parameter names; generic names not
+            listed are dropped
+        text_path: Path to the generated text in a full response
+        stream_path: Path to the text delta in one stream chunk
+        chat: True if the body takes a message list, False if a prompt string
+        format_messages: For prompt-style codecs, turns messages (and an
+            optional system prompt) into a prompt string
+        defaults: Native parameters sent unless overridden
+    """
+
+    _MAX_TEMPLATES = 256
+
+    def __init__(self, name: str, build: Callable[[object, Dict], Dict], param_names: Dict[str, str],
+                 text_path: Sequence[Union[str, int]], stream_path: Sequence[Union[str, int]],
+                 chat: bool = False, format_messages: Optional[Callable[..., str]] = None,
+                 defaults: Optional[Dict] = None):
+        self.name = name
+        self.build = build
+        self.param_names = param_names
+        self.chat = chat
+        self.format_messages = format_messages
+        self.defaults = defaults or {}
+        self.text = _compile_path(text_path)
+        self.stream_text = _compile_path(stream_path)
+        self._templates: Dict[tuple, tuple] = {}
+        self._lock = threading.Lock()
+
+    def _template(self, params: Dict) -> tuple:
+        """(prefix, suffix) around the slot for one parameter set"""
+        key = tuple(sorted(params.items()))
+        template = self._templates.get(key)
+        if template is None:
+            native = dict(self.defaults)
+            for generic, value in params.items():
+                native_name = self.param_names.get(generic)
+                if native_name is not None and value is not None:
+                    native[native_name] = value
+            prefix, _, suffix = dumps(self.build(_SLOT, native)).partition(_SLOT_JSON)
+            template = (prefix, suffix)
+            with self._lock:
+                if len(self._templates) >= self._MAX_TEMPLATES:
+                    self._templates.clear()
+                self._templates[key] = template
+        return template
+
+    def _encode(self, value, params: Dict) -> bytes:
+        prefix, suffix = self._template(params)
+        return prefix + dumps(value) + suffix
+
+    def encode_prompt(self, prompt: str, **params) -> bytes:
+        """
+        Request body for a ready-made prompt string
+
+        Prompt-style models get the string as-is (already in the model's
+        template); chat models get it as a single user message.
+        """
+        if self.chat:
+            return self._encode([{"role": "user", "content": prompt}], params)
+        return self._encode(prompt, params)
+
+    def encode_messages(self, messages: Messages, system: Optional[str] = None, **params) -> bytes:
+        """Request body for a [{"role", "content"}, ...] conversation"""
+        if self.chat:
+            messages = [{"role": m["role"], "content": m["content"]} for m in messages]
+            if system:
+                if "system" in self.param_names:
+                    params = dict(params, system=system)
+                else:
+                    messages.insert(0, {"role": "system", "content": system})
+            return self._encode(messages, params)
+        return self._encode(self.format_messages(messages, system), params)
+
+    def decode(self, body: Union[bytes, str, Dict]) -> Optional[str]:
+        """Generated text from a full response body"""
+        payload = loads(body) if isinstance(body, (bytes, bytearray, str)) else body
+        return self.text(payload)
+
+    def decode_response(self, response: Dict) -> str:
+        """Generated text from an invoke_model response (reads the body stream)"""
+        text = self.decode(response['body'].read())
+        return (text or '').strip()
+
+    def decode_chunk(self, chunk_bytes: bytes) -> Optional[str]:
+        """Text delta from one invoke_model_with_response_stream chunk, or None"""
+        return self.stream_text(loads(chunk_bytes))
+
+    def iter_stream(self, response: Dict) -> Iterator[str]:
+        """Text deltas from an invoke_model_with_response_stream response"""
+        for event in response['body']:
+            chunk = event.get('chunk')
+            if chunk:
+                delta = self.stream_text(loads(chunk['bytes']))
+                if delta:
+                    yield delta
+
+
+MISTRAL_PROMPT = ModelCodec(
+    "mistral-prompt",
+    build=lambda slot, native: {"prompt": slot, **native},
+    param_names={"max_tokens": "max_tokens", "temperature": "temperature", "top_p": "top_p", "top_k": "top_k"},
+    text_path=("outputs", 0, "text"),
+    stream_path=("outputs", 0, "text"),
+    format_messages=format_mistral_prompt,
+)
+
+MISTRAL_CHAT = ModelCodec(
+    "mistral-chat",
+    build=lambda slot, native: {"messages": slot, **native},
+    param_names={"max_tokens": "max_tokens", "temperature": "temperature", "top_p": "top_p"},
+    text_path=("choices", 0, "message", "content"),
+    stream_path=("choices", 0, "delta", "content"),
+    chat=True,
+)
+
+CLAUDE = ModelCodec(
+    "anthropic-messages",
+    build=lambda slot, native: {"anthropic_version": "bedrock-2023-05-31", "messages": slot, **native},
+    param_names={"max_tokens": "max_tokens", "temperature": "temperature", "top_p": "top_p",
+                 "top_k": "top_k", "system": "system"},
+    text_path=("content", 0, "text"),
+    stream_path=("delta", "text"),
+    chat=True,
+    defaults={"max_tokens": 512},
+)
+
+LLAMA = ModelCodec(
+    "meta-llama",
+    build=lambda slot, native: {"prompt": slot, **native},
+    param_names={"max_tokens": "max_gen_len", "temperature": "temperature", "top_p": "top_p"},
+    text_path=("generation",),
+    stream_path=("generation",),
+    format_messages=format_llama3_prompt,
+)
+
+TITAN_TEXT = ModelCodec(
+    "amazon-titan-text",
+    build=lambda slot, native: {"inputText": slot, "textGenerationConfig": native},
+    param_names={"max_tokens": "maxTokenCount", "temperature": "temperature", "top_p": "topP"},
+    text_path=("results", 0, "outputText"),
+    stream_path=("outputText",),
+    format_messages=lambda messages, system=None: "\n".join(
+        ([system] if system else []) +
+        [f"{'User' if m['role'] == 'user' else 'Bot'}: {m['content']}" for m in messages]
+    ) + "\nBot:",
+)
+
+# Model ID prefix -> codec; the longest matching prefix wins
+_registry: Dict[str, ModelCodec] = {}
+_resolved: Dict[str, ModelCodec] = {}
+
+
+def register_codec(prefix: str, codec: ModelCodec):
+    """Use ``codec`` for every model ID starting with ``prefix``"""
+    _registry[prefix] = codec
+    _resolved.clear()
+
+
+register_codec("mistral.", MISTRAL_PROMPT)
+register_codec("mistral.mistral-large-3", MISTRAL_CHAT)
+register_codec("mistral.magistral", MISTRAL_CHAT)
+register_codec("anthropic.", CLAUDE)
+register_codec("meta.", LLAMA)
+register_codec("amazon.titan-text", TITAN_TEXT)
+register_codec("amazon.titan-tg1", TITAN_TEXT)
+
+# Cross-region inference profile prefixes, e.g. "us.anthropic.claude-..."
+_PROFILE_PREFIXES = ("us.", "eu.", "apac.", "global.")
+
+
+def get_codec(model_id: str) -> ModelCodec:
+    """Codec for a model ID or inference profile ID"""
+    codec = _resolved.get(model_id)
+    if codec is not None:
+        return codec
+
+    base_id = model_id
+    for profile in _PROFILE_PREFIXES:
+        if base_id.startswith(profile):
+            base_id = base_id[len(profile):]
+            break
+    matches = [prefix for prefix in _registry if base_id.startswith(prefix)]
+    if not matches:
+        raise KeyError(f"No codec registered for model '{model_id}'")
+    codec = _registry[max(matches, key=len)]
+    _resolved[model_id] = codec
+    return codec
+
+
+if __name__ == "__main__":
+    for model_id in ["mistral.mistral-large-2402-v1:0", "mistral.mistral-large-3-675b-instruct",
+                     "us.anthropic.claude-3-haiku-20240307-v1:0", "meta.llama3-8b-instruct-v1:0",
+                     "amazon.titan-text-premier-v1:0"]:
+        codec = get_codec(model_id)
+        body = codec.encode_messages([{"role": "user", "content": "Hello"}], max_tokens=256, temperature=0.5)
+        print(f"{model_id} [{codec.name}]: {body.decode()}")
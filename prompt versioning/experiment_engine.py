@@ -0,0 +1,208 @@
+import hashlib
+import math
+import random
+import threading
+from bisect import bisect_right
+from typing import Dict, List, Optional, Sequence
+
+
+def bucket(unit_key: str, salt: str) -> float:
+    """Stable position in [0, 1) for a user/session key within one experiment"""
+    digest = hashlib.sha256(f"{salt}:{unit_key}".encode()).digest()
+    return int.from_bytes(digest[:8], 'big') / 2 ** 64
+
+
+class ArmStats:
+    """Running reward statistics for one variant"""
+
+    def __init__(self):
+        self.pulls = 0
+        self.reward_sum = 0.0
+        self.tokens_sum = 0
+        # Beta posterior for Thompson sampling (fractional rewards allowed)
+        self.alpha = 1.0
+        self.beta = 1.0
+
+    @property
+    def mean_reward(self) -> float:
+        return self.reward_sum / self.pulls if self.pulls else 0.0
+
+    @property
+    def avg_tokens(self) -> float:
+        return self.tokens_sum / self.pulls if self.pulls else 0.0
+
+
+class Experiment:
+    """
+    Sticky traffic split between prompt variants
+
+    Every user/session key hashes to a fixed point in [0, 1), and the
+    variant is whichever weight interval that point falls in, so the same
+    user keeps seeing the same prompt as long as the weights hold.
+
+    Modes:
+        weighted: fixed traffic weights
+        thompson: weights follow each variant's probability of being best
+            under a Beta posterior of the observed rewards
+        ucb: most traffic goes to the variant with the highest UCB1 score
+
+    Rewards combine satisfaction (1-5 scale) with a token-cost penalty, so
+    a cheaper prompt that satisfies users just as well wins traffic.
+    """
+
+    MODES = ('weighted', 'thompson', 'ucb')
+
+    def __init__(
+        self,
+        name: str,
+        variants: Sequence[str],
+        weights: Optional[Sequence[float]] = None,
+        mode: str = 'weighted',
+        cost_weight: float = 0.2,
+        token_scale: int = 500,
+        min_weight: float = 0.05,
+        refresh_every: int = 20,
+    ):
+        """
+        Args:
+            name: Experiment name, also the hashing salt
+            variants: Prompt versions under test, e.g. ['customer_support_v2', 'customer_support_v3']
+            weights: Initial traffic weights (default: even split)
+            mode: 'weighted', 'thompson' or 'ucb'
+            cost_weight: Reward penalty for a response of ``token_scale`` tokens
+            token_scale: Token count that costs the full ``cost_weight``
+            min_weight: Traffic floor per variant in bandit modes, to keep exploring
+            refresh_every: Recompute bandit weights after this many results
+        """
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown mode '{mode}', expected one of {self.MODES}")
+        if len(variants) < 2:
+            raise ValueError("An experiment needs at least two variants")
+
+        self.name = name
+        self.variants = list(variants)
+        self.mode = mode
+        self.cost_weight = cost_weight
+        self.token_scale = token_scale
+        self.min_weight = min_weight
+        self.refresh_every = refresh_every
+
+        self.stats = {variant: ArmStats() for variant in self.variants}
+        self._lock = threading.Lock()
+        # Serializes weight refreshes (and the shared RNG) without blocking record()
+        self._refresh_lock = threading.Lock()
+        self._since_refresh = 0
+        # Sequence of the latest snapshot taken and of the one whose weights are live
+        self._refresh_seq = 0
+        self._applied_seq = 0
+        self._rng = random.Random(name)
+        self._set_weights(weights or [1.0] * len(self.variants))
+
+    def _set_weights(self, weights: Sequence[float]):
+        total = float(sum(weights))
+        if total <= 0:
+            raise ValueError("Traffic weights must add up to a positive number")
+        self.weights = [w / total for w in weights]
+        # Cumulative boundaries for bisect; the last one is pinned to 1.0
+        edges, running = [], 0.0
+        for weight in self.weights[:-1]:
+            running += weight
+            edges.append(running)
+        self._edges = edges
+
+    def assign(self, unit_key: str) -> str:
+        """Variant for a user/session key"""
+        return self.variants[bisect_right(self._edges, bucket(unit_key, self.name))]
+
+    def reward(self, satisfaction: float, tokens_used: int) -> float:
+        """Reward in [0, 1] from a 1-5 satisfaction score and the tokens spent"""
+        quality = (min(max(satisfaction, 1.0), 5.0) - 1.0) / 4.0
+        penalty = self.cost_weight * tokens_used / self.token_scale
+        return min(max(quality - penalty, 0.0), 1.0)
+
+    def record(self, variant: str, satisfaction: float, tokens_used: int):
+        """Feed one observed result back into the experiment"""
+        arm = self.stats.get(variant)
+        if arm is None:
+            return
+        reward = self.reward(satisfaction, tokens_used)
+        refresh = None
+        with self._lock:
+            arm.pulls += 1
+            arm.reward_sum += reward
+            arm.tokens_sum += tokens_used
+            arm.alpha += reward
+            arm.beta += 1.0 - reward
+
+            self._since_refresh += 1
+            if self.mode != 'weighted' and self._since_refresh >= self.refresh_every:
+                self._since_refresh = 0
+                # Snapshot the posteriors; sampling them happens outside the lock
+                self._refresh_seq += 1
+                seq = self._refresh_seq
+                refresh = [(a.alpha, a.beta, a.pulls, a.mean_reward)
+                           for a in (self.stats[variant] for variant in self.variants)]
+
+        if refresh is not None:
+            with self._refresh_lock:
+                # A refresh from a newer snapshot may have landed while this one waited
+                if seq > self._applied_seq:
+                    self._set_weights(self._bandit_weights(refresh))
+                    self._applied_seq = seq
+
+    def _bandit_weights(self, arms: List[tuple], samples: int = 2000) -> List[float]:
+        """Traffic weights from (alpha, beta, pulls, mean_reward) per variant"""
+        if self.mode == 'thompson':
+            # Probability of each variant being best, by sampling the posteriors
+            wins = [0] * len(arms)
+            for _ in range(samples):
+                draws = [self._rng.betavariate(alpha, beta) for alpha, beta, _, _ in arms]
+                wins[draws.index(max(draws))] += 1
+            raw = [w / samples for w in wins]
+        else:
+            # UCB1: unexplored variants first, otherwise the highest upper bound
+            untried = [i for i, (_, _, pulls, _) in enumerate(arms) if pulls == 0]
+            total_pulls = sum(pulls for _, _, pulls, _ in arms)
+            if untried:
+                best = untried[0]
+            else:
+                scores = [
+                    mean_reward + math.sqrt(2 * math.log(total_pulls) / pulls)
+                    for _, _, pulls, mean_reward in arms
+                ]
+                best = scores.index(max(scores))
+            raw = [1.0 if i == best else 0.0 for i in range(len(arms))]
+
+        # Keep a floor on every variant so the experiment can still change its mind
+        floor = min(self.min_weight, 1.0 / len(arms))
+        spare = 1.0 - floor * len(arms)
+        return [floor + spare * w for w in raw]
+
+    def summary(self) -> Dict[str, Dict]:
+        return {
+            variant: {
+                'traffic': round(weight, 3),
+                'results': self.stats[variant].pulls,
+                'mean_reward': round(self.stats[variant].mean_reward, 3),
+                'avg_tokens': round(self.stats[variant].avg_tokens, 1),
+            }
+            for variant, weight in zip(self.variants, self.weights)
+        }
+
+
+if __name__ == "__main__":
+    experiment = Experiment(
+        "support_prompts", ["customer_support_v2", "customer_support_v3"], mode="thompson"
+    )
+
+    # v3 is rated higher and uses fewer tokens, so traffic should shift to it
+    for i in range(500):
+        variant = experiment.assign(f"user-{i}")
+        if variant == "customer_support_v3":
+            experiment.record(variant, satisfaction=random.gauss(4.5, 0.4), tokens_used=110)
+        else:
+            experiment.record(variant, satisfaction=random.gauss(4.1, 0.4), tokens_used=120)
+
+    for variant, row in experiment.summary().items():
+        print(variant, row)
+    print("Sticky:", experiment.assign("user-42") == experiment.assign("user-42"))
@@ -0,0 +1,204 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+import uuid
+from decimal import Decimal
+from typing import Dict, List
+
+from boto3.dynamodb.types import TypeSerializer
+
+# Shared helper modules live at the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bedrock_clients import get_client
+
+
+logger = logging.getLogger(__name__)
+
+
+class LocalFileBackend:
+    """Append batches as compact JSON lines to a local file"""
+
+    def __init__(self, path='experiment_results.jsonl'):
+        self.path = path
+
+    def write_batch(self, records: List[Dict]):
+        lines = [json.dumps(record, separators=(',', ':'), default=str) for record in records]
+        with open(self.path, 'a') as f:
+            f.write('\n'.join(lines) + '\n')
+
+
+class DynamoDBBackend:
+    """
+    Write batches to a DynamoDB table with batch_write_item
+
+    Records are written as items keyed by ``log_id`` (generated when
+    missing). Requests carry at most 25 items, and unprocessed items are
+    retried with exponential backoff.
+    """
+
+    MAX_BATCH = 25
+
+    def __init__(self, table_name, region_name='us-east-1', max_retries=5, client=None):
+        self.table_name = table_name
+        self.max_retries = max_retries
+        self.client = client or get_client('dynamodb', region_name=region_name)
+        self._serializer = TypeSerializer()
+
+    def _to_item(self, record: Dict) -> Dict:
+        record = dict(record)
+        record.setdefault('log_id', uuid.uuid4().hex)
+        # DynamoDB numbers must be Decimal, not float
+        item = {
+            key: Decimal(str(value)) if isinstance(value, float) else value
+            for key, value in record.items()
+            if value is not None
+        }
+        return {key: self._serializer.serialize(value) for key, value in item.items()}
+
+    def write_batch(self, records: List[Dict]):
+        for start in range(0, len(records), self.MAX_BATCH):
+            requests = [
+                {'PutRequest': {'Item': self._to_item(record)}}
+                for record in records[start:start + self.MAX_BATCH]
+            ]
+            pending = {self.table_name: requests}
+            for attempt in range(self.max_retries + 1):
+                response = self.client.batch_write_item(RequestItems=pending)
+                pending = response.get('UnprocessedItems') or {}
+                if not pending:
+                    break
+                time.sleep(min(0.05 * 2 ** attempt, 2.0))
+            else:
+                unprocessed = len(pending.get(self.table_name, []))
+                raise RuntimeError(f"{unprocessed} items still unprocessed after {self.max_retries} retries")
+
+
+class BufferedLogSink:
+    """
+    Non-blocking experiment log
+
+    ``log()`` only puts the record on a bounded in-memory queue. A background
+    thread drains it and hands the backend batches of up to ``batch_size``
+    records, at least every ``flush_interval`` seconds.
+
+    When the queue is full the ``policy`` decides what happens:
+        drop_newest: discard the incoming record (request path never waits)
+        drop_oldest: discard the oldest queued record to make room
+        block: wait up to ``block_timeout`` seconds, then drop the record
+    """
+
+    POLICIES = ('drop_newest', 'drop_oldest', 'block')
+
+    def __init__(self, backend, max_queue=10000, batch_size=500, flush_interval=2.0,
+                 policy='drop_newest', block_timeout=0.05):
+        if policy not in self.POLICIES:
+            raise ValueError(f"Unknown policy '{policy}', expected one of {self.POLICIES}")
+
+        self.backend = backend
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.policy = policy
+        self.block_timeout = block_timeout
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        self._flush_now = threading.Event()
+        self.stats = {'logged': 0, 'dropped': 0, 'written': 0, 'write_calls': 0, 'failed': 0}
+        # Counters are bumped from request threads and the flush thread
+        self._stats_lock = threading.Lock()
+
+        self._thread = threading.Thread(target=self._run, name='experiment-log-sink', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _count(self, name: str, amount: int = 1):
+        with self._stats_lock:
+            self.stats[name] += amount
+
+    def log(self, record: Dict) -> bool:
+        """Queue a record; returns False if it was dropped"""
+        try:
+            if self.policy == 'block':
+                self._queue.put(record, timeout=self.block_timeout)
+            else:
+                self._queue.put_nowait(record)
+        except queue.Full:
+            if self.policy != 'drop_oldest':
+                self._count('dropped')
+                return False
+            try:
+                self._queue.get_nowait()
+                self._queue.task_done()
+                self._count('dropped')
+            except queue.Empty:
+                pass
+            try:
+                self._queue.put_nowait(record)
+            except queue.Full:
+                self._count('dropped')
+                return False
+
+        self._count('logged')
+        return True
+
+    def _collect(self) -> List[Dict]:
+        """Wait for records until the batch is full or the flush interval ends"""
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self._flush_now.is_set():
+                # Take whatever is already queued without waiting
+                try:
+                    while len(batch) < self.batch_size:
+                        batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    pass
+                break
+            try:
+                batch.append(self._queue.get(timeout=min(remaining, 0.1)))
+            except queue.Empty:
+                if self._stop.is_set():
+                    break
+        return batch
+
+    def _write(self, batch: List[Dict]):
+        try:
+            self.backend.write_batch(batch)
+            self._count('written', len(batch))
+        except Exception as e:
+            self._count('failed', len(batch))
+            logger.error(f"Failed to write {len(batch)} experiment log records: {e}")
+        finally:
+            self._count('write_calls')
+            for _ in batch:
+                self._queue.task_done()
+
+    def _run(self):
+        while not (self._stop.is_set() and self._queue.empty()):
+            batch = self._collect()
+            if batch:
+                self._write(batch)
+            if self._queue.empty():
+                self._flush_now.clear()
+
+    def flush(self, timeout=5.0):
+        """Write everything queued so far"""
+        self._flush_now.set()
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def close(self, timeout=5.0):
+        """Flush remaining records and stop the background thread"""
+        if self._stop.is_set():
+            return
+        self._flush_now.set()
+        self._stop.set()
+        self._thread.join(timeout)
@@ -0,0 +1,233 @@
+import copy
+import threading
+import time
+from collections import deque
+
+from route_models import route_to_model
+
+
+class ModelTier:
+    """A model option with its price (USD per 1M tokens) and expected quality (0-1)"""
+
+    def __init__(self, name, model_id, input_price, output_price, quality):
+        self.name = name
+        self.model_id = model_id
+        self.input_price = input_price
+        self.output_price = output_price
+        self.quality = quality
+
+    def cost(self, input_tokens, output_tokens):
+        return (input_tokens * self.input_price + output_tokens * self.output_price) / 1_000_000
+
+
+DEFAULT_TIERS = [
+    ModelTier("mistral-7b", "mistral.mistral-7b-instruct-v0:2", 0.15, 0.20, quality=0.6),
+    ModelTier("mistral-large", "mistral.mistral-large-2402-v1:0", 4.0, 12.0, quality=0.8),
+    ModelTier("claude-opus", "anthropic.claude-3-opus-20240229-v1:0", 15.0, 75.0, quality=0.95),
+]
+
+
+class ModelStats:
+    """Sliding-window latency, error-rate and cost statistics for one model"""
+
+    def __init__(self, window_seconds=300, max_samples=500):
+        self.window_seconds = window_seconds
+        # (timestamp, latency_ms, ok, cost, tokens); cost is None when the actual spend is unknown
+        self.samples = deque(maxlen=max_samples)
+        self.throttled_until = 0.0
+        self._p95 = None
+
+    def _expire(self, now):
+        cutoff = now - self.window_seconds
+        while self.samples and self.samples[0][0] < cutoff:
+            self.samples.popleft()
+            self._p95 = None
+
+    def record(self, latency_ms, ok, cost, tokens=0, now=None):
+        now = now or time.monotonic()
+        self.samples.append((now, latency_ms, ok, cost, tokens))
+        self._p95 = None
+        self._expire(now)
+
+    def p95_latency(self, now=None):
+        self._expire(now or time.monotonic())
+        if self._p95 is None and self.samples:
+            latencies = sorted(sample[1] for sample in self.samples if sample[2])
+            self._p95 = latencies[int(0.95 * (len(latencies) - 1))] if latencies else None
+        return self._p95
+
+    def error_rate(self, now=None):
+        self._expire(now or time.monotonic())
+        if not self.samples:
+            return 0.0
+        return sum(1 for sample in self.samples if not sample[2]) / len(self.samples)
+
+    def cost_per_token(self, min_samples=1):
+        """
+        Observed USD per token (input and output) over successful calls
+        whose actual cost was reported, or None with fewer than ``min_samples``
+        """
+        cost = tokens = priced = 0
+        for sample in self.samples:
+            if sample[2] and sample[3] is not None:
+                cost += sample[3]
+                tokens += sample[4]
+                priced += 1
+        return cost / tokens if tokens and priced >= min_samples else None
+
+    def is_throttled(self, now=None):
+        return (now or time.monotonic()) < self.throttled_until
+
+
+class RoutingPolicy:
+    """
+    Cost/latency-aware model selection
+
+    Picks the cheapest tier that meets the request's quality floor and
+    latency target according to recent observations, and skips tiers that
+    are throttled or failing. Every tier is priced at the request's
+    expected token counts: at its observed cost per token once enough
+    calls have reported their actual cost (e.g. from the cost ledger, with
+    cache discounts), otherwise at its list price. Tiers without latency data
+    are given the benefit of the doubt so new models get traffic.
+    """
+
+    def __init__(self, tiers=DEFAULT_TIERS, window_seconds=300, max_error_rate=0.2,
+                 throttle_cooldown=30.0, min_samples=5, quality_smoothing=0.05):
+        # Copies, so quality feedback does not leak into DEFAULT_TIERS
+        self.tiers = {tier.name: copy.copy(tier) for tier in tiers}
+        self.stats = {tier.name: ModelStats(window_seconds) for tier in tiers}
+        self.max_error_rate = max_error_rate
+        self.throttle_cooldown = throttle_cooldown
+        self.min_samples = min_samples
+        self.quality_smoothing = quality_smoothing
+        self._lock = threading.Lock()
+
+    def expected_cost(self, tier, input_tokens, output_tokens):
+        rate = self.stats[tier.name].cost_per_token(self.min_samples)
+        if rate is None:
+            return tier.cost(input_tokens, output_tokens)
+        return rate * (input_tokens + output_tokens)
+
+    def choose(self, latency_target_ms=None, min_quality=0.0, input_tokens=500, output_tokens=300):
+        """
+        Tier to use for one request
+
+        Args:
+            latency_target_ms: p95 latency the request can tolerate (None = any)
+            min_quality: Lowest acceptable tier quality (0-1)
+            input_tokens, output_tokens: Expected request size, for pricing
+        """
+        now = time.monotonic()
+        with self._lock:
+            eligible = [
+                tier for tier in self.tiers.values()
+                if tier.quality >= min_quality and not self.stats[tier.name].is_throttled(now)
+            ]
+            healthy = [
+                tier for tier in eligible
+                if self.stats[tier.name].error_rate(now) <= self.max_error_rate
+            ] or eligible
+
+            def meets_latency(tier):
+                if latency_target_ms is None:
+                    return True
+                stats = self.stats[tier.name]
+                p95 = stats.p95_latency(now)
+                return len(stats.samples) < self.min_samples or p95 is None or p95 <= latency_target_ms
+
+            fast_enough = [tier for tier in healthy if meets_latency(tier)]
+            if fast_enough:
+                return min(fast_enough, key=lambda t: self.expected_cost(t, input_tokens, output_tokens))
+
+            if healthy:
+                # Nobody meets the target: take the fastest acceptable tier
+                return min(healthy, key=lambda t: self.stats[t.name].p95_latency(now) or 0.0)
+
+            # Everything acceptable is throttled: relax the quality floor, then wait it out
+            available = [t for t in self.tiers.values() if not self.stats[t.name].is_throttled(now)]
+            if available:
+                return max(available, key=lambda t: t.quality)
+            return min(self.tiers.values(), key=lambda t: self.stats[t.name].throttled_until)
+
+    def record(self, tier_name, latency_ms, input_tokens=0, output_tokens=0, error=None, cost=None):
+        """
+        Feed back the outcome of a call
+
+        ``error`` is the exception (or its class name) if the call failed; a
+        ThrottlingException takes the tier out of rotation for ``throttle_cooldown`` seconds.
+        ``cost`` is what the call actually cost in USD (e.g. ``cost_ledger.model_cost``
+        with the response's cache token counts); calls without it don't move the
+        tier's observed cost per token.
+        """
+        stats = self.stats[tier_name]
+        with self._lock:
+            stats.record(latency_ms, error is None, cost, input_tokens + output_tokens)
+            error_name = error if isinstance(error, str) else type(error).__name__
+            if error is not None and 'Throttling' in error_name:
+                stats.throttled_until = time.monotonic() + self.throttle_cooldown
+
+    def record_quality(self, tier_name, score):
+        """Nudge a tier's quality towards an observed score (0-1, e.g. judge rating / 5)"""
+        tier = self.tiers[tier_name]
+        with self._lock:
+            tier.quality += self.quality_smoothing * (score - tier.quality)
+
+    def call(self, invoke, latency_target_ms=None, min_quality=0.0, max_attempts=3, **sizes):
+        """
+        Run ``invoke(tier)`` on the chosen tier, choosing again after a
+        failure (a throttled tier is skipped for the cooldown)
+
+        ``invoke`` must return (result, input_tokens, output_tokens), optionally
+        followed by the call's actual cost in USD.
+        """
+        last_error = None
+        for _ in range(max_attempts):
+            tier = self.choose(latency_target_ms, min_quality, **sizes)
+            start = time.perf_counter()
+            try:
+                result, input_tokens, output_tokens, *cost = invoke(tier)
+            except Exception as e:
+                self.record(tier.name, (time.perf_counter() - start) * 1000, error=e)
+                last_error = e
+                continue
+            self.record(tier.name, (time.perf_counter() - start) * 1000, input_tokens, output_tokens,
+                        cost=cost[0] if cost else None)
+            return result, tier
+        raise last_error
+
+    def summary(self):
+        now = time.monotonic()
+        return {
+            name: {
+                'samples': len(stats.samples),
+                'p95_latency_ms': stats.p95_latency(now),
+                'error_rate': round(stats.error_rate(now), 3),
+                'throttled': stats.is_throttled(now),
+                'quality': round(self.tiers[name].quality, 3),
+            }
+            for name, stats in self.stats.items()
+        }
+
+
+def route_with_policy(query, policy, latency_target_ms=None):
+    """
+    Keyword routing sets the quality floor; the policy picks the cheapest
+    healthy model that meets it and the latency target
+    """
+    keyword_tier = policy.tiers.get(route_to_model(query))
+    min_quality = keyword_tier.quality if keyword_tier else 0.0
+    return policy.choose(latency_target_ms=latency_target_ms, min_quality=min_quality)
+
+
+if __name__ == "__main__":
+    policy = RoutingPolicy()
+    print(route_with_policy("What are your opening hours?", policy).name)
+
+    # Mistral Large gets slow and then throttled: moderate queries move up a tier
+    for _ in range(10):
+        policy.record("mistral-large", latency_ms=4000, input_tokens=400, output_tokens=300)
+    print(route_with_policy("Can you analyze my last three invoices?", policy, latency_target_ms=2000).name)
+    policy.record("mistral-large", latency_ms=50, error="ThrottlingException")
+    print(route_with_policy("Can you analyze my last three invoices?", policy).name)
+    print(policy.summary())
@@ -0,0 +1,225 @@
+import hashlib
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+
+# Shared helper modules live at the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bedrock_clients import get_client
+from cost_ledger import get_ledger, model_cost
+from model_codecs import get_codec
+from prompt_manager import GENERATION_MODEL_ID, JUDGE_MODEL_ID, llm_as_judge
+from prompt_registry import PromptRegistry
+
+
+def content_hash(*parts):
+    """Stable cache key for a generation or a verdict"""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode())
+        digest.update(b'\x1f')
+    return digest.hexdigest()
+
+
+def load_dataset(path):
+    """
+    Questions to evaluate, from .jsonl ({"question": ...} per line),
+    .json (list of strings or objects) or plain text (one per line)
+    """
+    with open(path, 'r') as f:
+        if path.endswith('.jsonl'):
+            return [json.loads(line)['question'] for line in f if line.strip()]
+        if path.endswith('.json'):
+            items = json.load(f)
+            return [item['question'] if isinstance(item, dict) else item for item in items]
+        return [line.strip() for line in f if line.strip()]
+
+
+class ResultCache:
+    """Append-only JSONL cache of generations and judge verdicts, keyed by content hash"""
+
+    def __init__(self, path='evaluation_cache.jsonl'):
+        self.path = path
+        self._entries = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self._entries[entry['key']] = entry['value']
+
+    def get(self, key):
+        return self._entries.get(key)
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            with open(self.path, 'a') as f:
+                f.write(json.dumps({'key': key, 'value': value}, separators=(',', ':')) + '\n')
+
+
+class PromptEvaluator:
+    """
+    Offline evaluation of prompt versions
+
+    Every (version, question) pair is generated and then scored by a judge
+    model on a bounded thread pool. Generations are cached by a hash of the
+    model, max_tokens and the rendered prompt, and verdicts by a hash of the
+    judge model, question and answer, so a re-run only calls Bedrock for
+    new prompt versions, new questions or changed answers.
+    """
+
+    def __init__(self, prompts_file='prompts.json', cache_path='evaluation_cache.jsonl',
+                 model_id=GENERATION_MODEL_ID, judge_model_id=JUDGE_MODEL_ID,
+                 max_workers=8, max_tokens=500, bedrock=None):
+        self.prompts_file = prompts_file
+        self.registry = PromptRegistry(prompts_file)
+        self.cache = ResultCache(cache_path)
+        self.model_id = model_id
+        self.judge_model_id = judge_model_id
+        self.max_workers = max_workers
+        self.max_tokens = max_tokens
+        self.bedrock = bedrock or get_client('bedrock-runtime')
+        self.calls = {'generate': 0, 'judge': 0, 'cached': 0}
+        self._calls_lock = threading.Lock()
+
+    def _count(self, kind):
+        with self._calls_lock:
+            self.calls[kind] += 1
+
+    def generate(self, version, question):
+        """Answer one question with one prompt version (cached)"""
+        prompt = self.registry.get(version)
+        if prompt is None:
+            raise ValueError(f"Unknown prompt version '{version}' in {self.prompts_file}")
+        full_prompt = prompt.render(question)
+        key = content_hash('generate', self.model_id, self.max_tokens, full_prompt)
+        cached = self.cache.get(key)
+        if cached is not None:
+            self._count('cached')
+            return cached
+
+        start = time.perf_counter()
+        codec = get_codec(self.model_id)
+        response = self.bedrock.invoke_model(
+            modelId=self.model_id,
+            body=codec.encode_prompt(full_prompt, max_tokens=self.max_tokens)
+        )
+        get_ledger().record_response(self.model_id, response, route="prompt_evaluator")
+        answer = codec.decode_response(response)
+        latency_ms = (time.perf_counter() - start) * 1000
+
+        headers = response.get('ResponseMetadata', {}).get('HTTPHeaders', {})
+        result = {
+            'answer': answer,
+            'latency_ms': round(latency_ms, 1),
+            'input_tokens': int(headers.get('x-amzn-bedrock-input-token-count', 0)),
+            'output_tokens': int(headers.get('x-amzn-bedrock-output-token-count', 0)),
+        }
+        self._count('generate')
+        self.cache.put(key, result)
+        return result
+
+    def judge(self, question, answer):
+        """Score an answer 1-5 with the judge model (cached)"""
+        key = content_hash('judge', self.judge_model_id, question, answer)
+        cached = self.cache.get(key)
+        if cached is not None:
+            self._count('cached')
+            return cached
+
+        rating, reason = llm_as_judge(question, answer, bedrock=self.bedrock, model_id=self.judge_model_id)
+        verdict = {'rating': rating, 'reason': reason}
+        self._count('judge')
+        self.cache.put(key, verdict)
+        return verdict
+
+    def _evaluate_one(self, version, question):
+        generation = self.generate(version, question)
+        verdict = self.judge(question, generation['answer'])
+        return version, dict(generation, **verdict)
+
+    def evaluate(self, versions, questions):
+        """
+        Run every version over every question
+
+        Returns:
+            Dict of version -> aggregated metrics
+        """
+        # Fail before any Bedrock call rather than from inside the worker pool
+        missing = [version for version in versions if self.registry.get(version) is None]
+        if missing:
+            raise ValueError(f"Unknown prompt versions {missing} in {self.prompts_file}")
+
+        rows = {version: [] for version in versions}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = [
+                pool.submit(self._evaluate_one, version, question)
+                for version in versions
+                for question in questions
+            ]
+            for future in as_completed(futures):
+                version, row = future.result()
+                rows[version].append(row)
+
+        return {version: self._aggregate(version_rows) for version, version_rows in rows.items()}
+
+    def _aggregate(self, rows):
+        ratings = [row['rating'] for row in rows if row['rating'] is not None]
+        latencies = sorted(row['latency_ms'] for row in rows)
+        tokens = [row['input_tokens'] + row['output_tokens'] for row in rows]
+        costs = [model_cost(self.model_id, row['input_tokens'], row['output_tokens']) for row in rows]
+        return {
+            'satisfaction': round(statistics.mean(ratings), 2) if ratings else None,
+            'avg_tokens': round(statistics.mean(tokens)) if tokens else 0,
+            'cost_per_query': round(statistics.mean(costs), 6) if costs else 0.0,
+            'avg_latency_ms': round(statistics.mean(latencies), 1) if latencies else 0.0,
+            'p95_latency_ms': latencies[int(0.95 * (len(latencies) - 1))] if latencies else 0.0,
+            'evaluated_questions': len(rows),
+            'evaluated_at': datetime.utcnow().isoformat(),
+        }
+
+    def write_metrics(self, results):
+        """
+        Store metrics under each version's "metrics" in the prompts file
+
+        The file is replaced atomically, so a PromptRegistry watching it
+        never reads a partial write.
+        """
+        with open(self.prompts_file, 'r') as f:
+            prompts = json.load(f)
+        for version, metrics in results.items():
+            prompts[version].setdefault('metrics', {}).update(metrics)
+
+        directory = os.path.dirname(os.path.abspath(self.prompts_file))
+        with tempfile.NamedTemporaryFile('w', dir=directory, suffix='.tmp', delete=False) as f:
+            json.dump(prompts, f, indent=2)
+            temp_path = f.name
+        shutil.copymode(self.prompts_file, temp_path)
+        os.replace(temp_path, self.prompts_file)
+
+
+# Usage: python prompt_evaluator.py questions.jsonl customer_support_v1 customer_support_v2 customer_support_v3
+if __name__ == "__main__":
+    dataset_path, *versions = sys.argv[1:]
+    evaluator = PromptEvaluator()
+    versions = versions or list(evaluator.registry.raw)
+    questions = load_dataset(dataset_path)
+
+    start = time.perf_counter()
+    results = evaluator.evaluate(versions, questions)
+    evaluator.write_metrics(results)
+
+    for version, metrics in results.items():
+        print(f"{version}: {json.dumps(metrics)}")
+    print(f"Bedrock calls: {evaluator.calls} in {time.perf_counter() - start:.1f}s")
@@ -1,52 +1,111 @@
-import json
-import boto3
+import os
+import re
+import sys
+import uuid
 from datetime import datetime
 
+# Shared helper modules live at the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bedrock_clients import get_client
+from cost_ledger import get_ledger
+from model_codecs import get_codec
+from prompt_cache import PrefixCacheTracker, cached_converse
+from experiment_engine import Experiment
+from experiment_log_sink import BufferedLogSink, LocalFileBackend
+from prompt_registry import PromptRegistry
+
+GENERATION_MODEL_ID = "mistral.mistral-large-2402-v1:0"
+
 class PromptManager:
     """Manage prompt versions with A/B testing"""
     
-    def __init__(self, prompts_file='prompts.json'):
-        with open(prompts_file, 'r') as f:
-            self.prompts = json.load(f)
-        self.bedrock = boto3.client('bedrock-runtime', region_name='us-east-1')
+    def __init__(self, prompts_file='prompts.json', log_sink=None, cache_model_id=None):
+        # Indexed by semver per prompt family, reloaded when the file changes
+        self.registry = PromptRegistry(prompts_file)
+        self.bedrock = get_client('bedrock-runtime')
+        self.experiments = {}
+        
+        # With a model that supports prompt caching (e.g. Claude 3.7 Sonnet),
+        # ab_test goes through Converse with the system prompt and any
+        # "examples" of the prompt entry marked as cacheable. A cache point is
+        # only set once that prefix reaches the model's minimum (1024 tokens
+        # for Claude 3.7 Sonnet); the system prompts in prompts.json are about
+        # 20 tokens, so they only get cached with enough few-shot examples.
+        # RAG answers are cached through rag_pipeline.cached_generator.
+        self.cache_model_id = cache_model_id
+        self.cache_tracker = PrefixCacheTracker()
+        
+        # Results are queued and written in batches by a background thread;
+        # pass BufferedLogSink(DynamoDBBackend('prompt-experiments')) in production
+        self.log_sink = log_sink or BufferedLogSink(LocalFileBackend('experiment_results.jsonl'))
+    
+    @property
+    def prompts(self):
+        """Raw prompt entries from the current version of the prompts file"""
+        return self.registry.raw
     
-    def get_prompt(self, version='latest'):
+    def get_prompt(self, version='latest', family=None):
         """Get a specific prompt version"""
         if version == 'latest':
-            # Get highest version number
-            versions = sorted([p for p in self.prompts.keys()], reverse=True)
-            return self.prompts[versions[0]]
-        return self.prompts.get(version)
+            # Highest semantic version, overall or within one prompt family
+            prompt = self.registry.latest(family)
+            return prompt.entry if prompt else None
+        prompt = self.registry.get(version)
+        return prompt.entry if prompt else None
     
-    def ab_test(self, query, version_a, version_b):
-        """Run A/B test between two prompt versions"""
-        import random
-        
-        # Randomly assign to A or B (50/50 split)
-        selected_version = random.choice([version_a, version_b])
-        prompt_data = self.prompts[selected_version]
+    def create_experiment(self, name, versions, weights=None, mode='weighted', **options):
+        """
+        Register an experiment between prompt versions
         
-        # Format full prompt
-        full_prompt = f"<s>[INST] {prompt_data['prompt']}\n\nUser Question: {query} [/INST]"
-        
-        # Call Bedrock
-        response = self.bedrock.invoke_model(
-            modelId="mistral.mistral-large-2402-v1:0",
-            body=json.dumps({
-                "prompt": full_prompt,
-                "max_tokens": 500
-            })
-        )
+        mode: 'weighted' (fixed traffic split), 'thompson' or 'ucb' (bandit
+        modes that shift traffic towards the best-rated, cheapest prompt as
+        results come in through log_result)
+        """
+        self.experiments[name] = Experiment(name, versions, weights=weights, mode=mode, **options)
+        return self.experiments[name]
+    
+    def ab_test(self, query, version_a, version_b, user_id=None, experiment=None):
+        """Run A/B test between two prompt versions"""
+        # Sticky bucketing: the same user always lands on the same variant
+        name = experiment or f"{version_a}_vs_{version_b}"
+        if name not in self.experiments:
+            self.create_experiment(name, [version_a, version_b])
+        unit_key = user_id or uuid.uuid4().hex
+        selected_version = self.experiments[name].assign(unit_key)
+        prompt = self.registry.get(selected_version)
+        prompt_data = prompt.entry
         
-        result = json.loads(response['body'].read())
+        if self.cache_model_id:
+            # Static system prompt and few-shot examples are read from the prompt cache
+            response = cached_converse(
+                self.bedrock, self.cache_model_id, query,
+                system=prompt.text, examples=prompt_data.get('examples'),
+                tracker=self.cache_tracker, maxTokens=500
+            )
+            get_ledger().record_response(self.cache_model_id, response, route=name)
+            answer = response['output']['message']['content'][0]['text']
+        else:
+            # Format full prompt
+            full_prompt = prompt.render(query)
+            
+            # Call Bedrock
+            codec = get_codec(GENERATION_MODEL_ID)
+            response = self.bedrock.invoke_model(
+                modelId=GENERATION_MODEL_ID,
+                body=codec.encode_prompt(full_prompt, max_tokens=500)
+            )
+            get_ledger().record_response(GENERATION_MODEL_ID, response, route=name)
+            answer = codec.decode(response['body'].read())
         
         return {
             'version_used': selected_version,
-            'response': result['outputs'][0]['text'],
-            'prompt_version': prompt_data['version']
+            'response': answer,
+            'prompt_version': prompt_data['version'],
+            'experiment': name
         }
     
-    def log_result(self, version, user_satisfaction, tokens_used):
+    def log_result(self, version, user_satisfaction, tokens_used, experiment=None):
         """Log results for analysis"""
         log_entry = {
             'timestamp': datetime.utcnow().isoformat(),
@@ -55,8 +114,17 @@ class PromptManager:
             'tokens': tokens_used
         }
         
-        # In production, write to DynamoDB or CloudWatch
-        print(f"Logged: {json.dumps(log_entry, indent=2)}")
+        # Online update of the experiment(s) serving this version
+        if experiment is not None:
+            log_entry['experiment'] = experiment
+            targets = [self.experiments[experiment]] if experiment in self.experiments else []
+        else:
+            targets = [e for e in self.experiments.values() if version in e.stats]
+        for target in targets:
+            target.record(version, user_satisfaction, tokens_used)
+        
+        # Queued only; the sink's background thread does the writing
+        self.log_sink.log(log_entry)
 
 # Demo usage
 if __name__ == "__main__":
@@ -66,17 +134,22 @@ if __name__ == "__main__":
     result = pm.ab_test(
         "How do I reset my password?",
         "customer_support_v2",
-        "customer_support_v3"
+        "customer_support_v3",
+        user_id="user-123"
     )
     
     print(f"Used version: {result['version_used']}")
     print(f"Response: {result['response']}")
     
     # Simulate user feedback
-    pm.log_result(result['version_used'], user_satisfaction=4.5, tokens_used=115)
+    pm.log_result(result['version_used'], user_satisfaction=4.5, tokens_used=115,
+                  experiment=result['experiment'])
 
 
-def llm_as_judge(question, answer):
+JUDGE_MODEL_ID = "anthropic.claude-3-haiku-20240307-v1:0"
+
+
+def llm_as_judge(question, answer, bedrock=None, model_id=JUDGE_MODEL_ID):
     """Use LLM to evaluate response quality"""
     judge_prompt = f"""
     Rate the quality of this answer on a scale of 1-5:
@@ -93,7 +166,21 @@ def llm_as_judge(question, answer):
     Respond with only a number 1-5 and brief reason.
     """
     
-    # Call Bedrock to judge
-    # ... (implementation)
+    # Call Bedrock to judge (Converse works the same for any judge model)
+    bedrock = bedrock or get_client('bedrock-runtime')
+    response = bedrock.converse(
+        modelId=model_id,
+        messages=[{"role": "user", "content": [{"text": judge_prompt}]}],
+        inferenceConfig={"maxTokens": 150, "temperature": 0.0}
+    )
+    get_ledger().record_response(model_id, response, route="llm_as_judge")
+    verdict = response['output']['message']['content'][0]['text'].strip()
+    
+    # Expected shape: "4 - Clear and relevant, but misses the refund link"
+    match = re.search(r'\b([1-5])\b', verdict)
+    if not match:
+        return None, verdict
+    rating = int(match.group(1))
+    reason = verdict[match.end():].strip(" .:-\n") or verdict
     
     return rating, reason
\ No newline at end of file
@@ -0,0 +1,140 @@
+import json
+import logging
+import os
+import re
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+
+SEMVER_PATTERN = re.compile(r'^v?(\d+)(?:\.(\d+))?(?:\.(\d+))?(?:-([0-9A-Za-z.-]+))?')
+FAMILY_SUFFIX = re.compile(r'_v\d+$')
+
+logger = logging.getLogger(__name__)
+
+
+def parse_semver(version: str) -> Tuple:
+    """
+    Sortable key for a semantic version string
+
+    '2.10.0' > '2.9.1', and a release sorts above its pre-releases
+    ('3.0.0' > '3.0.0-beta'). Unparseable versions sort lowest.
+    """
+    match = SEMVER_PATTERN.match(str(version).strip())
+    if not match:
+        return (-1, -1, -1, 0, '')
+    major, minor, patch, prerelease = match.groups()
+    return (int(major), int(minor or 0), int(patch or 0), 0 if prerelease else 1, prerelease or '')
+
+
+def prompt_family(key: str, entry: Dict) -> str:
+    """Family a prompt belongs to, e.g. 'customer_support_v3' -> 'customer_support'"""
+    return entry.get('family') or FAMILY_SUFFIX.sub('', key)
+
+
+class CompiledPrompt:
+    """A prompt entry with its Mistral instruction template built once"""
+
+    def __init__(self, key: str, entry: Dict):
+        self.key = key
+        self.entry = entry
+        self.family = prompt_family(key, entry)
+        self.version = entry.get('version', '0.0.0')
+        self.semver = parse_semver(self.version)
+        self.text = entry['prompt']
+
+        # Everything except the user question is fixed, so keep it pre-joined
+        self._prefix = f"<s>[INST] {self.text}\n\nUser Question: "
+        self._suffix = " [/INST]"
+
+    def render(self, query: str) -> str:
+        """Full Mistral prompt for a user question"""
+        return self._prefix + query + self._suffix
+
+
+class _Snapshot:
+    """Immutable view of one version of the prompts file"""
+
+    def __init__(self, raw: Dict, mtime_ns: int):
+        self.raw = raw
+        self.mtime_ns = mtime_ns
+        self.prompts = {key: CompiledPrompt(key, entry) for key, entry in raw.items()}
+
+        self.latest_by_family: Dict[str, CompiledPrompt] = {}
+        self.by_family_version: Dict[Tuple[str, str], CompiledPrompt] = {}
+        for prompt in self.prompts.values():
+            self.by_family_version[(prompt.family, prompt.version)] = prompt
+            current = self.latest_by_family.get(prompt.family)
+            if current is None or prompt.semver > current.semver:
+                self.latest_by_family[prompt.family] = prompt
+
+        self.latest = max(self.prompts.values(), key=lambda p: p.semver, default=None)
+
+
+class PromptRegistry:
+    """
+    Indexed, hot-reloading view of prompts.json
+
+    Lookups are dictionary reads against a snapshot built once per file
+    version. The file's mtime is checked at most every ``check_interval``
+    seconds; a changed file is parsed into a new snapshot which then
+    replaces the old one in a single assignment, so readers never see a
+    half-loaded registry. A file that fails to parse (e.g. mid-write) is
+    ignored and the previous snapshot stays in service.
+    """
+
+    def __init__(self, prompts_file: str = 'prompts.json', check_interval: float = 1.0):
+        self.prompts_file = prompts_file
+        self.check_interval = check_interval
+        self._reload_lock = threading.Lock()
+        self._next_check = 0.0
+        self._snapshot = self._load()
+
+    def _load(self) -> _Snapshot:
+        mtime_ns = os.stat(self.prompts_file).st_mtime_ns
+        with open(self.prompts_file, 'r') as f:
+            return _Snapshot(json.load(f), mtime_ns)
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now < self._next_check or not self._reload_lock.acquire(blocking=False):
+            return
+        try:
+            self._next_check = now + self.check_interval
+            try:
+                mtime_ns = os.stat(self.prompts_file).st_mtime_ns
+                if mtime_ns != self._snapshot.mtime_ns:
+                    self._snapshot = self._load()
+                    logger.info("Reloaded %d prompts from %s", len(self._snapshot.prompts), self.prompts_file)
+            except (OSError, ValueError) as e:
+                logger.warning("Keeping previous prompts, reload failed: %s", e)
+        finally:
+            self._reload_lock.release()
+
+    @property
+    def snapshot(self) -> _Snapshot:
+        self._maybe_reload()
+        return self._snapshot
+
+    @property
+    def raw(self) -> Dict:
+        """Prompts as loaded from the file"""
+        return self.snapshot.raw
+
+    def get(self, key: str) -> Optional[CompiledPrompt]:
+        """Prompt by its key in prompts.json, e.g. 'customer_support_v2'"""
+        return self.snapshot.prompts.get(key)
+
+    def latest(self, family: Optional[str] = None) -> Optional[CompiledPrompt]:
+        """Highest semver prompt, overall or within one family"""
+        snapshot = self.snapshot
+        if family is None:
+            return snapshot.latest
+        return snapshot.latest_by_family.get(family)
+
+    def get_version(self, family: str, version: str) -> Optional[CompiledPrompt]:
+        """Prompt by family and version string, e.g. ('customer_support', '2.0.0')"""
+        return self.snapshot.by_family_version.get((family, version))
+
+    def families(self):
+        return list(self.snapshot.latest_by_family)
@@ -3,21 +3,203 @@
 # ├─ Moderate (explanations) → Mistral Large ($4/$12 per 1M tokens)
 # └─ Complex (reasoning, code) → Claude Opus ($15/$75 per 1M tokens)
 
+import json
+import re
+
+try:
+    import numpy as np
+except ImportError:  # only needed for the embedding classifier
+    np = None
+
+
+# Keyword rules in priority order: the first rule with a match wins
+DEFAULT_RULES = [
+    ("mistral-7b", ['hours', 'location', 'price', 'hello', 'thanks']),
+    ("mistral-large", ['analyze', 'compare', 'recommend', 'explain why']),
+]
+
+
+def keyword_regex(keywords):
+    """
+    One regular expression for a keyword list, factored as a prefix trie
+
+    ['hello', 'hours', 'price'] -> (?:h(?:ello|ours)|price), so each position
+    in the query is checked with a single branch per first character
+    instead of trying every keyword in turn.
+    """
+    trie = {}
+    for keyword in keywords:
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[''] = True
+
+    def build(node):
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else f"(?:{'|'.join(branches)})"
+        # A keyword ends here but longer ones continue: make the rest optional
+        return f"(?:{body})?" if '' in node else body
+
+    return build(trie)
+
+
+class CentroidClassifier:
+    """
+    Second-stage router: nearest tier centroid in embedding space
+
+    Each tier's centroid is the normalized mean embedding of a few example
+    queries. Queries no keyword rule matched are embedded (in one batch for
+    route_batch) and scored against all centroids with one matrix product.
+    """
+
+    def __init__(self, embed, examples, min_similarity=0.3, embed_batch=None):
+        """
+        Args:
+            embed: Function text -> embedding (e.g. generate_embedding)
+            examples: Dict of tier -> list of example queries
+            min_similarity: Below this cosine similarity the classifier abstains
+            embed_batch: Optional function list of texts -> list of embeddings
+        """
+        if np is None:
+            raise ImportError("CentroidClassifier requires numpy")
+        self.embed = embed
+        self.embed_batch = embed_batch or (lambda texts: [embed(t) for t in texts])
+        self.min_similarity = min_similarity
+
+        self.tiers = list(examples)
+        centroids = []
+        for tier in self.tiers:
+            vectors = self._normalize(np.asarray(self.embed_batch(examples[tier]), dtype=np.float32))
+            centroids.append(vectors.mean(axis=0))
+        self.centroids = self._normalize(np.vstack(centroids))
+
+    @staticmethod
+    def _normalize(matrix):
+        norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+        return matrix / np.maximum(norms, 1e-12)
+
+    def predict_batch(self, queries):
+        """(tier or None, similarity) for each query"""
+        if not queries:
+            return []
+        vectors = self._normalize(np.asarray(self.embed_batch(list(queries)), dtype=np.float32))
+        scores = vectors @ self.centroids.T
+        best = scores.argmax(axis=1)
+        return [
+            (self.tiers[index] if scores[row, index] >= self.min_similarity else None, float(scores[row, index]))
+            for row, index in enumerate(best)
+        ]
+
+    def predict(self, query):
+        return self.predict_batch([query])[0]
+
+
+class RouterEngine:
+    """
+    Compiled query router
+
+    Each keyword rule is compiled into one trie-shaped regular expression,
+    and the rules are searched in priority order, so the first rule with a
+    keyword anywhere in the query wins (the same result as checking
+    ``any(kw in query)`` rule by rule) with one scan per rule instead of one
+    per keyword. Queries without a keyword match go to the optional
+    embedding classifier, and then to the short/long query heuristic.
+    """
+
+    def __init__(self, rules=DEFAULT_RULES, short_query_words=10,
+                 short_tier="mistral-7b", default_tier="mistral-large", classifier=None):
+        self.rules = [(tier, list(keywords)) for tier, keywords in rules]
+        self.short_query_words = short_query_words
+        self.short_tier = short_tier
+        self.default_tier = default_tier
+        self.classifier = classifier
+
+        # (tier, pattern) per rule, highest priority first. A single pattern
+        # over all rules would miss a higher-priority keyword that overlaps
+        # or sits inside a lower-priority one ('pare' in 'compare').
+        self._patterns = [
+            (tier, re.compile(keyword_regex({keyword.lower() for keyword in keywords})))
+            for tier, keywords in self.rules
+            if keywords
+        ]
+
+        # Matches only when the query has at least `short_query_words` words
+        self._long_query = re.compile(r'\s*(?:\S+\s+){%d}\S' % max(short_query_words - 1, 0))
+
+    @classmethod
+    def from_json(cls, path, classifier=None):
+        """
+        Load a rule table, e.g.
+        {"rules": [{"tier": "mistral-7b", "keywords": ["hours", "price"]}, ...],
+         "short_query_words": 10, "short_tier": "mistral-7b", "default_tier": "mistral-large"}
+        """
+        with open(path, 'r') as f:
+            config = json.load(f)
+        rules = [(rule['tier'], rule['keywords']) for rule in config.pop('rules')]
+        return cls(rules=rules, classifier=classifier, **config)
+
+    def match_keywords(self, query):
+        """Tier of the highest-priority rule matching the query, or None"""
+        query = query.lower()
+        for tier, pattern in self._patterns:
+            if pattern.search(query):
+                return tier
+        return None
+
+    def _by_length(self, query):
+        # Looks only as far as the threshold word instead of splitting the whole query
+        return self.default_tier if self._long_query.match(query) else self.short_tier
+
+    def route(self, query):
+        """Model tier for one query"""
+        tier = self.match_keywords(query)
+        if tier is not None:
+            return tier
+        if self.classifier is not None:
+            tier, _ = self.classifier.predict(query)
+            if tier is not None:
+                return tier
+        return self._by_length(query)
+
+    def route_batch(self, queries):
+        """
+        Model tiers for many queries
+
+        Duplicate queries are routed once, and every query without a keyword
+        match is sent to the embedding classifier in a single batch.
+        """
+        match_keywords = self.match_keywords
+        decisions = {}
+        unmatched = []
+        for query in queries:
+            if query in decisions:
+                continue
+            tier = match_keywords(query)
+            decisions[query] = tier
+            if tier is None:
+                unmatched.append(query)
+
+        if unmatched and self.classifier is not None:
+            for query, (tier, _) in zip(unmatched, self.classifier.predict_batch(unmatched)):
+                decisions[query] = tier
+
+        for query in unmatched:
+            if decisions[query] is None:
+                decisions[query] = self._by_length(query)
+
+        return [decisions[query] for query in queries]
+
+
+_default_router = RouterEngine()
+
 
 def route_to_model(query):
     """Smart routing based on complexity"""
-    
-    # Simple heuristics
-    simple_keywords = ['hours', 'location', 'price', 'hello', 'thanks']
-    complex_keywords = ['analyze', 'compare', 'recommend', 'explain why']
-    
-    query_lower = query.lower()
-    
-    if any(kw in query_lower for kw in simple_keywords):
-        return "mistral-7b"
-    elif any(kw in query_lower for kw in complex_keywords):
-        return "mistral-large"
-    elif len(query.split()) < 10:
-        return "mistral-7b"  # Short queries are usually simple
-    else:
-        return "mistral-large"  # Default to moderate
\ No newline at end of file
+    return _default_router.route(query)
+
+
+def route_batch(queries):
+    """Route many queries at once (bulk / offline jobs)"""
+    return _default_router.route_batch(queries)
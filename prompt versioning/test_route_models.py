@@ -0,0 +1,59 @@
+import random
+
+from route_models import DEFAULT_RULES, RouterEngine, route_to_model
+
+
+def any_keyword_route(rules, query):
+    """Reference: the original rule-by-rule ``any(kw in query)`` check"""
+    query = query.lower()
+    for tier, keywords in rules:
+        if any(keyword.lower() in query for keyword in keywords):
+            return tier
+    return None
+
+
+def test_keyword_inside_lower_priority_keyword():
+    router = RouterEngine(rules=[('a', ['pare']), ('b', ['compare'])])
+    assert router.match_keywords("please compare these plans") == 'a'
+
+
+def test_keyword_prefix_of_lower_priority_keyword():
+    router = RouterEngine(rules=[('a', ['hell']), ('b', ['hello'])])
+    assert router.match_keywords("hello there") == 'a'
+
+
+def test_overlapping_keywords_keep_rule_order():
+    router = RouterEngine(rules=[('a', ['rice']), ('b', ['price'])])
+    assert router.match_keywords("what is the price") == 'a'
+    router = RouterEngine(rules=[('a', ['price']), ('b', ['rice'])])
+    assert router.match_keywords("what is the price") == 'a'
+
+
+def test_no_match_falls_back_to_length():
+    router = RouterEngine(rules=[('a', ['refund'])], short_query_words=3,
+                          short_tier='small', default_tier='large')
+    assert router.match_keywords("where is my order") is None
+    assert router.route("hi") == 'small'
+    assert router.route("where is my order today") == 'large'
+
+
+def test_custom_rules_match_any_keyword_reference():
+    rng = random.Random(7)
+    alphabet = 'abcde '
+    for _ in range(200):
+        rules = [
+            (f"tier-{index}", [''.join(rng.choice(alphabet[:-1]) for _ in range(rng.randint(1, 4)))
+                               for _ in range(rng.randint(1, 4))])
+            for index in range(rng.randint(1, 4))
+        ]
+        router = RouterEngine(rules=rules)
+        for _ in range(20):
+            query = ''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 30)))
+            assert router.match_keywords(query) == any_keyword_route(rules, query), (rules, query)
+
+
+def test_default_rules_unchanged():
+    assert route_to_model("Hello, what are your hours?") == "mistral-7b"
+    assert route_to_model("Can you compare the two plans and recommend one?") == "mistral-large"
+    assert any_keyword_route(DEFAULT_RULES, "Explain why my bill went up") == "mistral-large"
+    assert route_to_model("Explain why my bill went up") == "mistral-large"
@@ -0,0 +1,241 @@
+"""
+Bedrock prompt caching for Converse requests.
+
+Long static prefixes (system prompt, few-shot examples, shared retrieved
+context) are sent unchanged on every call. Marking the end of each one with
+a ``cachePoint`` block lets Bedrock reuse the processed prefix for about
+five minutes, which cuts input cost and time to first token:
+
+    system:   [{"text": system}, {"cachePoint": ...}]
+    messages: few-shot turns ... [{"cachePoint": ...}]
+              user: [{"text": context}, {"cachePoint": ...}, {"text": question}]
+
+A cache point is only added when the prefix up to it is long enough for the
+model to cache (``MIN_CACHE_TOKENS``); models without prompt caching get a
+plain request. Short system prompts alone (like those in prompts.json)
+never reach the minimum; the retrieved context of ``rag_pipeline``'s
+``cached_generator`` usually does. ``PrefixCacheTracker`` hashes each cacheable prefix locally
+to predict how many input tokens should be read from the cache, and
+compares that with the ``cacheReadInputTokens`` Bedrock reports.
+"""
+
+import hashlib
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from token_counter import count_tokens
+
+CACHE_POINT = {"cachePoint": {"type": "default"}}
+
+# Smallest cacheable prefix (tokens) per model ID prefix; models not listed
+# do not support prompt caching
+MIN_CACHE_TOKENS = {
+    "anthropic.claude-3-5-haiku": 2048,
+    "anthropic.claude-3-7-sonnet": 1024,
+    "anthropic.claude-sonnet-4": 1024,
+    "anthropic.claude-opus-4": 1024,
+    "anthropic.claude-haiku-4-5": 4096,
+    "amazon.nova": 1000,
+}
+
+# Bedrock keeps a cached prefix for five minutes after its last use
+CACHE_TTL_SECONDS = 300
+
+_PROFILE_PREFIXES = ("us.", "eu.", "apac.", "global.")
+
+
+def min_cache_tokens(model_id: str) -> Optional[int]:
+    """Minimum cacheable prefix for a model, or None if it has no prompt caching"""
+    base_id = model_id
+    for profile in _PROFILE_PREFIXES:
+        if base_id.startswith(profile):
+            base_id = base_id[len(profile):]
+            break
+    matches = [prefix for prefix in MIN_CACHE_TOKENS if base_id.startswith(prefix)]
+    return MIN_CACHE_TOKENS[max(matches, key=len)] if matches else None
+
+
+class CachedRequest:
+    """
+    A Converse request with cache points, plus what the tracker needs
+
+    Attributes:
+        system, messages: Converse ``system`` and ``messages`` arguments
+        checkpoints: (prefix digest, prefix tokens) for every cache point, in order
+        input_tokens: Estimated tokens of the whole input
+    """
+
+    def __init__(self, system: List[Dict], messages: List[Dict],
+                 checkpoints: List[Tuple[str, int]], input_tokens: int):
+        self.system = system
+        self.messages = messages
+        self.checkpoints = checkpoints
+        self.input_tokens = input_tokens
+
+    def converse_kwargs(self) -> Dict:
+        kwargs = {"messages": self.messages}
+        if self.system:
+            kwargs["system"] = self.system
+        return kwargs
+
+
+def build_cached_request(
+    model_id: str,
+    question: str,
+    system: Optional[str] = None,
+    examples: Optional[Sequence[Dict[str, str]]] = None,
+    context: Optional[str] = None,
+    count: Callable[..., int] = count_tokens,
+) -> CachedRequest:
+    """
+    Converse request with cache points after each static prefix
+
+    Args:
+        model_id: Target model (decides whether and where cache points go)
+        question: The per-request user question (never cached)
+        system: System prompt
+        examples: Few-shot examples as [{"question": ..., "answer": ...}]
+        context: Shared retrieved context placed before the question
+        count: Token counter (text, model_id=...) -> int
+    """
+    minimum = min_cache_tokens(model_id)
+    digest = hashlib.blake2b(model_id.encode(), digest_size=16)
+    checkpoints: List[Tuple[str, int]] = []
+    tokens = 0
+
+    def segment(*texts):
+        """Add the texts of a static segment to the running prefix; True if a cache point fits here"""
+        nonlocal tokens
+        for text in texts:
+            digest.update(text.encode())
+            digest.update(b'\x1e')
+            tokens += count(text, model_id=model_id)
+        if minimum is not None and tokens >= minimum:
+            checkpoints.append((digest.hexdigest(), tokens))
+            return True
+        return False
+
+    system_blocks: List[Dict] = []
+    if system:
+        system_blocks.append({"text": system})
+        if segment(system):
+            system_blocks.append(CACHE_POINT)
+
+    messages: List[Dict] = []
+    if examples:
+        for example in examples:
+            messages.append({"role": "user", "content": [{"text": example["question"]}]})
+            messages.append({"role": "assistant", "content": [{"text": example["answer"]}]})
+        # Count the message texts actually sent, not a serialization of the examples
+        if segment(*(text for example in examples for text in (example["question"], example["answer"]))):
+            messages[-1]["content"].append(CACHE_POINT)
+
+    content: List[Dict] = []
+    if context:
+        content.append({"text": context})
+        if segment(context):
+            content.append(CACHE_POINT)
+    content.append({"text": question})
+    messages.append({"role": "user", "content": content})
+
+    return CachedRequest(system_blocks, messages, checkpoints,
+                         tokens + count(question, model_id=model_id))
+
+
+class PrefixCacheTracker:
+    """
+    Expected vs observed prompt-cache reads
+
+    Remembers the digest of every cache-point prefix sent in the last
+    ``ttl_seconds``. For a new request the longest remembered prefix is the
+    expected cache read; the response's ``usage`` gives the observed
+    ``cacheReadInputTokens`` / ``cacheWriteInputTokens``.
+    """
+
+    def __init__(self, ttl_seconds: float = CACHE_TTL_SECONDS, max_prefixes: int = 10000):
+        self.ttl_seconds = ttl_seconds
+        self.max_prefixes = max_prefixes
+        self._last_used: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self.stats = {
+            'requests': 0,
+            'input_tokens': 0,
+            'expected_read_tokens': 0,
+            'observed_read_tokens': 0,
+            'observed_write_tokens': 0,
+            'unexpected_misses': 0,
+        }
+
+    def expect(self, request: CachedRequest) -> int:
+        """Tokens this request should read from the cache; marks its prefixes as cached"""
+        now = time.monotonic()
+        expected = 0
+        with self._lock:
+            for prefix_digest, prefix_tokens in request.checkpoints:
+                last_used = self._last_used.get(prefix_digest)
+                if last_used is not None and now - last_used < self.ttl_seconds:
+                    expected = prefix_tokens
+            if len(self._last_used) + len(request.checkpoints) > self.max_prefixes:
+                self._last_used = {
+                    key: used for key, used in self._last_used.items() if now - used < self.ttl_seconds
+                }
+            for prefix_digest, _ in request.checkpoints:
+                self._last_used[prefix_digest] = now
+        return expected
+
+    def observe(self, expected: int, usage: Dict):
+        """Record the usage Bedrock reported for a request"""
+        read = usage.get('cacheReadInputTokens', 0)
+        written = usage.get('cacheWriteInputTokens', 0)
+        with self._lock:
+            self.stats['requests'] += 1
+            self.stats['input_tokens'] += usage.get('inputTokens', 0) + read + written
+            self.stats['expected_read_tokens'] += expected
+            self.stats['observed_read_tokens'] += read
+            self.stats['observed_write_tokens'] += written
+            if expected and not read:
+                self.stats['unexpected_misses'] += 1
+
+    def report(self) -> Dict:
+        stats = dict(self.stats)
+        total = stats['input_tokens']
+        stats['observed_hit_ratio'] = round(stats['observed_read_tokens'] / total, 3) if total else 0.0
+        expected = stats['expected_read_tokens']
+        stats['read_vs_expected'] = round(stats['observed_read_tokens'] / expected, 3) if expected else None
+        return stats
+
+
+def cached_converse(bedrock, model_id: str, question: str, system: Optional[str] = None,
+                    examples: Optional[Sequence[Dict[str, str]]] = None, context: Optional[str] = None,
+                    tracker: Optional[PrefixCacheTracker] = None, **inference_config) -> Dict:
+    """
+    bedrock.converse with cache points on the static prefixes
+
+    ``inference_config`` is passed as Converse's inferenceConfig (maxTokens,
+    temperature, ...). With a tracker, the expected and observed cache reads
+    are recorded.
+    """
+    request = build_cached_request(model_id, question, system, examples, context)
+    expected = tracker.expect(request) if tracker else 0
+    response = bedrock.converse(
+        modelId=model_id,
+        inferenceConfig=inference_config,
+        **request.converse_kwargs()
+    )
+    if tracker:
+        tracker.observe(expected, response.get('usage', {}))
+    return response
+
+
+if __name__ == "__main__":
+    tracker = PrefixCacheTracker()
+    system = "You are an expert customer support specialist. " * 200
+    for question in ["How do I reset my password?", "Where is my order?"]:
+        request = build_cached_request("anthropic.claude-3-7-sonnet-20250219-v1:0", question, system=system)
+        expected = tracker.expect(request)
+        print(f"cache points: {len(request.checkpoints)}, input ~{request.input_tokens} tokens, "
+              f"expected cache read: {expected}")
+        tracker.observe(expected, {'inputTokens': 10, 'cacheReadInputTokens': expected,
+                                   'cacheWriteInputTokens': 0 if expected else request.checkpoints[-1][1]})
+    print(tracker.report())
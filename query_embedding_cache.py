@@ -0,0 +1,270 @@
+"""
+Query embedding cache for the retrieval path.
+
+``run_query`` needs ``generate_embedding(query)`` first, a Bedrock round
+trip even for a query that was asked a minute ago or is asked again, with
+different capitalization, on the next chat turn. ``QueryEmbeddingCache``
+sits in front of the embedding call:
+
+- queries are normalized (NFKC, case, whitespace, trailing punctuation)
+  into the cache key, and their embeddings kept in a bounded LRU with a TTL;
+  the text embedded is the first query as typed, so a first lookup gets
+  the same vector as calling ``embed`` directly
+- concurrent requests for the same query share one call, and misses that
+  arrive within ``window_ms`` of each other are dispatched together (one
+  ``embed_batch`` call, or parallel ``embed`` calls on a shared pool)
+- ``prefetch`` embeds likely follow-up questions in the background, so
+  they are already cached when the user asks them
+
+    cache = QueryEmbeddingCache(generate_embedding)
+    front_end = RetrievalFrontEnd(cache, opensearch_retriever(op_client, index_name))
+    hits = front_end.search("How can I build generative AI apps on AWS?",
+                            follow_ups=["What does Bedrock cost?"])
+"""
+
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Sequence
+
+_WHITESPACE = re.compile(r'\s+')
+_TRAILING_PUNCTUATION = re.compile(r'[\s?!.。？！]+$')
+
+
+def normalize_query(query: str) -> str:
+    """Cache key for a query: NFKC, lowercase, single spaces, no trailing ?!."""
+    query = unicodedata.normalize('NFKC', query).lower()
+    query = _TRAILING_PUNCTUATION.sub('', query)
+    return _WHITESPACE.sub(' ', query).strip()
+
+
+class QueryEmbeddingCache:
+    """Memoized, batched query embeddings (see the module docstring)"""
+
+    def __init__(self, embed: Callable, embed_batch: Optional[Callable] = None,
+                 max_entries: int = 10000, ttl_seconds: float = 3600.0,
+                 window_ms: float = 5.0, max_batch: int = 32, max_workers: int = 8):
+        """
+        Args:
+            embed: Function text -> embedding (e.g. generate_embedding)
+            embed_batch: Optional function list of texts -> list of embeddings
+            max_entries: Embeddings kept in the LRU
+            ttl_seconds: Age after which a cached embedding is fetched again
+            window_ms: How long the first miss waits for others to join its batch
+            max_batch: Largest batch dispatched at once
+            max_workers: Concurrent embedding calls
+        """
+        self.embed = embed
+        self.embed_batch = embed_batch
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.window = window_ms / 1000.0
+        self.max_batch = max_batch
+
+        self._cache = OrderedDict()
+        self._in_flight: Dict[str, Future] = {}
+        self._pending: List[tuple] = []
+        self._cond = threading.Condition()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='query-embed')
+        self._dispatcher = None
+        self._closed = False
+        self.stats = {'hits': 0, 'misses': 0, 'coalesced': 0, 'expired': 0,
+                      'batches': 0, 'embedded': 0, 'prefetched': 0, 'errors': 0}
+
+    def _lookup(self, key: str):
+        """Cached embedding or None; caller holds the lock"""
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        embedding, stored_at = entry
+        if time.monotonic() - stored_at > self.ttl_seconds:
+            del self._cache[key]
+            self.stats['expired'] += 1
+            return None
+        self._cache.move_to_end(key)
+        return embedding
+
+    def submit(self, query: str) -> Future:
+        """Future for a query's embedding, resolved from the cache when possible"""
+        key = normalize_query(query)
+        with self._cond:
+            embedding = self._lookup(key)
+            if embedding is not None:
+                self.stats['hits'] += 1
+                future = Future()
+                future.set_result(embedding)
+                return future
+            future = self._in_flight.get(key)
+            if future is not None:
+                self.stats['coalesced'] += 1
+                return future
+            if self._closed:
+                raise RuntimeError("QueryEmbeddingCache is closed")
+
+            self.stats['misses'] += 1
+            future = self._in_flight[key] = Future()
+            # (cache key, text to embed, queued at, future)
+            self._pending.append((key, query, time.monotonic(), future))
+            if self._dispatcher is None:
+                self._dispatcher = threading.Thread(target=self._dispatch_loop, name='query-embed-dispatch',
+                                                    daemon=True)
+                self._dispatcher.start()
+            self._cond.notify()
+        return future
+
+    def get(self, query: str, timeout: Optional[float] = None):
+        """Embedding of a query (blocks until it is cached or embedded)"""
+        return self.submit(query).result(timeout)
+
+    def get_many(self, queries: Sequence[str], timeout: Optional[float] = None) -> List:
+        """Embeddings of several queries; the misses go out in the same window"""
+        futures = [self.submit(query) for query in queries]
+        return [future.result(timeout) for future in futures]
+
+    def prefetch(self, queries: Sequence[str]):
+        """Start embedding queries that are likely to be asked next; does not wait"""
+        for query in queries:
+            with self._cond:
+                if self._lookup(normalize_query(query)) is not None:
+                    continue
+                self.stats['prefetched'] += 1
+            self.submit(query)
+
+    def _dispatch_loop(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+                # Hold the window open from the first waiting request
+                deadline = self._pending[0][2] + self.window
+                while len(self._pending) < self.max_batch and not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = self._pending[:self.max_batch]
+                del self._pending[:self.max_batch]
+                self.stats['batches'] += 1
+            self._dispatch(batch)
+
+    def _dispatch(self, batch: List[tuple]):
+        """Send a batch to the pool without blocking the dispatcher"""
+        if self.embed_batch is not None:
+            texts = [text for _, text, _, _ in batch]
+            self._pool.submit(self.embed_batch, texts).add_done_callback(
+                lambda done: self._complete_batch(batch, done)
+            )
+            return
+        for item in batch:
+            self._pool.submit(self.embed, item[1]).add_done_callback(
+                lambda done, item=item: self._complete_batch([item], done, single=True)
+            )
+
+    def _complete_batch(self, batch: List[tuple], done: Future, single: bool = False):
+        error = done.exception()
+        results = None
+        if error is None:
+            try:
+                results = [done.result()] if single else list(done.result())
+                if len(results) != len(batch):
+                    raise ValueError(f"embed_batch returned {len(results)} embeddings for {len(batch)} texts")
+            except Exception as e:
+                # Fail every request in the batch rather than leave some waiting forever
+                error, results = e, None
+        with self._cond:
+            now = time.monotonic()
+            for position, (key, _, _, future) in enumerate(batch):
+                self._in_flight.pop(key, None)
+                if error is None:
+                    self._cache[key] = (results[position], now)
+                    self._cache.move_to_end(key)
+                    self.stats['embedded'] += 1
+                else:
+                    self.stats['errors'] += 1
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        for position, (_, _, _, future) in enumerate(batch):
+            if future.done():
+                continue
+            if error is None:
+                future.set_result(results[position])
+            else:
+                future.set_exception(error)
+
+    def cache_info(self) -> Dict:
+        with self._cond:
+            info = dict(self.stats)
+            info['size'] = len(self._cache)
+        lookups = info['hits'] + info['misses'] + info['coalesced']
+        info['hit_ratio'] = round((info['hits'] + info['coalesced']) / lookups, 3) if lookups else 0.0
+        info['avg_batch'] = round(info['embedded'] / info['batches'], 2) if info['batches'] else 0.0
+        return info
+
+    def close(self):
+        """Finish pending requests and stop the dispatcher and pool"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._dispatcher is not None:
+            self._dispatcher.join()
+        self._pool.shutdown(wait=True)
+
+
+class RetrievalFrontEnd:
+    """
+    Cached query embedding + retrieval, with follow-up prefetch
+
+    ``retrieve(query_embedding, top_k)`` is any retriever with the
+    rag_pipeline signature (e.g. ``opensearch_retriever``).
+    ``suggest(query, hits)`` optionally returns likely follow-up questions,
+    which are prefetched after each search.
+    """
+
+    def __init__(self, cache: QueryEmbeddingCache, retrieve: Callable,
+                 suggest: Optional[Callable] = None, top_k: int = 5):
+        self.cache = cache
+        self.retrieve = retrieve
+        self.suggest = suggest
+        self.top_k = top_k
+
+    def search(self, query: str, top_k: Optional[int] = None,
+               follow_ups: Optional[Sequence[str]] = None):
+        hits = self.retrieve(self.cache.get(query), top_k or self.top_k)
+        follow_ups = list(follow_ups or [])
+        if self.suggest is not None:
+            follow_ups.extend(self.suggest(query, hits))
+        if follow_ups:
+            self.cache.prefetch(follow_ups)
+        return hits
+
+
+if __name__ == "__main__":
+    calls = []
+
+    def slow_embed(text):
+        calls.append(text)
+        time.sleep(0.05)
+        return [float(len(text)), float(text.count(' '))]
+
+    cache = QueryEmbeddingCache(slow_embed, window_ms=10)
+    queries = ["How can I build GenAI apps on AWS?", "how can i build genai apps on aws",
+               "What is Bedrock?", "What is S3?"] * 25
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(16) as pool:
+        list(pool.map(cache.get, queries))
+    print(f"{len(queries)} lookups in {time.perf_counter() - start:.3f}s, {len(calls)} embed calls")
+
+    front_end = RetrievalFrontEnd(cache, lambda embedding, top_k: [{"id": "1", "score": embedding[0]}])
+    front_end.search("What is Bedrock?", follow_ups=["What does Bedrock cost?"])
+    time.sleep(0.2)
+    start = time.perf_counter()
+    front_end.search("What does Bedrock cost")
+    print(f"follow-up served in {1000 * (time.perf_counter() - start):.2f} ms")
+    print(cache.cache_info())
+    cache.close()
@@ -0,0 +1,450 @@
+"""
+End-to-end RAG pipeline with per-stage tracing.
+
+The notebook flow (``generate_embedding`` -> ``run_query`` -> prompt ->
+``invoke_model``) as one object with pluggable stages:
+
+    embed(query) -> query embedding
+    retrieve(query_embedding, top_k) -> chunks ({"id", "text", "score"} dicts)
+    rerank(query, chunks) -> chunks                         (optional)
+    compress(query_embedding, chunks) -> context text       (optional)
+    generate(prompt) -> answer
+
+Every stage runs inside a span. The tracer receives the stage name, its
+latency and any attributes the pipeline or the stage itself adds with
+``annotate(...)`` (token counts, cache hits, ...). ``LocalRecorder`` keeps
+spans in memory and summarizes latency per stage and query class;
+``OpenTelemetryTracer`` forwards them to OpenTelemetry when it is installed.
+
+    recorder = LocalRecorder()
+    pipeline = RagPipeline(
+        embed=generate_embedding,
+        retrieve=opensearch_retriever(op_client, "store_documents_src", store=chunk_store),
+        generate=bedrock_generator("mistral.mistral-7b-instruct-v0:2"),
+        tracer=recorder,
+    )
+    result = pipeline.run("How can I build generative AI apps on AWS?", query_class="faq")
+    print(recorder.summary())
+
+``arun`` / ``arun_many`` run the same stages on an event loop, in worker
+threads for plain functions (boto3 and opensearch-py are blocking) or
+directly for coroutine functions.
+
+The prompt handed to ``generate`` is a ``RagPrompt``: the formatted string,
+which also carries the query and context it was built from.
+``cached_generator`` uses them to send the retrieved context as a
+prompt-cache segment (``prompt_cache``), so follow-up questions over the
+same chunks read it from the cache. Bedrock only caches a prefix of at least
+``MIN_CACHE_TOKENS`` (1024 tokens for Claude 3.7 Sonnet), so short contexts
+go out without a cache point.
+"""
+
+import asyncio
+import contextvars
+import inspect
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence
+
+from bedrock_clients import get_client
+from cost_ledger import get_ledger, usage_from_response
+from model_codecs import get_codec
+from token_counter import count_tokens
+
+try:
+    from opentelemetry import trace as otel_trace
+except ImportError:  # optional dependency
+    otel_trace = None
+
+
+STAGES = ('embed', 'retrieve', 'rerank', 'compress', 'generate')
+
+DEFAULT_PROMPT_TEMPLATE = (
+    "Answer the question using only the context below. Cite sources by their [id].\n\n"
+    "Context:\n{context}\n\nQuestion: {query}"
+)
+
+# System prompt of cached_generator, which sends the context and question as separate blocks
+RAG_SYSTEM_PROMPT = (
+    "Answer the question using only the context given with it. Cite sources by their [id]."
+)
+
+_current_span: contextvars.ContextVar = contextvars.ContextVar('rag_span', default=None)
+
+
+class Span:
+    """One timed stage: name, attributes and duration"""
+
+    def __init__(self, name: str, trace_id: str, attributes: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.trace_id = trace_id
+        self.attributes = dict(attributes or {})
+        self.start = time.perf_counter()
+        self.duration_ms: Optional[float] = None
+        self.error: Optional[str] = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+
+def annotate(**attributes):
+    """Add attributes (e.g. cache_hit=True) to the stage span running in this context"""
+    span = _current_span.get()
+    if span is not None:
+        span.set(**attributes)
+
+
+class Tracer:
+    """Span hook interface; the base class records nothing"""
+
+    def start(self, span: Span):
+        pass
+
+    def end(self, span: Span):
+        pass
+
+
+class LocalRecorder(Tracer):
+    """Keep the last ``max_spans`` spans in memory and summarize them"""
+
+    def __init__(self, max_spans: int = 10000):
+        self.spans = deque(maxlen=max_spans)
+
+    def end(self, span: Span):
+        self.spans.append(span)
+
+    def summary(self, by: Sequence[str] = ('query_class',)) -> Dict[tuple, Dict]:
+        """
+        Latency percentiles and summed numeric attributes per stage
+
+        Keys are (stage, *values of the ``by`` attributes), e.g.
+        ('generate', 'faq') -> {'count': 40, 'p50_ms': ..., 'p95_ms': ..., 'input_tokens': ...}
+        """
+        groups: Dict[tuple, List[Span]] = {}
+        for span in list(self.spans):
+            key = (span.name,) + tuple(span.attributes.get(field) for field in by)
+            groups.setdefault(key, []).append(span)
+
+        summary = {}
+        for key, spans in groups.items():
+            latencies = sorted(span.duration_ms for span in spans)
+            row = {
+                'count': len(spans),
+                'errors': sum(span.error is not None for span in spans),
+                'p50_ms': round(latencies[len(latencies) // 2], 2),
+                'p95_ms': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 2),
+            }
+            for span in spans:
+                for name, value in span.attributes.items():
+                    if isinstance(value, (int, float)) and name not in by:
+                        row[name] = row.get(name, 0) + value
+            summary[key] = row
+        return summary
+
+
+class OpenTelemetryTracer(Tracer):
+    """Emit each stage as an OpenTelemetry span (attributes as span attributes)"""
+
+    def __init__(self, name: str = 'rag_pipeline'):
+        if otel_trace is None:
+            raise ImportError("OpenTelemetryTracer requires opentelemetry-api")
+        self.tracer = otel_trace.get_tracer(name)
+        self._spans = {}
+
+    def start(self, span: Span):
+        self._spans[id(span)] = self.tracer.start_span(f"rag.{span.name}")
+
+    def end(self, span: Span):
+        otel_span = self._spans.pop(id(span), None)
+        if otel_span is None:
+            return
+        otel_span.set_attribute('rag.trace_id', span.trace_id)
+        otel_span.set_attribute('rag.duration_ms', span.duration_ms)
+        for name, value in span.attributes.items():
+            if isinstance(value, (str, bool, int, float)):
+                otel_span.set_attribute(f"rag.{name}", value)
+        if span.error is not None:
+            otel_span.set_status(otel_trace.Status(otel_trace.StatusCode.ERROR, span.error))
+        otel_span.end()
+
+
+class RagPrompt(str):
+    """Formatted generation prompt that also carries its query and context"""
+
+    def __new__(cls, text: str, query: str, context: str):
+        prompt = super().__new__(cls, text)
+        prompt.query = query
+        prompt.context = context
+        return prompt
+
+
+class RagResult:
+    """Answer plus everything that led to it"""
+
+    def __init__(self, query: str, answer: str, chunks: List[Dict], context: str,
+                 trace_id: str, timings: Dict[str, float]):
+        self.query = query
+        self.answer = answer
+        self.chunks = chunks
+        self.context = context
+        self.trace_id = trace_id
+        self.timings = timings
+
+
+class RagPipeline:
+    """Embed -> retrieve -> rerank -> compress -> generate, one span per stage"""
+
+    def __init__(self, embed: Callable, retrieve: Callable, generate: Callable,
+                 rerank: Optional[Callable] = None, compress: Optional[Callable] = None,
+                 tracer: Optional[Tracer] = None, top_k: int = 5,
+                 prompt_template: str = DEFAULT_PROMPT_TEMPLATE, model_id: Optional[str] = None):
+        """
+        Args:
+            embed, retrieve, generate: Required stages (see module docstring)
+            rerank, compress: Optional stages; without compress the chunk
+                texts are joined under their [id]
+            tracer: Span hook (default: no tracing)
+            top_k: Chunks to retrieve
+            prompt_template: Format string with {context} and {query}
+            model_id: Generation model, for token counts of the prompt and answer
+        """
+        self.stages = {'embed': embed, 'retrieve': retrieve, 'rerank': rerank,
+                       'compress': compress, 'generate': generate}
+        self.tracer = tracer or Tracer()
+        self.top_k = top_k
+        self.prompt_template = prompt_template
+        self.model_id = model_id
+
+    @contextmanager
+    def _span(self, name: str, trace_id: str, attributes: Dict) -> Iterator[Span]:
+        span = Span(name, trace_id, attributes)
+        token = _current_span.set(span)
+        self.tracer.start(span)
+        try:
+            yield span
+        except Exception as e:
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            span.duration_ms = (time.perf_counter() - span.start) * 1000
+            _current_span.reset(token)
+            self.tracer.end(span)
+
+    @staticmethod
+    def default_context(chunks: List[Dict]) -> str:
+        return "\n\n".join(f"[{chunk.get('id')}] {chunk['text']}" for chunk in chunks)
+
+    def _steps(self, query: str):
+        """
+        The pipeline as a generator: yields (stage, function, args) and is
+        sent each stage's result, so run and arun share one implementation
+        """
+        query_embedding = yield 'embed', self.stages['embed'], (query,)
+        chunks = yield 'retrieve', self.stages['retrieve'], (query_embedding, self.top_k)
+        if self.stages['rerank'] is not None:
+            chunks = yield 'rerank', self.stages['rerank'], (query, chunks)
+        if self.stages['compress'] is not None:
+            context = yield 'compress', self.stages['compress'], (query_embedding, chunks)
+        else:
+            context = self.default_context(chunks)
+        context = str(context)
+        prompt = RagPrompt(self.prompt_template.format(context=context, query=query), query, context)
+        answer = yield 'generate', self.stages['generate'], (prompt,)
+        return chunks, context, prompt, answer
+
+    def _attributes(self, stage: str, result: Any, prompt_args: tuple) -> Dict:
+        """Attributes the pipeline knows about a finished stage"""
+        if stage in ('retrieve', 'rerank'):
+            return {'chunks': len(result)}
+        if stage == 'compress':
+            if hasattr(result, 'original_tokens'):
+                return {'context_tokens': result.tokens, 'retrieved_tokens': result.original_tokens}
+            return {'context_tokens': count_tokens(str(result), self.model_id)}
+        if stage == 'generate':
+            return {'prompt_tokens': count_tokens(prompt_args[0], self.model_id),
+                    'answer_tokens': count_tokens(str(result), self.model_id)}
+        return {}
+
+    def run(self, query: str, query_class: Optional[str] = None) -> RagResult:
+        trace_id = uuid.uuid4().hex
+        timings = {}
+        steps = self._steps(query)
+        result = None
+        try:
+            while True:
+                stage, function, args = steps.send(result)
+                with self._span(stage, trace_id, {'query_class': query_class}) as span:
+                    result = function(*args)
+                    span.set(**self._attributes(stage, result, args))
+                timings[stage] = span.duration_ms
+        except StopIteration as done:
+            chunks, context, _, answer = done.value
+        return RagResult(query, answer, chunks, context, trace_id, timings)
+
+    async def _call(self, function: Callable, args: tuple):
+        if inspect.iscoroutinefunction(function):
+            return await function(*args)
+        # to_thread copies the context, so annotate() inside the stage still finds the span
+        return await asyncio.to_thread(function, *args)
+
+    async def arun(self, query: str, query_class: Optional[str] = None) -> RagResult:
+        """run() on the event loop; blocking stages go to worker threads"""
+        trace_id = uuid.uuid4().hex
+        timings = {}
+        steps = self._steps(query)
+        result = None
+        try:
+            while True:
+                stage, function, args = steps.send(result)
+                with self._span(stage, trace_id, {'query_class': query_class}) as span:
+                    result = await self._call(function, args)
+                    span.set(**self._attributes(stage, result, args))
+                timings[stage] = span.duration_ms
+        except StopIteration as done:
+            chunks, context, _, answer = done.value
+        return RagResult(query, answer, chunks, context, trace_id, timings)
+
+    async def arun_many(self, queries: Sequence[str], query_class: Optional[str] = None,
+                        concurrency: int = 8) -> List[RagResult]:
+        """Run queries concurrently, at most ``concurrency`` at a time, results in input order"""
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one(query):
+            async with semaphore:
+                return await self.arun(query, query_class)
+
+        return await asyncio.gather(*(one(query) for query in queries))
+
+
+def opensearch_retriever(client, index_name: str, store=None, vector_field: str = 'embeddings') -> Callable:
+    """
+    retrieve stage over the rag_prep index (document_id, document_text, embeddings)
+
+    With a ChunkStore only the document IDs are fetched and the text is read
+    from the store; otherwise ``document_text`` comes back in the hits.
+    """
+    source = 'document_id' if store is not None else ['document_id', 'document_text']
+
+    def retrieve(query_embedding, top_k):
+        query = {
+            "size": top_k,
+            "_source": source,
+            "query": {"knn": {vector_field: {"vector": [float(x) for x in query_embedding], "k": top_k}}},
+        }
+        hits = client.search(index=index_name, body=query)["hits"]["hits"]
+        ids = [hit["_source"]["document_id"] for hit in hits]
+        texts = store.get_many(ids) if store is not None else [hit["_source"]["document_text"] for hit in hits]
+        return [
+            {"id": chunk_id, "text": text, "score": hit["_score"]}
+            for chunk_id, text, hit in zip(ids, texts, hits) if text is not None
+        ]
+
+    return retrieve
+
+
+def bedrock_generator(model_id: str, bedrock=None, max_tokens: int = 500, ledger=None,
+                      route: str = 'rag_pipeline', **params) -> Callable:
+    """
+    generate stage calling invoke_model through the model's codec
+
+    The token counts Bedrock reports are added to the span and to the cost
+    ledger (the process-wide one by default).
+    """
+    bedrock = bedrock or get_client('bedrock-runtime')
+    codec = get_codec(model_id)
+    ledger = ledger or get_ledger()
+
+    def generate(prompt):
+        response = bedrock.invoke_model(
+            modelId=model_id,
+            body=codec.encode_messages([{"role": "user", "content": prompt}], max_tokens=max_tokens, **params),
+        )
+        usage = usage_from_response(response)
+        if usage is not None:
+            annotate(input_tokens=usage[0], output_tokens=usage[1])
+            ledger.record(model_id, usage[0], usage[1], route=route,
+                          cache_read_tokens=usage[2], cache_write_tokens=usage[3])
+        return codec.decode_response(response)
+
+    return generate
+
+
+def cached_generator(model_id: str, bedrock=None, system: str = RAG_SYSTEM_PROMPT, max_tokens: int = 500,
+                     tracker=None, ledger=None, route: str = 'rag_pipeline', **inference_config) -> Callable:
+    """
+    generate stage calling Converse with prompt-cache points
+
+    The instructions go in the system prompt and the retrieved context in a
+    cacheable block before the question (see ``prompt_cache``). A plain
+    string prompt is sent as the question without a context block. Cache
+    reads and writes are added to the span and, priced separately, to the
+    cost ledger.
+    """
+    from prompt_cache import PrefixCacheTracker, cached_converse
+
+    bedrock = bedrock or get_client('bedrock-runtime')
+    ledger = ledger or get_ledger()
+    tracker = tracker or PrefixCacheTracker()
+
+    def generate(prompt):
+        response = cached_converse(
+            bedrock, model_id, getattr(prompt, 'query', prompt), system=system,
+            context=getattr(prompt, 'context', None), tracker=tracker,
+            maxTokens=max_tokens, **inference_config
+        )
+        usage = usage_from_response(response)
+        if usage is not None:
+            annotate(input_tokens=usage[0], output_tokens=usage[1],
+                     cache_read_tokens=usage[2], cache_write_tokens=usage[3])
+            ledger.record(model_id, usage[0], usage[1], route=route,
+                          cache_read_tokens=usage[2], cache_write_tokens=usage[3])
+        return response['output']['message']['content'][0]['text']
+
+    generate.tracker = tracker
+    return generate
+
+
+def compressor(cache, max_tokens: int = 800, model_id: Optional[str] = None) -> Callable:
+    """compress stage using context_compression, reporting sentence cache hits"""
+    from context_compression import compress_context
+
+    def compress(query_embedding, chunks):
+        before = cache.hits
+        context = compress_context(query_embedding, chunks, max_tokens, cache, model_id=model_id)
+        annotate(sentence_cache_hits=cache.hits - before, kept_sentences=len(context.sentences))
+        return context
+
+    return compress
+
+
+if __name__ == "__main__":
+    import random
+
+    # Offline run with stand-in stages
+    documents = {
+        "1": "AWS Bedrock provides foundation models for GenAI. It is serverless.",
+        "2": "Amazon Bedrock is used to build AI-powered applications. Agents call APIs.",
+        "3": "S3 is an object storage service.",
+    }
+
+    def embed(text):
+        time.sleep(0.005)
+        return [float(len(text) % 7), 1.0, 0.5]
+
+    def retrieve(query_embedding, top_k):
+        time.sleep(0.01)
+        annotate(cache_hit=random.random() < 0.5)
+        return [{"id": k, "text": v, "score": 1.0} for k, v in list(documents.items())[:top_k]]
+
+    def generate(prompt):
+        time.sleep(0.03)
+        return "Use Amazon Bedrock [1][2]."
+
+    recorder = LocalRecorder()
+    pipeline = RagPipeline(embed, retrieve, generate, tracer=recorder, top_k=2)
+    print(pipeline.run("How can I build generative AI apps on AWS?", query_class="faq").answer)
+    asyncio.run(pipeline.arun_many([f"question {i}" for i in range(20)], query_class="batch"))
+    for key, row in sorted(recorder.summary().items(), key=lambda item: str(item[0])):
+        print(key, row)
@@ -1,8 +1,16 @@
 # import libraries
 
+import os
+import sys
 import streamlit as st
-import boto3
-import json
+
+# Shared helper modules live at the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bedrock_clients import get_client
+from chat_history import add_message, display_history, reset_history
+from cost_ledger import get_ledger
+from model_codecs import get_codec
 
 
 # set page configurations
@@ -12,16 +20,56 @@ st.set_page_config(page_title="GenAI Chatbot", page_icon="🤖")
 @st.cache_resource
 def get_bedrock_client():
     """Cache the Bedrock client to avoid recreating on every rerun"""
-    return boto3.client('bedrock-runtime', 
-    region_name='us-east-1')
+    return get_client('bedrock-runtime')
 
 
 bedrock = get_bedrock_client()
 
 
+MODEL_ID = "mistral.mistral-large-3-675b-instruct"
+CODEC = get_codec(MODEL_ID)
+
+
 # Initialize chat history in session state
 if "messages" not in st.session_state:
-    st.session_state.messages = []
+    reset_history()
+
+
+# Keep whatever was streamed before a reply was interrupted by a new message
+if pending := st.session_state.pop("pending_reply", None):
+    if pending["parts"]:
+        add_message("assistant", "".join(pending["parts"]) + " …")
+
+
+def build_request_body():
+    """Prepare the Mistral chat request for the current conversation"""
+    return CODEC.encode_messages(st.session_state.messages, max_tokens=1000)
+
+
+def stream_reply(response):
+    """
+    Yield text deltas from a Bedrock response stream
+
+    When a new message arrives mid-reply, Streamlit stops this run and
+    abandons the generator; the HTTP stream is then closed in ``finally``
+    so the interrupted generation does not keep running.
+    """
+    event_stream = response["body"]
+    parts = []
+    st.session_state.pending_reply = {"parts": parts}
+    try:
+        for event in event_stream:
+            chunk = event.get("chunk")
+            if not chunk:
+                continue
+            # The last chunk carries the token counts for the whole call
+            get_ledger().record_chunk(MODEL_ID, chunk["bytes"], route="chat_ui")
+            delta = CODEC.decode_chunk(chunk["bytes"])
+            if delta:
+                parts.append(delta)
+                yield delta
+    finally:
+        event_stream.close()
 
 
 # App title
@@ -30,46 +78,43 @@ st.caption("Powered by Mistral Large")
 
 
 # Display chat history
-for message in st.session_state.messages:
-    with st.chat_message(message["role"]):
-        st.markdown(message["content"])
+display_history()
     
 # Chat input
 if prompt := st.chat_input("Ask me anything..."):
     # Add user message to history
-    st.session_state.messages.append({"role": "user", "content": prompt})
+    add_message("user", prompt)
     with st.chat_message("user"):
         st.markdown(prompt)
     
     # Generate AI response
     with st.chat_message("assistant"):
-        with st.spinner("Thinking..."):
-            
-            # Prepare request for Bedrock
-            body = json.dumps({
-                "max_tokens": 1000,
-                "messages": [
-                    {"role": msg["role"], "content": msg["content"]}
-                    for msg in st.session_state.messages
-                ]
-            })
-
-            # Invoke Bedrock
-            response = bedrock.invoke_model(
-                modelId="mistral.mistral-large-3-675b-instruct",
-                body=body
+        if st.session_state.get("stream_responses", True):
+            # Render tokens as they arrive instead of waiting for the full body
+            response = bedrock.invoke_model_with_response_stream(
+                modelId=MODEL_ID,
+                body=build_request_body()
             )
+            assistant_message = st.write_stream(stream_reply(response))
+            st.session_state.pop("pending_reply", None)
 
-            # Parse response
-            response_body = json.loads(response['body'].read())
-            assistant_message = response_body['choices'][0]['message']['content']
+            add_message("assistant", assistant_message)
+        else:
+            with st.spinner("Thinking..."):
 
-            # Display and save response
-            st.markdown(assistant_message)
-            st.session_state.messages.append({
-                "role": "assistant",
-                "content": assistant_message
-            })
+                # Invoke Bedrock
+                response = bedrock.invoke_model(
+                    modelId=MODEL_ID,
+                    body=build_request_body()
+                )
+
+                # Parse response
+                get_ledger().record_response(MODEL_ID, response, route="chat_ui")
+                assistant_message = CODEC.decode_response(response)
+
+                # Display and save response
+                st.markdown(assistant_message)
+                add_message("assistant", assistant_message)
 
 
 # Sidebar with info
@@ -81,9 +126,16 @@ with st.sidebar:
     - **Amazon Bedrock** for AI
     - **Mistral Large** model
     """)
+
+    st.toggle(
+        "Stream responses",
+        value=True,
+        key="stream_responses",
+        help="Show the answer token by token as it is generated"
+    )
     
     if st.button("Clear Chat History"):
-        st.session_state.messages = []
+        reset_history()
         st.rerun()
 
 
@@ -1,9 +1,18 @@
 import json
-import boto3
 import os
+import sys
 import logging
 from datetime import datetime
 
+# Shared helper modules live at the repository root. When deploying, package
+# bedrock_clients.py, cost_ledger.py and model_codecs.py next to this file (or
+# in a Lambda layer under python/); the path below is then simply unused.
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bedrock_clients import get_client
+from cost_ledger import CostLedger, JsonlStore
+from model_codecs import get_codec
+
 
 # Configure logging
 logger = logging.getLogger()
@@ -12,11 +21,17 @@ logger.setLevel(logging.INFO)
 
 
 # Initialize Bedrock client (outside handler for connection reuse)
-bedrock = boto3.client('bedrock-runtime', region_name='us-east-1')
+bedrock = get_client('bedrock-runtime')
 
 
 # Configuration
 MODEL_ID = "mistral.mistral-large-2402-v1:0"
+CODEC = get_codec(MODEL_ID)
+
+# Usage per tenant; /tmp is the only writable path in Lambda, so pass a
+# durable store (anything with write_batch) in production. Flushed at the
+# end of each invocation because the container may be frozen afterwards.
+LEDGER = CostLedger(store=JsonlStore('/tmp/cost_ledger.jsonl'), flush_interval=0)
 DEFAULT_MAX_TOKENS = 1000
 DEFAULT_TEMPERATURE = 0.7
 
@@ -118,13 +133,13 @@ def lambda_handler(event, context):
         formatted_prompt = format_prompt_for_mistral(user_message)
         
         # Prepare Bedrock request (Mistral format)
-        bedrock_body = json.dumps({
-            "prompt": formatted_prompt,
-            "max_tokens": max_tokens,
-            "temperature": temperature,
-            "top_p": 0.9,
-            "top_k": 50
-        })
+        bedrock_body = CODEC.encode_prompt(
+            formatted_prompt,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            top_p=0.9,
+            top_k=50
+        )
         
         # Invoke Bedrock with Mistral model
         logger.info(f"Invoking Bedrock model: {MODEL_ID}")
@@ -134,8 +149,9 @@ def lambda_handler(event, context):
         )
         
         # Parse Mistral response
-        response_body = json.loads(bedrock_response['body'].read())
-        ai_response = response_body['outputs'][0]['text'].strip()
+        ai_response = CODEC.decode_response(bedrock_response)
+        LEDGER.record_response(MODEL_ID, bedrock_response, tenant=body.get('tenant', 'default'), route='lambda')
+        LEDGER.flush()
         
         logger.info(f"Response generated successfully")
         
@@ -1,8 +1,15 @@
 from fastapi import FastAPI, HTTPException # api handling
 from pydantic import BaseModel # request and response schema
-import boto3
+import os
+import sys
 from typing import List, Optional
 
+# Shared helper modules live at the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bedrock_clients import get_client
+from cost_ledger import get_ledger
+
 
 app = FastAPI(
     title="GenAI RAG API",
@@ -12,7 +19,8 @@ app = FastAPI(
 
 
 # Initialize Bedrock client
-bedrock = boto3.client('bedrock-runtime', region_name='us-east-1')
+bedrock = get_client('bedrock-runtime')
+MODEL_ID = "mistral.mistral-large-2402-v1:0"
 
 
 # Request/Response models
@@ -25,6 +33,7 @@ class ChatRequest(BaseModel):
     messages: List[Message]
     temperature: Optional[float] = 0.7
     max_tokens: Optional[int] = 1000
+    tenant: Optional[str] = "default"
 
 
 class ChatResponse(BaseModel):
@@ -50,7 +59,7 @@ async def chat(request: ChatRequest):
     try:
         # Invoke Bedrock with Mistral model using Converse API
         response = bedrock.converse(
-            modelId="mistral.mistral-large-2402-v1:0",
+            modelId=MODEL_ID,
             messages=[
                 {"role": msg.role, "content": [{"text": msg.content}]}
                 for msg in request.messages
@@ -63,6 +72,7 @@ async def chat(request: ChatRequest):
 
         # Parse response
         assistant_message = response['output']['message']['content'][0]['text']
+        get_ledger().record_response(MODEL_ID, response, tenant=request.tenant, route="/chat")
 
         return ChatResponse(
             response=assistant_message,
@@ -0,0 +1,20 @@
+from chunk_store import ChunkStore
+
+
+def test_put_after_torn_index_line_survives_reopen(tmp_path):
+    store = ChunkStore(str(tmp_path))
+    store.put("doc-1", "first chunk")
+    store.close()
+    index_path = store._index_path(store.generation)
+    with open(index_path, 'a') as f:
+        f.write('["doc-2", 11, ')
+
+    store = ChunkStore(str(tmp_path))
+    assert store.get("doc-2") is None
+    store.put("doc-3", "third chunk")
+    store.close()
+
+    store = ChunkStore(str(tmp_path))
+    assert store.get("doc-1") == "first chunk"
+    assert store.get("doc-3") == "third chunk"
+    store.close()
@@ -0,0 +1,231 @@
+"""
+Token counting for budgeting and cost estimates.
+
+``len(text) // 4`` is badly off for code and non-English text. This module
+counts tokens with the real tokenizer of each model family when one is
+available offline, and falls back to a fast approximation otherwise:
+
+- Offline tokenizers: a Hugging Face ``tokenizer.json`` per family, loaded
+  from ``TOKENIZER_DIR`` (e.g. ``tokenizers/mistral.json``, ``tokenizers/llama.json``)
+  when the optional ``tokenizers`` package is installed, or any counting
+  function registered with ``register_tokenizer``.
+- Approximation: a regex-based estimate that treats words, digits,
+  punctuation and CJK characters differently.
+
+Counts are memoized in an LRU cache keyed by a hash of the text, and
+``count_tokens_batch`` encodes all cache misses in one call.
+"""
+
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Sequence
+
+try:
+    from tokenizers import Tokenizer
+except ImportError:  # optional dependency
+    Tokenizer = None
+
+
+# Model id substring -> tokenizer family
+MODEL_FAMILIES = {
+    'anthropic': 'claude',
+    'claude': 'claude',
+    'mistral': 'mistral',
+    'llama': 'llama',
+    'titan': 'titan',
+    'nova': 'nova',
+    'cohere': 'cohere',
+}
+
+DEFAULT_TOKENIZER_DIR = os.environ.get(
+    'TOKENIZER_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tokenizers')
+)
+
+# Latin words ~6 chars/token, other alphabets ~3 chars/token, CJK ~1 char/token
+_CJK = '\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff'
+_CJK_RE = re.compile(f'[{_CJK}]')
+_LATIN_WORD_RE = re.compile(r'[A-Za-z]+')
+_OTHER_WORD_RE = re.compile(rf'[^\W\dA-Za-z_{_CJK}]+')
+_DIGITS_RE = re.compile(r'\d{1,3}')
+_SYMBOL_RE = re.compile(r'[^\w\s]')
+_NEWLINES_RE = re.compile(r'\n+')
+
+
+def approximate_tokens(text: str) -> int:
+    """Fast tokenizer-free estimate that holds up for code and non-English text"""
+    if not text:
+        return 0
+    count = sum((len(word) + 5) // 6 for word in _LATIN_WORD_RE.findall(text))
+    count += sum((len(word) + 2) // 3 for word in _OTHER_WORD_RE.findall(text))
+    count += len(_CJK_RE.findall(text))
+    count += len(_DIGITS_RE.findall(text))
+    count += len(_SYMBOL_RE.findall(text))
+    count += len(_NEWLINES_RE.findall(text))
+    return max(count, 1)
+
+
+def model_family(model_id: Optional[str]) -> str:
+    """Map a Bedrock model id (e.g. 'mistral.mistral-large-2402-v1:0') to a tokenizer family"""
+    if not model_id:
+        return 'default'
+    model_id_lower = model_id.lower()
+    for marker, family in MODEL_FAMILIES.items():
+        if marker in model_id_lower:
+            return family
+    return 'default'
+
+
+class _Backend:
+    """Counting functions for one family"""
+
+    def __init__(self, name: str, count: Callable[[str], int],
+                 count_batch: Optional[Callable[[List[str]], List[int]]] = None):
+        self.name = name
+        self.count = count
+        self.count_batch = count_batch or (lambda texts: [count(t) for t in texts])
+
+
+APPROXIMATE = _Backend('approximate', approximate_tokens)
+
+
+class TokenCounter:
+    """Per-family token counting with an LRU cache of results"""
+
+    def __init__(self, cache_size: int = 8192, tokenizer_dir: str = DEFAULT_TOKENIZER_DIR):
+        self.cache_size = cache_size
+        self.tokenizer_dir = tokenizer_dir
+        self._backends: Dict[str, _Backend] = {}
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def register(self, family: str, count: Callable[[str], int],
+                 count_batch: Optional[Callable[[List[str]], List[int]]] = None):
+        """Use a custom counting function for a model family"""
+        self._backends[family] = _Backend(family, count, count_batch)
+        self.clear_cache()
+
+    def _load_backend(self, family: str) -> _Backend:
+        """Offline tokenizer for the family if one is on disk, else the approximation"""
+        path = os.path.join(self.tokenizer_dir, f'{family}.json')
+        if Tokenizer is not None and os.path.exists(path):
+            tokenizer = Tokenizer.from_file(path)
+            return _Backend(
+                family,
+                lambda text: len(tokenizer.encode(text, add_special_tokens=False).ids),
+                lambda texts: [len(e.ids) for e in tokenizer.encode_batch(texts, add_special_tokens=False)],
+            )
+        return APPROXIMATE
+
+    def backend(self, family: str) -> _Backend:
+        backend = self._backends.get(family)
+        if backend is None:
+            backend = self._backends.setdefault(family, self._load_backend(family))
+        return backend
+
+    @staticmethod
+    def _key(family: str, text: str) -> bytes:
+        return family.encode() + hashlib.blake2b(text.encode('utf-8', 'surrogatepass'), digest_size=16).digest()
+
+    def _lookup(self, key: bytes) -> Optional[int]:
+        with self._lock:
+            count = self._cache.get(key)
+            if count is None:
+                self.misses += 1
+                return None
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return count
+
+    def _store(self, key: bytes, count: int):
+        with self._lock:
+            self._cache[key] = count
+            self._cache.move_to_end(key)
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def count(self, text: str, model_id: Optional[str] = None) -> int:
+        """Number of tokens in ``text`` for the given model"""
+        if not text:
+            return 0
+        family = model_family(model_id)
+        key = self._key(family, text)
+        count = self._lookup(key)
+        if count is None:
+            count = self.backend(family).count(text)
+            self._store(key, count)
+        return count
+
+    def count_batch(self, texts: Sequence[str], model_id: Optional[str] = None) -> List[int]:
+        """Token counts for many texts; cache misses are encoded in a single batch"""
+        family = model_family(model_id)
+        counts = [0] * len(texts)
+        missing_keys, missing_texts, missing_positions = [], [], []
+
+        for position, text in enumerate(texts):
+            if not text:
+                continue
+            key = self._key(family, text)
+            count = self._lookup(key)
+            if count is None:
+                missing_keys.append(key)
+                missing_texts.append(text)
+                missing_positions.append(position)
+            else:
+                counts[position] = count
+
+        if missing_texts:
+            fresh = self.backend(family).count_batch(missing_texts)
+            for key, position, count in zip(missing_keys, missing_positions, fresh):
+                counts[position] = count
+                self._store(key, count)
+        return counts
+
+    def clear_cache(self):
+        with self._lock:
+            self._cache.clear()
+
+    def cache_info(self) -> Dict[str, int]:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self._cache),
+            'max_size': self.cache_size,
+        }
+
+
+# Shared instance used by the module-level helpers
+default_counter = TokenCounter()
+
+
+def count_tokens(text: str, model_id: Optional[str] = None) -> int:
+    """Token count of ``text`` for ``model_id`` (approximate if no tokenizer is available)"""
+    return default_counter.count(text, model_id)
+
+
+def count_tokens_batch(texts: Sequence[str], model_id: Optional[str] = None) -> List[int]:
+    """Token counts for a list of texts"""
+    return default_counter.count_batch(texts, model_id)
+
+
+def register_tokenizer(family: str, count: Callable[[str], int],
+                       count_batch: Optional[Callable[[List[str]], List[int]]] = None):
+    """Register an offline counting function for a family ('claude', 'mistral', ...)"""
+    default_counter.register(family, count, count_batch)
+
+
+if __name__ == "__main__":
+    samples = [
+        "How do I reset my password?",
+        "def truncate_context(messages, max_tokens=4000):\n    return messages[-10:]",
+        "¿Cómo puedo restablecer mi contraseña?",
+        "パスワードをリセットするにはどうすればよいですか？",
+    ]
+    for sample, tokens in zip(samples, count_tokens_batch(samples, "mistral.mistral-large-2402-v1:0")):
+        print(f"{tokens:>4} tokens (chars//4 = {len(sample) // 4:>3}): {sample!r}")
+    print(default_counter.cache_info())